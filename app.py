@@ -2,10 +2,156 @@ from flask import Flask, render_template, jsonify, request
 # from flask import Flask, 
 
 # import request
-from testCamera import *
 # import jsonify
+import os
+
+import numpy as np
+
+# Only light modules are imported here so the server starts fast: the landmark models (mediapipe, cv2),
+# the camera loop and the pose index are imported by the requests and the model pool that need them
+from sessionManager import MAX_SESSIONS, create_session_manager, start_session, get_session, session_status, session_scores, stop_session, \
+    open_session, record_frame, finish_session, list_sessions, session_rates, ACTIVE_STATES
+from stageMetrics import enable_metrics, prometheus_text, metric_line
+from referenceStore import open_exercise, reference_frames_at
+from landmarkScoring import DEFAULT_TOLERANCE, score_frames, unpack_landmark_frames, pack_score_results
+from modelPool import create_model_pool, start_model_pool, acquire_extractor, release_extractor
+
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
 
 app = Flask(__name__)
+sock = Sock(app) if Sock is not None else None
+
+# Exercise sessions run on background workers, at most MAX_SESSIONS at a time
+app.config['MAX_SESSIONS'] = int(os.environ.get('FORMIFY_MAX_SESSIONS', MAX_SESSIONS))
+sessions = create_session_manager(app.config['MAX_SESSIONS'])
+
+# Stage timings exposed on /metrics, on unless FORMIFY_METRICS=0
+app.config['METRICS'] = os.environ.get('FORMIFY_METRICS', '1') != '0'
+enable_metrics(app.config['METRICS'])
+
+# Warm landmark models handed to sessions, one per session that may run at once (FORMIFY_MODEL_POOL=0 disables it).
+# Nothing is loaded on import: the server starts warming them on a background thread (see __main__), or the
+# first session does (get_model_pool).
+app.config['MODEL_POOL'] = int(os.environ.get('FORMIFY_MODEL_POOL', app.config['MAX_SESSIONS']))
+model_pool = create_model_pool(app.config['MODEL_POOL'])
+
+# Largest batch accepted by /score, in frames
+app.config['MAX_SCORE_FRAMES'] = int(os.environ.get('FORMIFY_MAX_SCORE_FRAMES', 10000))
+
+# Reference exercises opened by /score and /ingest, kept for the life of the server
+reference_exercises = {}
+
+
+def get_reference_exercise(m, n, x):
+    """Opens the reference of an exercise once and reuses it (None when there is no reference for it, also kept)."""
+    key = (m, n, x)
+    if key not in reference_exercises:
+        reference_exercises[key] = open_exercise(m, n, x)
+    return reference_exercises[key]
+
+
+def get_model_pool():
+    """The model pool, warming it first when the server did not start it (e.g. under another WSGI server)."""
+    return start_model_pool(model_pool)
+
+
+# Nearest-pose index over the whole reference library, built on first use by /detect and auto-detected sessions
+pose_indexes = {}
+
+
+def get_pose_index():
+    """Builds the nearest-pose index once and reuses it (None when there is no reference)."""
+    from poseIndex import load_pose_index
+
+    if 'library' not in pose_indexes:
+        pose_indexes['library'] = load_pose_index()
+    return pose_indexes['library']
+
+
+def run_camera_session(m, n, x, stop_event, on_frame):
+    """
+    Session worker: runs process_camera without its OpenCV window, which cannot be shown off the main thread,
+    on landmark models borrowed from the warm pool.
+    """
+    from testCamera import process_camera
+
+    pose_index = None if (m and n and x) else get_pose_index()
+    extractor = acquire_extractor(get_model_pool())
+    try:
+        report = process_camera(m, n, x, stop_event=stop_event, on_frame=on_frame, show=False, pose_index=pose_index, extractor=extractor)
+    finally:
+        release_extractor(model_pool, extractor)
+    if report is None:
+        raise RuntimeError("Unable to access the camera.")
+    return report
+
+def ingest_frames(ws):
+    """
+    WebSocket endpoint: /ingest?m=..&n=..&x=..
+
+    The browser sends binary frame messages (see frameIngest), one reply is sent back per frame.
+    Frames are handled one at a time, so a client that waits for replies never queues up work.
+    The stream counts as a session and can be stopped with /sessions/<id>/stop or a "stop" text message.
+    """
+    from testCamera import MOTOR_JOINTS
+    from frameIngest import open_ingest, close_ingest, process_frame_message, reply_message
+
+    m = request.args.get('m')
+    n = request.args.get('n')
+    x = request.args.get('x')
+    if not (m and n and x):
+        ws.send(reply_message({'error': 'm, n and x are required.'}))
+        return
+
+    exercise = get_reference_exercise(m, n, x)
+    if exercise is None:
+        ws.send(reply_message({'error': f"No reference for {n} {m} {x}."}))
+        return
+
+    session = open_session(sessions, m, n, x)
+    if session is None:
+        ws.send(reply_message({'error': f"Too many sessions running (at most {app.config['MAX_SESSIONS']})."}))
+        return
+
+    ingest = None
+    error = None
+    try:
+        ingest = open_ingest(exercise, MOTOR_JOINTS.get(n), extractor=acquire_extractor(get_model_pool()))
+        ws.send(reply_message({'session_id': session['id']}))
+        while not session['stop_event'].is_set():
+            message = ws.receive(timeout=1.0)
+            if message is None:
+                continue
+            if isinstance(message, str):
+                if message == 'stop':
+                    break
+                continue
+
+            reply, distances, out_of_tolerance, score = process_frame_message(ingest, message)
+            if distances is not None:
+                record_frame(session, reply['sequence'], distances, out_of_tolerance, score)
+            ws.send(reply_message(reply))
+    except ConnectionClosed:
+        pass
+    except Exception as e:
+        print(f"Error in frame stream {session['id']}: {e}")
+        error = str(e)
+    finally:
+        result = None
+        if ingest is not None:
+            close_ingest(ingest)
+            release_extractor(model_pool, ingest['extractor'])
+            result = {'frames': ingest['frames'], 'bad_frames': ingest['bad_frames']}
+        finish_session(session, result, error)
+
+if sock is not None:
+    sock.route('/ingest')(ingest_frames)
+else:
+    print("flask-sock is not installed, the /ingest frame stream is disabled.")
 
 @app.route('/')
 def home():
@@ -48,18 +194,152 @@ def wrist_demo():
 def wrist_stretch():
     return render_template('wristStretch.html')
 
+@app.route('/userMovement')
+def user_movement():
+    return render_template('userMovement.html')
+
 @app.route('/process', methods=['POST'])
 def process():
     # Get data from the request (e.g., from frontend)
     m = request.json.get('m')
     n = request.json.get('n')
     x = request.json.get('x')
-    
-    # Call your Python function
-    result = process_camera(m, n, x)
-    
-    # Return the result as JSON
-    return jsonify({'result': result})
+    if (m or n or x) and not (m and n and x):
+        return jsonify({'error': 'Give all of m, n and x, or none of them to detect the exercise.'}), 400
+
+    # Start the exercise on a background worker and answer right away
+    session_id = start_session(sessions, run_camera_session, m, n, x)
+    if session_id is None:
+        return jsonify({'error': f"Too many sessions running (at most {app.config['MAX_SESSIONS']})."}), 429
+
+    return jsonify({'session_id': session_id, 'status': session_status(get_session(sessions, session_id))['status']}), 202
+
+@app.route('/score', methods=['POST'])
+def score():
+    """
+    Scores landmarks extracted elsewhere against the reference for (m, n, x).
+
+    The body holds packed little-endian float32 landmarks, 75 x 3 values per frame (NaN when missing),
+    for one frame or a batch. Frame i is compared with the reference at start + i / fps seconds
+    (query parameters, fps defaults to the reference fps). Returns per-frame scores and the joints out
+    of tolerance as JSON, or with format=binary the packed bytes of landmarkScoring.pack_score_results.
+    """
+    m = request.args.get('m')
+    n = request.args.get('n')
+    x = request.args.get('x')
+    if not (m and n and x):
+        return jsonify({'error': 'm, n and x are required.'}), 400
+
+    exercise = get_reference_exercise(m, n, x)
+    if exercise is None:
+        return jsonify({'error': f"No reference for {n} {m} {x}."}), 404
+
+    try:
+        live_landmarks = unpack_landmark_frames(request.get_data())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(live_landmarks) > app.config['MAX_SCORE_FRAMES']:
+        return jsonify({'error': f"At most {app.config['MAX_SCORE_FRAMES']} frames per request."}), 413
+
+    start = request.args.get('start', 0.0, type=float)
+    fps = request.args.get('fps', exercise['fps'], type=float)
+    if not (np.isfinite(start) and np.isfinite(fps) and fps > 0):
+        return jsonify({'error': 'start must be a finite number and fps a finite number above 0.'}), 400
+    seconds = start + np.arange(len(live_landmarks)) / fps
+    distances, out_of_tolerance, scores = score_frames(live_landmarks, reference_frames_at(exercise, seconds), DEFAULT_TOLERANCE)
+
+    if request.args.get('format') == 'binary':
+        return app.response_class(pack_score_results(scores, out_of_tolerance), mimetype='application/octet-stream')
+
+    return jsonify({
+        'frames': len(scores),
+        'scores': [None if score != score else score for score in scores.tolist()],
+        'out_of_tolerance': [np.flatnonzero(mask).tolist() for mask in out_of_tolerance],
+    })
+
+@app.route('/detect', methods=['POST'])
+def detect():
+    """
+    Tells which exercise, and which phase of it, landmarks extracted elsewhere are from.
+
+    The body holds a few recent frames as packed float32 landmarks, as for /score. Returns the
+    detected m, n, x with the matched reference frame, the phase (0 to 1), the confidence (share of
+    the nearest reference poses from that exercise) and the normalized pose distance, or 404 when no
+    frame is close to a reference pose (poseIndex.MAX_DETECTION_DISTANCE).
+    """
+    try:
+        live_landmarks = unpack_landmark_frames(request.get_data())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(live_landmarks) > app.config['MAX_SCORE_FRAMES']:
+        return jsonify({'error': f"At most {app.config['MAX_SCORE_FRAMES']} frames per request."}), 413
+
+    from poseIndex import detect_exercise
+
+    pose_index = get_pose_index()
+    detection = detect_exercise(pose_index, live_landmarks) if pose_index is not None else None
+    if detection is None:
+        return jsonify({'error': 'No pose close to a reference pose to detect the exercise from.'}), 404
+
+    m, n, x = detection.pop('key')
+    return jsonify({'m': m, 'n': n, 'x': x, **detection})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text metrics: the stage timing histograms (when enabled) and the fps, frame and dropped-frame counters of every session."""
+    lines = prometheus_text() if app.config['METRICS'] else []
+    kept = list_sessions(sessions)
+    session_lines = {'session_fps': [], 'session_frames_total': [], 'session_dropped_frames_total': []}
+    for session in kept:
+        with session['lock']:
+            fps, dropped = session_rates(session)
+            labels = {'session_id': session['id'], **session['exercise']}
+            session_lines['session_fps'].append(metric_line('session_fps', labels, round(fps, 3)))
+            session_lines['session_frames_total'].append(metric_line('session_frames_total', labels, session['frames']))
+            session_lines['session_dropped_frames_total'].append(metric_line('session_dropped_frames_total', labels, dropped))
+
+    lines += [
+        "# HELP formify_active_sessions Sessions starting, running or stopping.",
+        "# TYPE formify_active_sessions gauge",
+        metric_line('active_sessions', {}, sum(1 for session in kept if session['status'] in ACTIVE_STATES)),
+        "# HELP formify_session_fps Frames scored per second over the last frames of a session.",
+        "# TYPE formify_session_fps gauge",
+        *session_lines['session_fps'],
+        "# HELP formify_session_frames_total Frames scored in a session.",
+        "# TYPE formify_session_frames_total counter",
+        *session_lines['session_frames_total'],
+        "# HELP formify_session_dropped_frames_total Source frames a session dropped instead of scoring.",
+        "# TYPE formify_session_dropped_frames_total counter",
+        *session_lines['session_dropped_frames_total'],
+    ]
+    return app.response_class('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/sessions/<session_id>')
+def session_info(session_id):
+    session = get_session(sessions, session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session.'}), 404
+    return jsonify(session_status(session))
+
+@app.route('/sessions/<session_id>/scores')
+def session_score_history(session_id):
+    session = get_session(sessions, session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session.'}), 404
+    return jsonify(session_scores(session, request.args.get('since', 0, type=int)))
+
+@app.route('/sessions/<session_id>/stop', methods=['POST'])
+def stop(session_id):
+    session = get_session(sessions, session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session.'}), 404
+    stop_session(session)
+    return jsonify(session_status(session))
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    debug = True
+    # The debug reloader runs this file twice: a parent that only watches the files, and the child that serves
+    # (WERKZEUG_RUN_MAIN set). Only the serving process loads the models.
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_model_pool(model_pool)
+    app.run(debug=debug)
\ No newline at end of file
@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+
+from referenceStore import open_exercise, reference_frames_at
+from landmarkScoring import DEFAULT_TOLERANCE, score_frames, pack_score_results
+from sequenceAlignment import score_aligned_session
+
+# Constants
+BATCH_SIZES = (1, 30, 300, 3000)  # Frames per request
+TOTAL_FRAMES = 30000  # Frames scored per batch size
+EXERCISE = ("8_12_weeks", "arm_stretch", "easy")  # (m, n, x)
+
+
+def synthetic_frames(exercise, frames, noise=0.03, seed=0):
+    """Returns [frames, 75, 3] live landmarks: the reference poses plus Gaussian noise, with the hands often missing."""
+    rng = np.random.default_rng(seed)
+    live_landmarks = reference_frames_at(exercise, np.arange(frames) / exercise['fps'])
+    live_landmarks = live_landmarks + rng.normal(0, noise, live_landmarks.shape).astype(np.float32)
+    live_landmarks[rng.random(frames) < 0.5, 33:] = np.nan
+    return live_landmarks.astype('<f4')
+
+
+def benchmark_core(exercise, live_landmarks, batch_size):
+    """Times reference lookup, scoring and packing (no HTTP). Returns frames per second."""
+    start = time.perf_counter()
+    for first in range(0, len(live_landmarks), batch_size):
+        batch = live_landmarks[first:first + batch_size]
+        seconds = (first + np.arange(len(batch))) / exercise['fps']
+        distances, out_of_tolerance, scores = score_frames(batch, reference_frames_at(exercise, seconds), DEFAULT_TOLERANCE)
+        pack_score_results(scores, out_of_tolerance)
+    return len(live_landmarks) / (time.perf_counter() - start)
+
+
+def benchmark_alignment(exercise, live_landmarks, repeats=5):
+    """Times offline DTW scoring of a whole recorded session. Returns the best time in milliseconds."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        score_aligned_session(live_landmarks, exercise['landmarks'])
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def benchmark_endpoint(client, live_landmarks, batch_size, fps, m, n, x, response_format):
+    """Times POST /score through the Flask test client (no network). Returns frames per second."""
+    start = time.perf_counter()
+    for first in range(0, len(live_landmarks), batch_size):
+        batch = live_landmarks[first:first + batch_size]
+        response = client.post('/score', data=batch.tobytes(), content_type='application/octet-stream',
+                               query_string={'m': m, 'n': n, 'x': x, 'start': first / fps, 'format': response_format})
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return len(live_landmarks) / (time.perf_counter() - start)
+
+
+def main():
+    m, n, x = EXERCISE
+    exercise = open_exercise(m, n, x)
+    live_landmarks = synthetic_frames(exercise, TOTAL_FRAMES)
+
+    session = synthetic_frames(exercise, int(len(exercise['landmarks']) * 1.25))
+    print(f"DTW scoring of a {len(session)} frame session: {benchmark_alignment(exercise, session):.1f} ms")
+
+    # Imported here so the core numbers can be measured without the web app's dependencies
+    from app import app
+    client = app.test_client()
+
+    print(f"{'batch':>6} {'core fps':>12} {'json fps':>12} {'binary fps':>12}")
+    for batch_size in BATCH_SIZES:
+        # Fewer frames for the small batches, which are dominated by per-request overhead
+        frames = live_landmarks[:min(TOTAL_FRAMES, batch_size * 1000)]
+        core = benchmark_core(exercise, frames, batch_size)
+        json_fps = benchmark_endpoint(client, frames, batch_size, exercise['fps'], m, n, x, 'json')
+        binary_fps = benchmark_endpoint(client, frames, batch_size, exercise['fps'], m, n, x, 'binary')
+        print(f"{batch_size:>6} {core:>12,.0f} {json_fps:>12,.0f} {binary_fps:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
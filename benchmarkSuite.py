@@ -0,0 +1,443 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from referenceStore import NUM_LANDMARKS, NUM_POSE_LANDMARKS, COORDINATES, open_exercise, reference_frame_at
+
+# Constants
+RESULTS_FILE = 'benchmark_results.json'  # Latest run, compared with the previous one before it is replaced
+REGRESSION_THRESHOLD = 0.2  # A benchmark regresses when its p50 is 20% slower or its throughput 20% lower
+REGRESSION_FLOOR_MS = 0.01  # ... and its p50 is slower by at least this much, so timer noise on tiny calls is not flagged
+FIXTURE_VIDEOS = ['test.mp4', 'test_2.mp4', 'videos']  # Video files, or folders of them
+REFERENCE_CSV = 'output_landmarks_final.csv'  # Per-frame reference CSV
+WIDE_EXERCISES = 4  # Synthetic exercises written to the wide (one row per video) CSV read by compareCameraLandmarks
+WIDE_SECONDS, WIDE_FPS = 10, 30  # Slots of the wide CSV, as extractLandmarksVideo writes it
+EXERCISE = ("8_12_weeks", "arm_stretch", "easy")  # (m, n, x)
+EXTRACTION_FRAMES = 60  # Video frames timed one by one through the landmark models
+FRAME_SIZE = (640, 480)
+
+
+def synthetic_landmarks(frames, seed=0, hand_presence=0.5):
+    """
+    Generates [frames, 75, 3] float32 landmarks that move smoothly around a random pose, with
+    both hands missing (NaN) in about 1 - hand_presence of the frames.
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(0.3, 0.7, (NUM_LANDMARKS, len(COORDINATES)))
+    drift = np.cumsum(rng.normal(0, 0.003, (frames, NUM_LANDMARKS, len(COORDINATES))), axis=0)
+    landmarks = (base + drift).astype(np.float32)
+    landmarks[rng.random(frames) >= hand_presence, NUM_POSE_LANDMARKS:] = np.nan
+    return landmarks
+
+
+def write_wide_csv(path, exercises=WIDE_EXERCISES, seconds=WIDE_SECONDS, fps=WIDE_FPS):
+    """Writes synthetic exercises in the wide layout of extractLandmarksVideo. Returns the (n, m, x) key of each row."""
+    from extractLandmarksVideo import generate_header
+
+    keys = [(f"exercise_{i}", "8_12_weeks", "easy") for i in range(exercises)]
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['n', 'm', 'x'] + generate_header(fps, seconds))
+        for i, key in enumerate(keys):
+            values = synthetic_landmarks(seconds * fps, seed=i).ravel()
+            writer.writerow(list(key) + ['' if value != value else f"{value:.6f}" for value in values.tolist()])
+    return keys
+
+
+def fixture_videos(fixtures=FIXTURE_VIDEOS):
+    """Lists the fixture videos that can be opened (the bundled test.mp4 and test_2.mp4 may be empty placeholders)."""
+    paths = []
+    for fixture in fixtures:
+        if os.path.isdir(fixture):
+            paths += [os.path.join(fixture, name) for name in sorted(os.listdir(fixture)) if name.endswith(('.mp4', '.avi', '.mov', '.mkv'))]
+        elif os.path.exists(fixture):
+            paths.append(fixture)
+
+    videos = []
+    for path in paths:
+        cap = cv2.VideoCapture(path)
+        if cap.isOpened() and cap.get(cv2.CAP_PROP_FPS) > 0:
+            videos.append(path)
+        else:
+            print(f"Skipping {path}: not a readable video.")
+        cap.release()
+    return videos
+
+
+def read_frames(video_path, count):
+    """Decodes the first count frames of a video."""
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def measure(function, repeats, items=1, warmup=1, latency=None):
+    """
+    Calls function() repeats times (after warmup untimed calls) and summarizes the call latencies.
+
+    items is what one call processes (frames, lookups), for the throughput, or a function telling it
+    after each call. latency, when given, is a function telling the seconds to record for the last call
+    instead of its whole duration. Returns a dict with calls, mean / p50 / p95 / p99 latency in
+    milliseconds and throughput in items per second.
+    """
+    for _ in range(warmup):
+        function()
+
+    latencies = []
+    processed = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start if latency is None else latency())
+        processed += items() if callable(items) else items
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'calls': repeats,
+        'mean_ms': round(float(latencies.mean()), 4),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 4),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 4),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 4),
+        'throughput': round(processed / (latencies.sum() / 1000), 2),
+    }
+
+
+def benchmark_extraction(videos, work_dir, quick=False):
+    """Times test.process_video on every fixture video, and the landmark models alone frame by frame."""
+    import test
+    from landmarkExtractor import ROI_MODE, create_landmark_extractor, extract_landmarks, close_landmark_extractor
+
+    results = {}
+    if not videos:
+        return results
+
+    # Per-frame inference latency on the first frames of the first video
+    frames = read_frames(videos[0], EXTRACTION_FRAMES // 4 if quick else EXTRACTION_FRAMES)
+
+    extractor = create_landmark_extractor()
+    frame_iterator = iter(frames * 2)
+    results['landmarkExtractor.extract_landmarks'] = measure(lambda: extract_landmarks(extractor, next(frame_iterator)), len(frames) - 1)
+    close_landmark_extractor(extractor)
+
+    # The same with pose-guided hand crops (the live sessions' mode)
+    extractor = create_landmark_extractor(ROI_MODE)
+    frame_iterator = iter(frames * 2)
+    results['landmarkExtractor.extract_landmarks[roi]'] = measure(lambda: extract_landmarks(extractor, next(frame_iterator)), len(frames) - 1)
+    close_landmark_extractor(extractor)
+
+    # Whole videos, throughput in frames per second
+    for video_path in videos[:1] if quick else videos:
+        output_csv = os.path.join(work_dir, 'process_video.csv')
+
+        def process_one():
+            if os.path.exists(output_csv):
+                os.unlink(output_csv)
+            test.process_video(video_path, output_csv, 'n', 'm', 'x')
+
+        def rows_written():
+            with open(output_csv) as file:
+                return sum(1 for _ in file) - 1
+
+        results[f"test.process_video[{os.path.basename(video_path)}]"] = measure(process_one, 1, items=rows_written, warmup=0)
+    return results
+
+
+def benchmark_reference_lookup(quick=False):
+    """Times the CSV reference lookups of testCamera and the rendering of the found frame."""
+    import testCamera
+
+    m, n, x = EXERCISE
+    exercise = open_exercise(m, n, x, csv_file=REFERENCE_CSV)
+    timestamps = exercise['timestamps']
+    rng = np.random.default_rng(0)
+    picks = iter(rng.integers(0, len(timestamps), 1000))
+    frame = np.zeros((FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+
+    def lookup():
+        second, frame_position = map(int, timestamps[next(picks)].split('_'))
+        return testCamera.find_hand_landmark(REFERENCE_CSV, m, n, x, second, frame_position)
+
+    def render():
+        second, frame_position = map(int, timestamps[next(picks)].split('_'))
+        testCamera.render_landmarks_from_csv(REFERENCE_CSV, frame, m, n, x, second, frame_position)
+
+    def cold_lookup():
+        testCamera.csv_exercises.clear()
+        return lookup()
+
+    repeats = 5 if quick else 20
+    return {
+        'testCamera.find_hand_landmark[cold]': measure(cold_lookup, repeats),
+        'testCamera.find_hand_landmark': measure(lookup, 200),
+        'testCamera.render_landmarks_from_csv': measure(render, 200),
+        'referenceStore.reference_frame_at': measure(lambda: reference_frame_at(exercise, rng.uniform(0, 20)), 2000),
+    }
+
+
+def benchmark_scoring(quick=False):
+    """Times the per-frame hot path of a live session on synthetic landmarks: draw and score, align, detect."""
+    import testCamera
+    from sequenceAlignment import create_online_alignment, update_online_alignment, score_aligned_session
+    from poseIndex import load_pose_index, nearest_poses
+
+    m, n, x = EXERCISE
+    exercise = open_exercise(m, n, x, csv_file=REFERENCE_CSV)
+    live_landmarks = synthetic_landmarks(2000)
+    frame = np.zeros((FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+    repeats = 200 if quick else 1000
+    frames = iter(range(10 ** 9))
+
+    def draw():
+        i = next(frames) % len(live_landmarks)
+        testCamera.draw_landmarks(exercise['landmarks'][i % len(exercise['landmarks'])], frame, live_landmarks[i], n)
+
+    alignment = create_online_alignment(exercise['landmarks'])
+    results = {
+        'testCamera.draw_landmarks': measure(draw, repeats),
+        'sequenceAlignment.update_online_alignment': measure(lambda: update_online_alignment(alignment, live_landmarks[next(frames) % len(live_landmarks)]), repeats),
+        'sequenceAlignment.score_aligned_session': measure(lambda: score_aligned_session(live_landmarks[:len(exercise['landmarks'])], exercise['landmarks']),
+                                                          5 if quick else 20, items=len(exercise['landmarks'])),
+    }
+
+    pose_index = load_pose_index(csv_files=(REFERENCE_CSV,))
+    if pose_index is not None:
+        results['poseIndex.nearest_poses'] = measure(lambda: nearest_poses(pose_index, exercise['landmarks'][next(frames) % len(exercise['landmarks'])]), repeats)
+    return results
+
+
+def benchmark_wide_lookup(work_dir, quick=False):
+    """Times the wide-CSV lookups of compareCameraLandmarks: building the loader's row index, reading a row, indexing a frame."""
+    import compareCameraLandmarks
+    import landmarkLoader
+
+    wide_csv = os.path.join(work_dir, 'wide.csv')
+    n, m, x = write_wide_csv(wide_csv)[-1]
+
+    def cold_index():
+        landmarkLoader.wide_row_indexes.clear()
+        landmarkLoader.wide_row_index(wide_csv)
+
+    target_landmarks = compareCameraLandmarks.read_target_landmarks(wide_csv, n, m, x)
+    seconds, frames = target_landmarks.shape[:2]
+    positions = iter(range(10 ** 9))
+
+    repeats = 5 if quick else 20
+    return {
+        'landmarkLoader.wide_row_index': measure(cold_index, repeats),
+        'compareCameraLandmarks.read_target_landmarks': measure(lambda: compareCameraLandmarks.read_target_landmarks(wide_csv, n, m, x), repeats),
+        'compareCameraLandmarks.target_frame': measure(lambda: target_landmarks[next(positions) % seconds, next(positions) % frames], 10000),
+    }
+
+
+def benchmark_rendering(work_dir, quick=False):
+    """Times generate_video_from_landmarks on the reference CSV, throughput in frames per second."""
+    from extractLandmarksVideo import generate_video_from_landmarks
+
+    m, n, x = EXERCISE
+    output_video = os.path.join(work_dir, 'landmarks.mp4')
+    frames = len(open_exercise(m, n, x, csv_file=REFERENCE_CSV)['landmarks'])
+    return {
+        'extractLandmarksVideo.generate_video_from_landmarks': measure(
+            lambda: generate_video_from_landmarks(REFERENCE_CSV, output_video, m=m, n=n, x=x), 1 if quick else 3, items=frames),
+    }
+
+
+def benchmark_live_pipeline(videos, work_dir, quick=False):
+    """
+    Runs the whole live comparison loop of testCamera.process_camera and compareCameraLandmarks.process_camera_feed_with_comparison
+    on the first fixture video replayed as fast as it decodes, without a window. Throughput in frames per second.
+    The quick run replays its first frames from memory instead.
+    """
+    from testCamera import process_camera
+    from compareCameraLandmarks import process_camera_feed_with_comparison
+    from frameSource import open_video_source, open_synthetic_source, open_headless_sink
+
+    results = {}
+    if not videos:
+        return results
+
+    if quick:
+        frames = read_frames(videos[0], EXTRACTION_FRAMES // 4)
+        open_source = lambda: open_synthetic_source(images=frames, count=len(frames))
+    else:
+        open_source = lambda: open_video_source(videos[0], realtime=False)
+    name = f"[{'memory' if quick else os.path.basename(videos[0])}]"
+
+    m, n, x = EXERCISE
+    live_report = {}
+
+    def run_session():
+        live_report.update(process_camera(m, n, x, reference_csv=REFERENCE_CSV, source=open_source(), sink=open_headless_sink(),
+                                         haptics=False))
+
+    results[f"testCamera.process_camera{name}"] = measure(run_session, 1, items=lambda: live_report['rendered'], warmup=0)
+
+    wide_csv = os.path.join(work_dir, 'wide_live.csv')
+    wide_n, wide_m, wide_x = write_wide_csv(wide_csv, exercises=1)[0]
+    comparison_report = {}
+
+    def run_comparison():
+        # The comparison prints every joint outside the radius, which is not what is being timed
+        with contextlib.redirect_stdout(io.StringIO()):
+            comparison_report.update(process_camera_feed_with_comparison(wide_csv, wide_n, wide_m, wide_x, b=0.02,
+                                                                         source=open_source(), sink=open_headless_sink()))
+
+    results[f"compareCameraLandmarks.process_camera_feed_with_comparison{name}"] = measure(
+        run_comparison, 1, items=lambda: comparison_report['frames'], warmup=0)
+    return results
+
+
+def benchmark_startup(videos, quick=False):
+    """
+    Times the cold import of the web server (app.py, in a new interpreter, with its shipped model pool
+    settings), the server's model pool getting warm, and the time from starting a session
+    (testCamera.process_camera on a video) to its first scored frame, with landmark models created for it
+    or borrowed warm from modelPool.
+    """
+    from testCamera import process_camera
+    from frameSource import open_video_source, open_headless_sink
+    from modelPool import create_model_pool, start_model_pool, acquire_extractor, release_extractor, close_model_pool
+
+    environment = {key: value for key, value in os.environ.items() if key != 'FORMIFY_MODEL_POOL'}
+
+    def run_app(code):
+        subprocess.run([sys.executable, '-c', code], env=environment, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    results = {
+        'app.import': measure(lambda: run_app('import app'), 1 if quick else 3),
+        'app.model_pool.warm': measure(lambda: run_app("import app; app.start_model_pool(app.model_pool)['thread'].join()"), 1),
+    }
+    if not videos:
+        return results
+
+    m, n, x = EXERCISE
+    first_frame = {}
+
+    def session_until_first_frame(extractor=None):
+        stop_event = threading.Event()
+
+        def on_frame(*_):
+            if not stop_event.is_set():
+                first_frame['seconds'] = time.perf_counter() - first_frame['started']
+                stop_event.set()
+
+        first_frame['started'] = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_camera(m, n, x, reference_csv=REFERENCE_CSV, source=open_video_source(videos[0], realtime=False),
+                           sink=open_headless_sink(), haptics=False, stop_event=stop_event, on_frame=on_frame, extractor=extractor)
+
+    pool = start_model_pool(create_model_pool(1))
+    pool['thread'].join()
+
+    def pooled_session():
+        extractor = acquire_extractor(pool)
+        try:
+            session_until_first_frame(extractor)
+        finally:
+            release_extractor(pool, extractor)
+
+    repeats = 1 if quick else 3
+    results['testCamera.process_camera.first_frame[cold]'] = measure(session_until_first_frame, repeats, latency=lambda: first_frame['seconds'])
+    results['testCamera.process_camera.first_frame[pooled]'] = measure(pooled_session, repeats, latency=lambda: first_frame['seconds'], warmup=0)
+    close_model_pool(pool)
+    return results
+
+
+def run_benchmarks(quick=False, extraction=True):
+    """Runs every benchmark (extraction is the slow one, it can be left out). Returns the results keyed by benchmark name."""
+    work_dir = tempfile.mkdtemp(prefix='formify-bench-')
+    try:
+        results = {}
+        if extraction:
+            videos = fixture_videos()
+            results.update(benchmark_extraction(videos, work_dir, quick))
+            results.update(benchmark_live_pipeline(videos, work_dir, quick))
+            results.update(benchmark_startup(videos, quick))
+        results.update(benchmark_reference_lookup(quick))
+        results.update(benchmark_scoring(quick))
+        results.update(benchmark_wide_lookup(work_dir, quick))
+        results.update(benchmark_rendering(work_dir, quick))
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Compares two runs' results. Returns {name: reason} for every benchmark slower than the baseline beyond the threshold."""
+    regressions = {}
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if stats['p50_ms'] - before['p50_ms'] < REGRESSION_FLOOR_MS:
+            continue
+        if stats['p50_ms'] > before['p50_ms'] * (1 + threshold):
+            regressions[name] = f"p50 {before['p50_ms']:.3f} -> {stats['p50_ms']:.3f} ms"
+        elif before['throughput'] > 0 and stats['throughput'] < before['throughput'] * (1 - threshold):
+            regressions[name] = f"throughput {before['throughput']:,.1f} -> {stats['throughput']:,.1f}/s"
+    return regressions
+
+
+def print_results(results, regressions):
+    print(f"{'benchmark':<58} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'items/s':>12}")
+    for name, stats in results.items():
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f"{name:<58} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['p99_ms']:>10.3f} {stats['throughput']:>12,.1f}{flag}")
+    for name, reason in regressions.items():
+        print(f"Regression in {name}: {reason}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the extraction, lookup, scoring and rendering hot paths offline.")
+    parser.add_argument('--output', default=RESULTS_FILE, help="JSON file the results are written to")
+    parser.add_argument('--baseline', help="JSON results to compare with (default: the previous contents of --output)")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="relative slowdown flagged as a regression")
+    parser.add_argument('--quick', action='store_true', help="fewer repeats and a single video")
+    parser.add_argument('--no-extraction', action='store_true', help="skip the MediaPipe extraction benchmarks")
+    args = parser.parse_args()
+
+    baseline_file = args.baseline or args.output
+    baseline = None
+    if os.path.exists(baseline_file):
+        with open(baseline_file) as file:
+            baseline = json.load(file)
+
+    results = run_benchmarks(args.quick, not args.no_extraction)
+    regressions = find_regressions(results, baseline['results'], args.threshold) if baseline else {}
+    print_results(results, regressions)
+
+    with open(args.output, 'w') as file:
+        json.dump({
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'quick': args.quick,
+            'results': results,
+            'regressions': regressions,
+        }, file, indent=2)
+    print(f"Results written to {args.output}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,220 @@
+import collections
+import queue
+import threading
+import time
+
+import numpy as np
+
+from landmarkExtractor import extract_landmarks
+from frameSource import read_frame
+from stageMetrics import start_timer, record_stage
+
+# Constants
+QUEUE_SIZE = 1  # Frames waiting between stages, only the freshest frame is kept
+LATENCY_WINDOW = 300  # Number of recent frames used for the latency report
+GOVERNOR_SMOOTHING = 0.1  # Weight of the newest inference time in the governor's moving average
+MAX_SKIPPED_FRAMES = 3  # Frames in a row that may reuse the previous landmarks
+
+
+def create_governor(target_fps):
+    """
+    Creates the adaptive governor for the inference stage.
+
+    It keeps a moving average of the inference time and, while that is over the frame budget
+    (1 / target_fps), skips inference on enough frames to stay within it. Skipped frames are still
+    rendered and scored, with the most recent landmarks.
+    """
+    return {
+        'budget': 1.0 / target_fps,
+        'average': 0.0,
+        'samples': 0,
+        'skip': 0,  # Frames to skip after each inferred frame
+        'skipped_in_a_row': 0,
+    }
+
+
+def should_infer(governor):
+    """Tells the inference stage whether to run inference on the next frame."""
+    if governor is None or governor['skipped_in_a_row'] >= governor['skip']:
+        return True
+    governor['skipped_in_a_row'] += 1
+    return False
+
+
+def record_inference_time(governor, seconds):
+    """Updates the governor with the duration of one inference and recomputes how many frames to skip."""
+    if governor is None:
+        return
+
+    # The first inference includes the model warm-up and would skew the average
+    governor['samples'] += 1
+    if governor['samples'] == 1:
+        return
+    if governor['samples'] == 2:
+        governor['average'] = seconds
+    else:
+        governor['average'] += GOVERNOR_SMOOTHING * (seconds - governor['average'])
+
+    # e.g. inference taking 2.5 budgets -> skip 2 frames after each inferred one
+    governor['skip'] = min(MAX_SKIPPED_FRAMES, max(0, int(governor['average'] / governor['budget'])))
+    governor['skipped_in_a_row'] = 0
+
+
+def put_latest(stage_queue, item):
+    """Puts an item on a bounded queue, dropping the oldest items when it is full. Returns how many were dropped."""
+    dropped = 0
+    while True:
+        try:
+            stage_queue.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                stage_queue.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+
+def put_waiting(stage_queue, item, stop_event):
+    """Puts an item on a queue, waiting for room instead of dropping anything, unless the pipeline is stopping. Returns 0 dropped items, like put_latest."""
+    while not stop_event.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return 0
+        except queue.Full:
+            pass
+    return 0
+
+
+def put_end(stage_queue, stop_event):
+    """Puts the end-of-stream marker after the queued items, without dropping them, unless the pipeline is stopping."""
+    put_waiting(stage_queue, None, stop_event)
+
+
+def put_item(stage_queue, item, stop_event, lossless):
+    """Queues an item for the next stage: the freshest-only put_latest for live sources, put_waiting when lossless."""
+    return put_waiting(stage_queue, item, stop_event) if lossless else put_latest(stage_queue, item)
+
+
+def capture_frames(source, frames, stop_event, stats, lossless=False):
+    """Capture stage: reads frames as fast as the source delivers them, keeping only the newest one queued unless lossless."""
+    frame_id = 0
+    while not stop_event.is_set():
+        started = start_timer()
+        ret, frame = read_frame(source)
+        if not ret:
+            break
+        record_stage('capture', started)
+
+        stats['captured'] += 1
+        stats['dropped_capture'] += put_item(frames, (frame_id, time.perf_counter(), frame), stop_event, lossless)
+        frame_id += 1
+
+    # Tell the next stage the stream has ended
+    put_end(frames, stop_event)
+
+
+def infer_frames(extractor, frames, results, stop_event, stats, governor=None, lossless=False):
+    """Inference stage: extracts the [75, 3] landmarks of the freshest captured frame, unless the governor skips it."""
+    live_landmarks = None
+    while not stop_event.is_set():
+        try:
+            item = frames.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is None:
+            break
+
+        frame_id, capture_time, frame = item
+        if live_landmarks is None or should_infer(governor):
+            inference_start = time.perf_counter()
+            live_landmarks = extract_landmarks(extractor, frame)
+            record_inference_time(governor, time.perf_counter() - inference_start)
+            stats['inferred'] += 1
+        else:
+            stats['skipped_inference'] += 1
+        stats['dropped_inference'] += put_item(results, (frame_id, capture_time, frame, live_landmarks), stop_event, lossless)
+
+    put_end(results, stop_event)
+
+
+def start_pipeline(source, extractor, queue_size=QUEUE_SIZE, target_fps=None):
+    """
+    Starts the capture and inference threads for a frame source (see frameSource).
+
+    The render stage runs on the caller's thread (cv2.imshow must stay on the main thread) and
+    pulls results with next_result. With target_fps set, an adaptive governor skips inference on
+    some frames whenever inference cannot keep up with that rate. A source that is not live (a
+    video or synthetic frames replayed at full speed) is processed losslessly instead: every frame
+    is inferred and the stages wait for each other. Returns the pipeline dict used by the other functions.
+    """
+    lossless = not source['live']
+    pipeline = {
+        'frames': queue.Queue(maxsize=queue_size),
+        'results': queue.Queue(maxsize=queue_size),
+        'stop_event': threading.Event(),
+        'governor': create_governor(target_fps) if target_fps and not lossless else None,
+        'lossless': lossless,
+        'stats': {
+            'captured': 0,
+            'inferred': 0,
+            'skipped_inference': 0,
+            'rendered': 0,
+            'dropped_capture': 0,
+            'dropped_inference': 0,
+            'latencies': collections.deque(maxlen=LATENCY_WINDOW),
+            'started_at': time.perf_counter(),
+        },
+    }
+    pipeline['threads'] = [
+        threading.Thread(target=capture_frames, args=(source, pipeline['frames'], pipeline['stop_event'], pipeline['stats'], lossless), daemon=True),
+        threading.Thread(target=infer_frames, args=(extractor, pipeline['frames'], pipeline['results'], pipeline['stop_event'], pipeline['stats'],
+                                                    pipeline['governor'], lossless), daemon=True),
+    ]
+    for thread in pipeline['threads']:
+        thread.start()
+    return pipeline
+
+
+def next_result(pipeline, timeout=1.0):
+    """
+    Waits for the freshest inference result: (frame_id, capture_time, frame, live_landmarks).
+
+    Returns None when the stream has ended, and False when nothing arrived before the timeout.
+    """
+    try:
+        return pipeline['results'].get(timeout=timeout)
+    except queue.Empty:
+        return False
+
+
+def record_rendered(pipeline, capture_time):
+    """Records a rendered frame and its end-to-end latency (capture to display)."""
+    stats = pipeline['stats']
+    stats['rendered'] += 1
+    stats['latencies'].append(time.perf_counter() - capture_time)
+
+
+def stop_pipeline(pipeline, timeout=1.0):
+    """Stops the capture and inference threads."""
+    pipeline['stop_event'].set()
+    for thread in pipeline['threads']:
+        thread.join(timeout)
+
+
+def pipeline_report(pipeline):
+    """Summarizes a pipeline run: frame counts, dropped frames, fps and end-to-end latency in milliseconds."""
+    stats = pipeline['stats']
+    elapsed = time.perf_counter() - stats['started_at']
+    latencies = np.array(stats['latencies']) * 1000
+
+    return {
+        'captured': stats['captured'],
+        'inferred': stats['inferred'],
+        'skipped_inference': stats['skipped_inference'],
+        'rendered': stats['rendered'],
+        'dropped_frames': stats['dropped_capture'] + stats['dropped_inference'],
+        'fps': stats['rendered'] / elapsed if elapsed > 0 else 0.0,
+        'latency_ms_mean': float(latencies.mean()) if len(latencies) else None,
+        'latency_ms_p95': float(np.percentile(latencies, 95)) if len(latencies) else None,
+    }
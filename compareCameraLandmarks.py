@@ -1,142 +1,142 @@
-import math
+import time
 import cv2
-import mediapipe as mp
-import csv
+import numpy as np
 
-def is_within_radius(point_x, point_y, target_x, target_y, b):
-    """Checks if a point (point_x, point_y) is within the radius `b` of the target point (target_x, target_y)."""
-    distance = math.sqrt((point_x - target_x)**2 + (point_y - target_y)**2)
-    return distance <= b
+from referenceStore import NUM_POSE_LANDMARKS, NUM_HAND_LANDMARKS, NUM_HANDS, NUM_LANDMARKS
+from landmarkLoader import load_exercise
+from landmarkExtractor import LIVE_MODE, create_landmark_extractor, extract_landmarks, close_landmark_extractor
+from frameSource import open_frame_source, read_frame, release_source, open_window_sink, show_frame, close_sink
 
 def read_target_landmarks(output_csv, n, m, x):
-    """Reads the target landmarks from the CSV for the specific n, m, x combination."""
-    with open(output_csv, mode='r') as file:
-        reader = csv.reader(file)
-        headers = next(reader)  # Read the header row
-        for row in reader:
-            # Assume the CSV row starts with the values n, m, x in the first three columns
-            if row[0] == n and row[1] == m and row[2] == x:
-                return headers, row
-    print(f"Error: No matching n, m, x values found in {output_csv}")
-    return None, None
+    """
+    Reads the target landmarks of the specific n, m, x combination from the wide CSV (landmarkLoader, which
+    seeks straight to the exercise's row once the file is indexed).
+
+    Returns a [seconds, frames, 75, 3] float array (NaN for empty cells) indexed by the second/frame slots,
+    or None when there is no such row.
+    """
+    exercise = load_exercise(output_csv, m, n, x)
+    if exercise is None:
+        return None
+
+    frame_table = exercise['frame_table']
+    target_landmarks = np.full(frame_table.shape + (NUM_LANDMARKS, 3), np.nan, dtype=np.float32)
+    present = frame_table >= 0
+    target_landmarks[present] = exercise['landmarks'][frame_table[present]]
+    return target_landmarks
 
 def draw_landmarks(frame, landmarks, color):
-    """Draws landmarks on the frame using the specified color."""
+    """Draws a [k, 3] landmark array on the frame using the specified color, skipping missing (NaN) landmarks."""
     for landmark in landmarks:
+        if np.isnan(landmark[0]):
+            continue
         # Get the coordinates of the landmark
-        x = int(landmark.x * frame.shape[1])
-        y = int(landmark.y * frame.shape[0])
+        x = int(landmark[0] * frame.shape[1])
+        y = int(landmark[1] * frame.shape[0])
         # Draw the landmark as a circle
         cv2.circle(frame, (x, y), 5, color, -1)  # -1 fills the circle
 
-def process_camera_feed_with_comparison(output_csv, n, m, x, b, target_fps=30):
-    """Processes the camera feed and compares landmarks with values from the CSV."""
-    # Initialize mediapipe solutions
-    mp_pose = mp.solutions.pose
-    mp_hands = mp.solutions.hands
-    pose = mp_pose.Pose()
-    hands = mp_hands.Hands()
-
-    # Get target data from CSV based on n, m, x combination
-    headers, target_data = read_target_landmarks(output_csv, n, m, x)
-    if not target_data:
+def process_camera_feed_with_comparison(output_csv, n, m, x, b, target_fps=30, extractor_mode=LIVE_MODE, source=0, sink=None):
+    """
+    Processes the camera feed and compares landmarks with values from the CSV.
+
+    source and sink are the same as for testCamera.process_camera: the default camera and an OpenCV window
+    unless e.g. a video path and frameSource.open_headless_sink() are given. Returns {'frames', 'fps'}
+    (frames shown per second), or None when the target landmarks or the source are missing.
+    """
+    # Get target data from CSV based on n, m, x combination, as a [seconds, frames, 75, 3] array
+    target_landmarks = read_target_landmarks(output_csv, n, m, x)
+    if target_landmarks is None:
         return  # Exit if no matching data found
 
-    # Initialize video capture (camera feed)
-    cap = cv2.VideoCapture(0)  # 0 means using the default camera
+    # Initialize the landmark models (one pass for pose and hands)
+    extractor = create_landmark_extractor(extractor_mode)
 
-    # Get frame rate of the camera
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps == 0:
-        print("Error: Unable to read camera frame rate.")
+    # Open the camera feed (or video / synthetic frames) and where the frames are shown
+    source = open_frame_source(source)
+    if source is None:
+        close_landmark_extractor(extractor)
         return
+    if sink is None:
+        sink = open_window_sink('Camera Feed')
+
+    # Get frame rate of the source
+    fps = source['fps']
 
     frame_interval = max(1, int(fps / target_fps))  # Calculate frame interval ensuring it's at least 1
 
     # Initialize frame count
     frame_count = 0
+    started_at = time.perf_counter()
 
-    while cap.isOpened():
-        ret, frame = cap.read()
+    while True:
+        ret, frame = read_frame(source)
         if not ret:
             break
 
         # Process every frame at the interval that matches target FPS
         if frame_count % frame_interval == 0:
             # Calculate the current time in seconds based on frame_count
-            time_seconds = frame_count // fps
-
-            # Extract pose landmarks from camera feed
-            pose_results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            if pose_results.pose_landmarks:
-                user_pose_landmarks = pose_results.pose_landmarks.landmark
+            time_seconds = int(frame_count // fps)
+            frame_position = frame_count % target_fps
+
+            # Target landmarks for the current second and frame, straight from the array
+            if time_seconds < target_landmarks.shape[0] and frame_position < target_landmarks.shape[1]:
+                target = target_landmarks[time_seconds, frame_position]
+            else:
+                print(f"No target landmarks in CSV for time {time_seconds} and frame {frame_position:02d}")
+                target = None
+
+            # Extract pose and hand landmarks from camera feed in one pass
+            live_landmarks = extract_landmarks(extractor, frame)
+
+            # Distance of every live joint from its target (NaN where either one is missing)
+            if target is not None:
+                distances = np.hypot(live_landmarks[:, 0] - target[:, 0], live_landmarks[:, 1] - target[:, 1])
+                outside = distances > b
+
+            user_pose_landmarks = live_landmarks[:NUM_POSE_LANDMARKS]
+            if not np.isnan(user_pose_landmarks[:, 0]).all():
                 # Draw user's pose landmarks in orange
                 draw_landmarks(frame, user_pose_landmarks, (0, 165, 255))  # Orange color
 
-                for i, landmark in enumerate(user_pose_landmarks):
-                    # Extract corresponding target data from CSV for the current joint
-                    try:
-                        # Find target x, y for the user's pose landmarks from the CSV
-                        target_x = float(target_data[headers.index(f"{time_seconds:02d}_{frame_count % target_fps:02d}_pose_{i}_x")])
-                        target_y = float(target_data[headers.index(f"{time_seconds:02d}_{frame_count % target_fps:02d}_pose_{i}_y")])
-
-                        # Check if the current pose point is within the radius `b` of the target point
-                        if not is_within_radius(landmark.x, landmark.y, target_x, target_y, b):
-                            print(f"Pose landmark {i} at frame {frame_count % target_fps:02d} is outside radius")
-                    except (ValueError, IndexError):
-                        print(f"Pose landmark {i} does not exist in CSV for time {time_seconds} and frame {frame_count % target_fps:02d}")
-
-            # Extract hand landmarks from camera feed
-            hand_results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            if hand_results.multi_hand_landmarks:
-                for hand_index, hand_landmarks in enumerate(hand_results.multi_hand_landmarks):
-                    user_hand_landmarks = hand_landmarks.landmark
-                    # Draw user's hand landmarks in yellow
-                    draw_landmarks(frame, user_hand_landmarks, (0, 255, 255))  # Yellow color
-
-                    for i, landmark in enumerate(user_hand_landmarks):
-                        try:
-                            # Find target x, y for the user's hand landmarks from the CSV
-                            target_x = float(target_data[headers.index(f"{time_seconds:02d}_{frame_count % target_fps:02d}_hand_{hand_index}_{i}_x")])
-                            target_y = float(target_data[headers.index(f"{time_seconds:02d}_{frame_count % target_fps:02d}_hand_{hand_index}_{i}_y")])
-
-                            # Check if the current hand point is within the radius `b` of the target point
-                            if not is_within_radius(landmark.x, landmark.y, target_x, target_y, b):
-                                print(f"Hand landmark {i} (hand {hand_index}) at frame {frame_count % target_fps:02d} is outside radius")
-                        except (ValueError, IndexError):
-                            print(f"Hand landmark {i} does not exist in CSV for time {time_seconds} and frame {frame_count % target_fps:02d}")
-
-            # Draw target landmarks from CSV
-            for i in range(len(target_data) // 3):  # Assuming target_data has x, y, z for each landmark
-                try:
-                    # Draw target pose landmarks in blue
-                    target_x = float(target_data[headers.index(f"{time_seconds:02d}_{frame_count % target_fps:02d}_pose_{i}_x")])
-                    target_y = float(target_data[headers.index(f"{time_seconds:02d}_{frame_count % target_fps:02d}_pose_{i}_y")])
-                    cv2.circle(frame, (int(target_x * frame.shape[1]), int(target_y * frame.shape[0])), 5, (255, 0, 0), -1)  # Blue color for pose
-
-                    # Draw target hand landmarks in green
-                    target_x = float(target_data[headers.index(f"{time_seconds:02d}_{frame_count % target_fps:02d}_hand_0_{i}_x")])
-                    target_y = float(target_data[headers.index(f"{time_seconds:02d}_{frame_count % target_fps:02d}_hand_0_{i}_y")])
-                    cv2.circle(frame, (int(target_x * frame.shape[1]), int(target_y * frame.shape[0])), 5, (0, 255, 0), -1)  # Green color for hand
-
-                except (ValueError, IndexError):
+                if target is not None:
+                    for i in np.flatnonzero(outside[:NUM_POSE_LANDMARKS]):
+                        print(f"Pose landmark {i} at frame {frame_position:02d} is outside radius")
+
+            for hand_index in range(NUM_HANDS):
+                start = NUM_POSE_LANDMARKS + hand_index * NUM_HAND_LANDMARKS
+                user_hand_landmarks = live_landmarks[start:start + NUM_HAND_LANDMARKS]
+                if np.isnan(user_hand_landmarks[:, 0]).all():
                     continue
+                # Draw user's hand landmarks in yellow
+                draw_landmarks(frame, user_hand_landmarks, (0, 255, 255))  # Yellow color
+
+                if target is not None:
+                    for i in np.flatnonzero(outside[start:start + NUM_HAND_LANDMARKS]):
+                        print(f"Hand landmark {i} (hand {hand_index}) at frame {frame_position:02d} is outside radius")
 
-        # Display the frame with landmarks
-        cv2.imshow('Camera Feed', frame)
+            # Draw target landmarks from CSV: pose in blue, the first hand in green
+            if target is not None:
+                draw_landmarks(frame, target[:NUM_POSE_LANDMARKS], (255, 0, 0))  # Blue color for pose
+                draw_landmarks(frame, target[NUM_POSE_LANDMARKS:NUM_POSE_LANDMARKS + NUM_HAND_LANDMARKS], (0, 255, 0))  # Green color for hand
 
-        # Exit if 'q' is pressed
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        # Display the frame with landmarks, exit if 'q' is pressed
+        if not show_frame(sink, frame):
             break
 
         # Increment frame count
         frame_count += 1
 
-    # Release camera capture and close any open windows
-    cap.release()
-    cv2.destroyAllWindows()
+    # Release the source and close the window
+    elapsed = time.perf_counter() - started_at
+    release_source(source)
+    close_sink(sink)
+    close_landmark_extractor(extractor)
+    return {'frames': sink['frames'], 'fps': sink['frames'] / elapsed if elapsed > 0 else 0.0}
 
 
 
-# Example usage:
-process_camera_feed_with_comparison('output_landmarks.csv', 'arm_stretch', '8_12_weeks', 'easy', b=0.02)
+if __name__ == '__main__':
+    # Example usage:
+    process_camera_feed_with_comparison('output_landmarks.csv', 'arm_stretch', '8_12_weeks', 'easy', b=0.02)
@@ -1,23 +1,29 @@
 import cv2
-import mediapipe as mp
-import pandas as pd
+import numpy as np
 import csv
 
+from referenceStore import POSE_LANDMARK_NAMES
+from landmarkLoader import load_landmarks
+from landmarkExtractor import DEFAULT_MODE, create_landmark_extractor, extract_landmarks, close_landmark_extractor
+
 # Function to load shoulder coordinates from demo CSV
 def load_shoulder_coordinates(demo_csv):
-    demo_data = pd.read_csv(demo_csv)
-    right_shoulder_x = demo_data[demo_data['time_frame_pose_x'].str.contains('right_shoulder_x')]['time_frame_pose_x'].iloc[0].split('_')[-1]
-    right_shoulder_y = demo_data[demo_data['time_frame_pose_x'].str.contains('right_shoulder_y')]['time_frame_pose_x'].iloc[0].split('_')[-1]
-    return float(right_shoulder_x), float(right_shoulder_y)
+    # First frame of the demo where the right shoulder was detected
+    right_shoulder = POSE_LANDMARK_NAMES.index('right_shoulder')
+    for exercise in load_landmarks(demo_csv).values():
+        detected = np.flatnonzero(~np.isnan(exercise['landmarks'][:, right_shoulder, :2]).any(axis=1))
+        if len(detected):
+            right_shoulder_x, right_shoulder_y = exercise['landmarks'][detected[0], right_shoulder, :2].tolist()
+            return right_shoulder_x, right_shoulder_y
+    raise ValueError(f"No right shoulder landmark found in {demo_csv}")
 
 # Process camera input and display landmarks and demo shoulder position
-def process_camera_with_demo(output_csv, demo_csv, n, m, x):
+def process_camera_with_demo(output_csv, demo_csv, n, m, x, extractor_mode=DEFAULT_MODE):
     # Load demo shoulder coordinates
     demo_x, demo_y = load_shoulder_coordinates(demo_csv)
 
-    # Initialize mediapipe solutions
-    mp_pose = mp.solutions.pose
-    mp_hands = mp.solutions.hands
+    # Initialize the landmark models once for the whole stream (one pass for pose and hands)
+    extractor = create_landmark_extractor(extractor_mode)
     
     # Initialize video capture
     cap = cv2.VideoCapture(0)  # Use the first camera
@@ -35,36 +41,18 @@ def process_camera_with_demo(output_csv, demo_csv, n, m, x):
             if not ret:
                 break
             
-            # Convert the image to RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-
-            with mp_hands.Hands(static_image_mode= False ) as hands, mp_pose.Pose(static_image_mode=False) as pose:
-                pose_results = pose.process(rgb_frame)
-                hand_results = hands.process(rgb_frame)
-                # Draw landmarks and demo shoulder position
-                if pose_results.pose_landmarks:
-                    for landmark in pose_results.pose_landmarks.landmark:
-                        # Convert landmark coordinates to pixel values
-                        h, w, _ = frame.shape
-                        x_px = int(landmark.x * w)
-                        y_px = int(landmark.y * h)
-                        
-                        # Draw the live landmarks
-                        cv2.circle(frame, (x_px, y_px), 5, (0, 255, 0), -1)  # Green for live landmarks
-               # Draw hand landmarks
-                if hand_results.multi_hand_landmarks:
-                    for hand_landmarks in hand_results.multi_hand_landmarks:
-                        for landmark in hand_landmarks.landmark:
-                            # Convert landmark coordinates to pixel values
-                            h, w, _ = frame.shape
-                            x_px = int(landmark.x * w)
-                            y_px = int(landmark.y * h)
-
-                            # Draw the live landmarks
-                            cv2.circle(frame, (x_px, y_px), 5, (0, 255, 0), -1)  # Green for hand landmarks
+            # Extract pose and hand landmarks as one [75, 3] array
+            live_landmarks = extract_landmarks(extractor, frame)
 
-                # for
+            # Draw the live pose and hand landmarks
+            h, w, _ = frame.shape
+            for landmark in live_landmarks:
+                if np.isnan(landmark[0]):
+                    continue
+                # Convert landmark coordinates to pixel values
+                x_px = int(landmark[0] * w)
+                y_px = int(landmark[1] * h)
+                cv2.circle(frame, (x_px, y_px), 5, (0, 255, 0), -1)  # Green for live landmarks
 
             # TODO: render the image of the shoulder
             
@@ -79,6 +67,7 @@ def process_camera_with_demo(output_csv, demo_csv, n, m, x):
 
     cap.release()
     cv2.destroyAllWindows()
+    close_landmark_extractor(extractor)
 
 # Example usage
 process_camera_with_demo('output_landmarks_camera.csv', 'output_landmarks.csv', 'n_value', 'm_value', 'x_value')
\ No newline at end of file
@@ -1,15 +1,18 @@
 import cv2 
-import mediapipe as mp
-import csv
 import os
 
-import pandas as pd
-
 
 
 # import cv2
 import numpy as np
 # import csv
+
+from referenceStore import VALUES_PER_FRAME
+from landmarkLoader import load_landmarks
+from landmarkExtractor import DEFAULT_MODE, create_landmark_extractor, extract_landmarks, close_landmark_extractor, landmarks_to_row, extractor_settings
+from extractionCache import CACHE_DIR, open_extraction_cache, save_extraction_cache, cache_key, load_cached_landmarks, save_cached_landmarks
+from landmarkWriter import open_landmark_writer, write_row, close_landmark_writer
+from landmarkRenderer import render_landmarks
 length_Of_vid = 10
 
 
@@ -44,12 +47,20 @@ def generate_header(target_fps=30, duration=10):
 
 
 
-def process_video(video_path, output_csv, n, m, x, target_fps=30):
-    # Initialize mediapipe solutions
-    mp_pose = mp.solutions.pose
-    mp_hands = mp.solutions.hands
-    pose = mp_pose.Pose()
-    hands = mp_hands.Hands()
+def process_video(video_path, writer, n, m, x, target_fps=30, duration=length_Of_vid, extractor_mode=DEFAULT_MODE, cache=None):
+    """Extracts one video into a single wide row (n, m, x + every second/frame slot of generate_header) on the writer."""
+    # Reuse the landmarks when this video was already extracted with the same parameters
+    if cache is not None:
+        params = {'target_fps': target_fps, 'duration': duration, 'layout': 'wide', 'extractor': extractor_settings(extractor_mode)}
+        key = cache_key(cache, video_path, params)
+        cached = load_cached_landmarks(cache, key)
+        if cached is not None:
+            print(f"{os.path.basename(video_path)}: from cache")
+            write_row(writer, [n, m, x] + landmarks_to_row(cached[0]))
+            return
+
+    # Initialize the landmark models (one pass for pose and hands)
+    extractor = create_landmark_extractor(extractor_mode)
 
     # Initialize video capture
     cap = cv2.VideoCapture(video_path)
@@ -60,8 +71,12 @@ def process_video(video_path, output_csv, n, m, x, target_fps=30):
     # Check if fps is valid
     if fps == 0:
         print("Error: Unable to read video frame rate.")
+        close_landmark_extractor(extractor)
         return
 
+    # Frame slots per second in the header, before target_fps is limited to the video's fps
+    header_fps = int(target_fps)
+
     # Ensure target_fps is not greater than fps
     if target_fps > fps:
         print(f"Warning: target_fps {target_fps} is greater than the video's fps {fps}. Setting target_fps to {fps}.")
@@ -69,6 +84,9 @@ def process_video(video_path, output_csv, n, m, x, target_fps=30):
 
     frame_interval = max(1, int(fps / target_fps))  # Calculate frame interval ensuring it's at least 1
 
+    # Prepare row data with n, m, x followed by every landmark slot (empty when no frame lands in it)
+    row_data = [n, m, x] + [None] * (duration * header_fps * VALUES_PER_FRAME)
+
     # Initialize frame count
     frame_count = 0
 
@@ -80,70 +98,54 @@ def process_video(video_path, output_csv, n, m, x, target_fps=30):
         # Process every frame at the interval that matches target FPS
         if frame_count % frame_interval == 0:
             # Calculate the current time in seconds based on frame_count
-            time_seconds = frame_count // fps
-            frame_position = (frame_count // frame_interval) % target_fps  # Ensure integer
-
-            # Prepare row data with n, m, x, and timestamp/frame info
-            row_data = [n, m, x]  # Include n, m, x values at the start of each row
-
-            # Extract pose landmarks and append values
-            pose_results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            if pose_results.pose_landmarks:
-                pose_landmarks = pose_results.pose_landmarks.landmark
-
-                for i, landmark in enumerate(pose_landmarks):
-                    # Append corresponding values for pose landmarks
-                    row_data.append(landmark.x)
-                    row_data.append(landmark.y)
-                    row_data.append(landmark.z)
-
-            # Extract hand landmarks and append values
-            hand_results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            if hand_results.multi_hand_landmarks:
-                for hand_index, hand_landmarks in enumerate(hand_results.multi_hand_landmarks):
-                    for i, landmark in enumerate(hand_landmarks.landmark):
-                        # Append corresponding values for hand landmarks
-                        row_data.append(landmark.x)
-                        row_data.append(landmark.y)
-                        row_data.append(landmark.z)
-
-            # Add timestamp and frame info to row_data
-            row_data = [f"{time_seconds:02f}_{frame_position:02f}"] + row_data  # Timestamp at index 0
-            row_data.insert(1, frame_position)  # Insert frame position at index 1
-
-            # Open CSV file to write data
-            with open(output_csv, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                # Write the row data (n, m, x + landmarks data)
-                writer.writerow(row_data)
+            time_seconds = int(frame_count // fps)
+            frame_position = int((frame_count // frame_interval) % target_fps)  # Ensure integer
+
+            if time_seconds < duration and frame_position < header_fps:
+                # Extract pose and hand landmarks (NaN, written as empty cells, when not detected)
+                start = 3 + (time_seconds * header_fps + frame_position) * VALUES_PER_FRAME
+                row_data[start:start + VALUES_PER_FRAME] = landmarks_to_row(extract_landmarks(extractor, frame))
 
         # Increment frame count
         frame_count += 1
 
+    # Write the row data (n, m, x + landmarks data)
+    write_row(writer, row_data)
+
     # Release video capture
     cap.release()
+    close_landmark_extractor(extractor)
 
+    if cache is not None:
+        landmarks = np.array([np.nan if value is None else value for value in row_data[3:]], dtype=np.float32)
+        save_cached_landmarks(cache, key, video_path, params, landmarks.reshape(-1, VALUES_PER_FRAME), {})
 
-def main_process_videos(folder_path, output_csv, target_fps=30):
+
+def main_process_videos(folder_path, output_csv, target_fps=30, cache_dir=CACHE_DIR):
     # Generate the CSV header
-    header = generate_header(target_fps)
+    header = generate_header(target_fps, length_Of_vid)
 
     # Add the n, m, x columns to the header
     header = ['n', 'm', 'x'] + header
 
-    # Write the header to the CSV file
-    with open(output_csv, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(header)
+    # Open the CSV once and write the header
+    writer = open_landmark_writer(output_csv, header, batch_size=1)
+
+    # Videos that have not changed are read from the extraction cache (None disables it)
+    cache = open_extraction_cache(cache_dir) if cache_dir is not None else None
 
     # Process each video in the folder and append the rows of values
-    for file_name in os.listdir(folder_path):
+    for file_name in sorted(os.listdir(folder_path)):
         if file_name.endswith(('.mp4', '.avi', '.mov', '.mkv')):
             video_path = os.path.join(folder_path, file_name)
             # Extract n, m, x from the video filename
             n, m, x = extract_nmx_from_video(file_name)
             # Process the video and append the data to the CSV
-            process_video(video_path, output_csv, n, m, x, target_fps)
+            process_video(video_path, writer, n, m, x, target_fps, cache=cache)
+
+    close_landmark_writer(writer)
+    if cache is not None:
+        save_extraction_cache(cache)
 
 # Constants for canvas size and landmark scaling
 CANVAS_SIZE = (640, 480)
@@ -159,49 +161,23 @@ def draw_landmarks(frame, landmarks, color):
         # Draw a circle at the landmark position
         cv2.circle(frame, (x, y), LANDMARK_RADIUS, color, -1)
 
-def generate_video_from_landmarks(csv_file, output_video_path, target_fps=30, frame_size=(640, 480)):
-    # Read the CSV file into a DataFrame
-    df = pd.read_csv(csv_file)
-
-    # Get the total number of frames (rows) in the CSV
-    total_frames = len(df)
-
-    # Initialize video writer
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Use appropriate codec
-    out = cv2.VideoWriter(output_video_path, fourcc, target_fps, frame_size)
-
-    for frame_idx in range(total_frames):
-        # Get the row corresponding to the current frame
-        row = df.iloc[frame_idx]
-
-        # Extract landmarks data
-        landmarks = row[3:].values  # Skip n, m, x columns
+def generate_video_from_landmarks(csv_file, output_video_path, target_fps=30, frame_size=(640, 480), m=None, n=None, x=None):
+    """
+    Renders the landmarks of a CSV (the wide layout written here, or any other landmarkLoader layout) as a skeleton video.
 
-        # Create a blank image for the frame
-        frame = np.zeros((frame_size[1], frame_size[0], 3), dtype=np.uint8)
-
-        # Draw pose landmarks
-        for i in range(33):  # Assuming 33 pose landmarks
-            x = int(landmarks[i * 3] * frame_size[0])  # x-coordinate
-            y = int(landmarks[i * 3 + 1] * frame_size[1])  # y-coordinate
-            cv2.circle(frame, (x, y), 5, (0, 255, 0), -1)  # Draw pose landmark
-
-        # Draw hand landmarks
-        for hand_index in range(2):  # Assuming 2 hands
-            for i in range(21):  # Each hand has 21 landmarks
-                x = int(landmarks[99 + hand_index * 63 + i * 3] * frame_size[0])  # Hand x-coordinate
-                y = int(landmarks[99 + hand_index * 63 + i * 3 + 1] * frame_size[1])  # Hand y-coordinate
-                cv2.circle(frame, (x, y), 5, (255, 0, 0), -1)  # Draw hand landmark
-
-        # Write the frame to the video
-        out.write(frame)
+    With m, n and x only that exercise is rendered, otherwise every exercise in the file, one after another.
+    """
+    exercises = list(load_landmarks(csv_file, m, n, x).values())
+    if not exercises:
+        print(f"No landmarks to render in {csv_file}.")
+        return
 
-    # Release the video writer
-    out.release()
-    print(f"Video saved as: {output_video_path}")
+    frames = render_landmarks(np.concatenate([exercise['landmarks'] for exercise in exercises]), output_video_path, target_fps, frame_size)
+    print(f"Video saved as: {output_video_path} ({frames} frames)")
 
-# Example usage
-folder_path = 'videos\\'  # Replace with your folder path
-output_csv = 'output_landmarks_2.csv'
-main_process_videos(folder_path, output_csv)
-generate_video_from_landmarks(output_csv,"test_2.mp4")
\ No newline at end of file
+if __name__ == '__main__':
+    # Example usage
+    folder_path = 'videos\\'  # Replace with your folder path
+    output_csv = 'output_landmarks_2.csv'
+    main_process_videos(folder_path, output_csv)
+    generate_video_from_landmarks(output_csv,"test_2.mp4")
\ No newline at end of file
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Constants
+CACHE_DIR = '.extraction_cache'  # Folder holding the manifest and the cached landmark arrays
+MANIFEST_FILE = 'manifest.json'
+EXTRACTION_VERSION = 1  # Bump when the extraction code changes so old cache entries are not reused
+HASH_CHUNK_SIZE = 1024 * 1024  # Bytes read at a time when hashing a video
+
+
+def open_extraction_cache(cache_dir=CACHE_DIR):
+    """Opens (or creates) the extraction cache in cache_dir and loads its manifest."""
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+    manifest = {'files': {}, 'entries': {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, mode='r') as file:
+            manifest = json.load(file)
+
+    return {'dir': cache_dir, 'manifest_path': manifest_path, 'manifest': manifest}
+
+
+def save_extraction_cache(cache):
+    """Writes the manifest back to disk (written to a temporary file first so it is never left half written)."""
+    temporary_path = cache['manifest_path'] + '.tmp'
+    with open(temporary_path, mode='w') as file:
+        json.dump(cache['manifest'], file, indent=2, sort_keys=True)
+    os.replace(temporary_path, cache['manifest_path'])
+
+
+def hash_video(cache, video_path):
+    """Returns the SHA-256 of a video's content, reusing the manifest's hash when size and mtime are unchanged."""
+    stat = os.stat(video_path)
+    known = cache['manifest']['files'].get(os.path.abspath(video_path))
+    if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+        return known['sha256']
+
+    digest = hashlib.sha256()
+    with open(video_path, mode='rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    cache['manifest']['files'][os.path.abspath(video_path)] = {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'sha256': digest.hexdigest(),
+    }
+    return digest.hexdigest()
+
+
+def cache_key(cache, video_path, params):
+    """Builds the cache key of a video from its content hash, the extraction parameters and EXTRACTION_VERSION."""
+    key_data = {'video': hash_video(cache, video_path), 'params': params, 'version': EXTRACTION_VERSION}
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_cached_landmarks(cache, key):
+    """Returns (landmarks, meta) stored under key, or None when the video has not been extracted with these parameters."""
+    entry = cache['manifest']['entries'].get(key)
+    if entry is None:
+        return None
+
+    data_path = os.path.join(cache['dir'], entry['file'])
+    if not os.path.exists(data_path):
+        return None
+
+    with np.load(data_path) as data:
+        return data['landmarks'], entry['meta']
+
+
+def save_cached_landmarks(cache, key, video_path, params, landmarks, meta):
+    """Stores the float32 landmarks of one video (NaN when missing) with the JSON metadata needed to rebuild its rows."""
+    file_name = f"{key}.npz"
+    np.savez_compressed(os.path.join(cache['dir'], file_name), landmarks=np.asarray(landmarks, dtype=np.float32))
+
+    cache['manifest']['entries'][key] = {
+        'video': os.path.basename(video_path),
+        'params': params,
+        'version': EXTRACTION_VERSION,
+        'file': file_name,
+        'meta': meta,
+    }
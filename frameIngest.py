@@ -0,0 +1,113 @@
+import json
+import struct
+import time
+
+import cv2
+import numpy as np
+
+from referenceStore import reference_frame_at
+from landmarkScoring import DEFAULT_TOLERANCE, score_frame, empty_landmarks
+from landmarkFilter import create_landmark_filter, filter_landmarks, create_motor_gate, update_motor_gate
+from landmarkExtractor import LIVE_MODE, create_landmark_extractor, close_landmark_extractor, extract_landmarks
+
+# Constants
+FRAME_HEADER = struct.Struct('<Id')  # Frame sequence number, client capture time (ms, performance.now())
+DEVIATION_DECIMALS = 4  # Rounding of the per-joint deviations sent back
+
+
+def open_ingest(exercise, motor_joints=None, tolerance=DEFAULT_TOLERANCE, extractor_mode=LIVE_MODE, smoothing=True, extractor=None):
+    """
+    Opens the server side of a browser frame stream for one exercise (see referenceStore.open_exercise).
+
+    motor_joints maps glove motors to the joints they react to (one exercise of testCamera.MOTOR_JOINTS).
+    With smoothing, landmarks are filtered and motors gated as in testCamera.process_camera (landmarkFilter).
+    extractor is a landmark extractor to use instead of creating one (e.g. from modelPool), left open by close_ingest.
+    Returns the ingest dict used by process_frame_message and close_ingest.
+    """
+    return {
+        'exercise': exercise,
+        'motor_joints': motor_joints or {},
+        'tolerance': tolerance,
+        'extractor': extractor if extractor is not None else create_landmark_extractor(extractor_mode),
+        'owns_extractor': extractor is None,
+        'filter': create_landmark_filter() if smoothing else None,
+        'motor_gate': create_motor_gate(motor_joints, tolerance) if smoothing else None,
+        'first_client_time': None,
+        'frames': 0,
+        'bad_frames': 0,
+    }
+
+
+def close_ingest(ingest):
+    """Releases the landmark models of a frame stream, unless they were handed over by open_ingest's caller."""
+    if ingest['owns_extractor']:
+        close_landmark_extractor(ingest['extractor'])
+
+
+def decode_frame_message(message):
+    """
+    Splits a binary frame message into (sequence, client_time_ms, frame).
+
+    The message is FRAME_HEADER followed by the JPEG bytes. frame is None when the JPEG cannot be decoded.
+    """
+    if len(message) <= FRAME_HEADER.size:
+        return None, None, None
+
+    sequence, client_time = FRAME_HEADER.unpack_from(message)
+    jpeg = np.frombuffer(message, dtype=np.uint8, offset=FRAME_HEADER.size)
+    return sequence, client_time, cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+
+
+def process_frame_message(ingest, message):
+    """
+    Extracts and scores the landmarks of one binary frame message.
+
+    The reference pose is looked up at the client's capture time since its first frame, so network
+    jitter does not shift the reference. Returns (reply, distances, out_of_tolerance, score), where
+    reply is the dict to send back: the sequence number and client time (for the round-trip latency),
+    the score, per-joint deviations (None where missing), the joints out of tolerance, the glove motor
+    states and the server processing time. A frame that cannot be decoded still gets a reply, with the
+    sequence number (None when the header is cut short) and an error, so the client does not wait for it;
+    the other values are None then.
+    """
+    received_at = time.perf_counter()
+    sequence, client_time, frame = decode_frame_message(message)
+    if frame is None:
+        ingest['bad_frames'] += 1
+        return {'sequence': sequence, 'error': 'bad frame'}, None, None, None
+    decoded_at = time.perf_counter()
+
+    if ingest['first_client_time'] is None:
+        ingest['first_client_time'] = client_time
+    elapsed = (client_time - ingest['first_client_time']) / 1000
+
+    live_landmarks = extract_landmarks(ingest['extractor'], frame)
+    if ingest['filter'] is not None:
+        live_landmarks = filter_landmarks(ingest['filter'], live_landmarks, elapsed)
+    reference_frame = reference_frame_at(ingest['exercise'], elapsed)
+    distances, out_of_tolerance, score = score_frame(live_landmarks,
+                                                     reference_frame if reference_frame is not None else empty_landmarks(),
+                                                     ingest['tolerance'])
+    ingest['frames'] += 1
+    if ingest['motor_gate'] is not None:
+        motors = update_motor_gate(ingest['motor_gate'], distances, elapsed)
+    else:
+        motors = {motor: bool(out_of_tolerance[joints].any()) for motor, joints in ingest['motor_joints'].items()}
+    finished_at = time.perf_counter()
+
+    reply = {
+        'sequence': sequence,
+        'client_time': client_time,
+        'score': None if score != score else round(float(score), DEVIATION_DECIMALS),
+        'deviations': [None if distance != distance else distance for distance in np.round(distances, DEVIATION_DECIMALS).tolist()],
+        'out_of_tolerance': np.flatnonzero(out_of_tolerance).tolist(),
+        'motors': {str(motor): on for motor, on in motors.items()},
+        'decode_ms': round((decoded_at - received_at) * 1000, 2),
+        'server_ms': round((finished_at - received_at) * 1000, 2),
+    }
+    return reply, distances, out_of_tolerance, score
+
+
+def reply_message(reply):
+    """Serializes a reply for the text WebSocket message."""
+    return json.dumps(reply, separators=(',', ':'))
@@ -0,0 +1,148 @@
+import time
+
+import cv2
+import numpy as np
+
+from landmarkRenderer import FRAME_SIZE, VIDEO_CODEC, draw_skeletons
+
+# Constants
+CAMERA_FPS = 30  # Assumed when the camera does not report its frame rate
+SYNTHETIC_FRAMES = 300  # Frames a synthetic source yields by default
+WINDOW_TITLE = "Camera Feed with Landmarks and Countdown"
+
+
+def open_camera_source(index=0):
+    """Opens a camera. Returns the source dict used by read_frame / release_source, or None when it cannot be opened."""
+    cap = cv2.VideoCapture(index)
+    if not cap.isOpened():
+        print("Error: Unable to access the camera.")
+        cap.release()
+        return None
+    return {
+        'kind': 'camera',
+        'cap': cap,
+        'fps': cap.get(cv2.CAP_PROP_FPS) or CAMERA_FPS,
+        'live': True,  # Frames keep coming whether or not they are processed, so late ones may be dropped
+    }
+
+
+def open_video_source(path, realtime=True):
+    """
+    Replays a video file as if it were a camera (realtime, paced at the video's fps) or as fast as it
+    decodes (realtime=False: no frame is dropped, for reproducible profiling). None when it cannot be read.
+    """
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not cap.isOpened() or not fps:
+        print(f"Error: Unable to read video {path}.")
+        cap.release()
+        return None
+    return {
+        'kind': 'video',
+        'cap': cap,
+        'fps': fps,
+        'live': realtime,
+        'started_at': None,
+        'frames': 0,
+    }
+
+
+def open_synthetic_source(images=None, landmarks=None, count=SYNTHETIC_FRAMES, fps=CAMERA_FPS, realtime=False, frame_size=FRAME_SIZE):
+    """
+    Yields frames generated in memory: the given images in a loop (e.g. frames decoded once from a video,
+    to leave decoding out of a measurement), or skeletons drawn from [F, 75, 3] landmarks, or black
+    frames. Stops after count frames. Paced at fps when realtime, otherwise as fast as they are read.
+    """
+    if images is None and landmarks is not None:
+        images = draw_skeletons(landmarks, frame_size)
+    if images is None or not len(images):
+        images = np.zeros((1, frame_size[1], frame_size[0], 3), dtype=np.uint8)
+    return {
+        'kind': 'synthetic',
+        'images': images,
+        'count': count,
+        'fps': fps,
+        'live': realtime,
+        'started_at': None,
+        'frames': 0,
+    }
+
+
+def open_frame_source(source=0, realtime=True):
+    """
+    Opens a frame source from a short description: a camera index (0), a video path, or 'synthetic'.
+    A source dict from one of the open_* functions is returned as it is.
+    """
+    if isinstance(source, dict):
+        return source
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return open_camera_source(int(source))
+    if source == 'synthetic':
+        return open_synthetic_source(realtime=realtime)
+    return open_video_source(source, realtime)
+
+
+def wait_for_frame(source):
+    """Paces a replayed source: sleeps until its next frame is due at the source fps."""
+    now = time.perf_counter()
+    if source['started_at'] is None:
+        source['started_at'] = now
+    due = source['started_at'] + source['frames'] / source['fps']
+    if due > now:
+        time.sleep(due - now)
+
+
+def read_frame(source):
+    """Reads the next frame of a source. Returns (ret, frame) like cv2.VideoCapture.read."""
+    if source['kind'] == 'synthetic':
+        if source['frames'] >= source['count']:
+            return False, None
+        if source['live']:
+            wait_for_frame(source)
+        frame = source['images'][source['frames'] % len(source['images'])].copy()
+        source['frames'] += 1
+        return True, frame
+
+    if source['kind'] == 'video' and source['live']:
+        wait_for_frame(source)
+        source['frames'] += 1
+    return source['cap'].read()
+
+
+def release_source(source):
+    """Releases the camera or video file behind a source."""
+    if 'cap' in source:
+        source['cap'].release()
+
+
+def open_window_sink(title=WINDOW_TITLE):
+    """Shows frames in an OpenCV window (main thread only). Returns the sink dict used by show_frame / close_sink."""
+    return {'kind': 'window', 'title': title, 'frames': 0}
+
+
+def open_headless_sink(output_path=None, fps=CAMERA_FPS):
+    """Discards frames (for servers and CI), or writes them to a video when output_path is given."""
+    return {'kind': 'headless', 'output_path': output_path, 'fps': fps, 'writer': None, 'frames': 0}
+
+
+def show_frame(sink, frame):
+    """Hands a finished frame to a sink. Returns False when the user asked to quit (q in the window)."""
+    sink['frames'] += 1
+    if sink['kind'] == 'window':
+        cv2.imshow(sink['title'], frame)
+        return (cv2.waitKey(1) & 0xFF) != ord('q')
+
+    if sink['output_path'] is not None:
+        if sink['writer'] is None:
+            sink['writer'] = cv2.VideoWriter(sink['output_path'], cv2.VideoWriter_fourcc(*VIDEO_CODEC), sink['fps'],
+                                             (frame.shape[1], frame.shape[0]))
+        sink['writer'].write(frame)
+    return True
+
+
+def close_sink(sink):
+    """Closes the window or finishes the video of a sink."""
+    if sink['kind'] == 'window':
+        cv2.destroyAllWindows()
+    elif sink['writer'] is not None:
+        sink['writer'].release()
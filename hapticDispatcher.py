@@ -0,0 +1,210 @@
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Constants
+HAPTIC_QUEUE_SIZE = 8  # Commands waiting to be sent, the oldest is dropped when full
+CONNECT_TIMEOUT = 0.25  # Seconds to connect to the glove
+READ_TIMEOUT = 0.5  # Seconds to wait for the glove to answer
+STALE_AFTER = 0.5  # Commands older than this (seconds) are dropped instead of sent
+
+
+def create_session():
+    """Creates a keep-alive HTTP session with a single pooled connection to the glove and no retries."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+    session.mount('http://', adapter)
+    return session
+
+
+def send_vibration_request(session, esp32_ip, motor, on, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+    """Sends one /vib/on or /vib/off GET request for the motor, returning True when the glove answered 200."""
+    url = f"{esp32_ip}/vib/{'on' if on else 'off'}"
+
+    try:
+        response = session.get(url, params={'value': motor}, timeout=timeout)
+
+        if response.status_code == 200:
+            return True
+        print(f"Failed to turn {'on' if on else 'off'} Vibration Motor {motor}. Status code: {response.status_code}")
+    except requests.RequestException as e:
+        print(f"Error turning {'on' if on else 'off'} Vibration Motor {motor}: {e}")
+    return False
+
+
+def start_haptic_dispatcher(esp32_ip, queue_size=HAPTIC_QUEUE_SIZE, stale_after=STALE_AFTER):
+    """
+    Starts a background thread that sends vibration commands to the glove.
+
+    Returns the dispatcher dict used by send_vibration and stop_haptic_dispatcher. Commands are only
+    queued when a motor's requested state changes, and the thread skips commands that are stale or
+    already superseded by a newer request for the same motor.
+    """
+    dispatcher = {
+        'esp32_ip': esp32_ip,
+        'queue': queue.Queue(maxsize=queue_size),
+        'session': create_session(),
+        'stale_after': stale_after,
+        'lock': threading.Lock(),
+        'requested': {},  # motor -> latest requested on/off state
+        'sent': {},  # motor -> state last confirmed by the glove
+        'counters': {'queued': 0, 'sent': 0, 'coalesced': 0, 'dropped': 0, 'stale': 0, 'failed': 0},
+    }
+    dispatcher['thread'] = threading.Thread(target=dispatch_loop, args=(dispatcher,), daemon=True)
+    dispatcher['thread'].start()
+    return dispatcher
+
+
+def send_vibration(dispatcher, motor, on):
+    """Queues a motor state change without blocking. Returns False when the state did not change."""
+    counters = dispatcher['counters']
+
+    with dispatcher['lock']:
+        if dispatcher['requested'].get(motor) == on:
+            counters['coalesced'] += 1
+            return False
+        dispatcher['requested'][motor] = on
+
+        # Make room by dropping the oldest command, the newest state is the one that matters
+        command = (motor, on, time.monotonic())
+        while True:
+            try:
+                dispatcher['queue'].put_nowait(command)
+                break
+            except queue.Full:
+                try:
+                    dispatcher['queue'].get_nowait()
+                    counters['dropped'] += 1
+                except queue.Empty:
+                    pass
+
+        counters['queued'] += 1
+    return True
+
+
+def dispatch_loop(dispatcher):
+    """Background loop: sends queued commands over the shared session until it receives None."""
+    counters = dispatcher['counters']
+
+    while True:
+        command = dispatcher['queue'].get()
+        if command is None:
+            break
+
+        motor, on, queued_at = command
+
+        # Skip commands that were superseded or waited too long
+        if dispatcher['requested'].get(motor) != on:
+            counters['coalesced'] += 1
+            continue
+        if time.monotonic() - queued_at > dispatcher['stale_after']:
+            counters['stale'] += 1
+            # Forget the request so the next call for this state is queued again
+            with dispatcher['lock']:
+                if dispatcher['requested'].get(motor) == on:
+                    dispatcher['requested'].pop(motor)
+            continue
+        if dispatcher['sent'].get(motor) == on:
+            continue
+
+        if send_vibration_request(dispatcher['session'], dispatcher['esp32_ip'], motor, on):
+            dispatcher['sent'][motor] = on
+            counters['sent'] += 1
+        else:
+            # The glove state is unknown after a failure, so allow the next request through
+            dispatcher['sent'].pop(motor, None)
+            with dispatcher['lock']:
+                if dispatcher['requested'].get(motor) == on:
+                    dispatcher['requested'].pop(motor)
+            counters['failed'] += 1
+
+
+def stop_haptic_dispatcher(dispatcher, turn_off=True, timeout=1.0):
+    """
+    Stops the dispatcher thread, turning off any motor left on when turn_off is set.
+
+    Commands still queued are dropped, so the thread only finishes the request it is sending. If it has
+    not exited within timeout, the motors are left as they are and the session stays open for it.
+    """
+    # Drop the pending commands
+    while True:
+        try:
+            dispatcher['queue'].get_nowait()
+        except queue.Empty:
+            break
+
+    # Wake the thread even if commands were queued meanwhile and the queue is full
+    while True:
+        try:
+            dispatcher['queue'].put_nowait(None)
+            break
+        except queue.Full:
+            try:
+                dispatcher['queue'].get_nowait()
+            except queue.Empty:
+                pass
+    dispatcher['thread'].join(timeout)
+    if dispatcher['thread'].is_alive():
+        print("Haptic dispatcher still sending, leaving the glove as it is.")
+        return
+
+    if turn_off:
+        for motor, on in list(dispatcher['sent'].items()):
+            if on:
+                send_vibration_request(dispatcher['session'], dispatcher['esp32_ip'], motor, False)
+
+    dispatcher['session'].close()
+
+
+def start_stub_server(port=0):
+    """
+    Starts a local HTTP server that mimics the glove's /vib/on and /vib/off endpoints.
+
+    Returns (server, url). Every request is recorded in server.vibration_requests as (state, motor).
+    Call server.shutdown() when done.
+    """
+    class StubGloveHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, like the ESP32 web server
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path not in ('/vib/on', '/vib/off'):
+                self.send_error(404)
+                return
+
+            motor = parse_qs(url.query).get('value', [''])[0]
+            state = url.path.split('/')[-1]
+            self.server.vibration_requests.append((state, motor))
+
+            body = f"Vibration Motor {motor} {state.upper()}".encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubGloveHandler)
+    server.vibration_requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    # Example usage against the stub glove: only the state changes reach the server
+    server, url = start_stub_server()
+    dispatcher = start_haptic_dispatcher(url)
+    for on in [True, True, True, False, False, True]:
+        send_vibration(dispatcher, 0, on)
+        time.sleep(0.05)
+    stop_haptic_dispatcher(dispatcher)
+    server.shutdown()
+    print(f"Requests received: {server.vibration_requests}")
+    print(f"Counters: {dispatcher['counters']}")
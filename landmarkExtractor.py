@@ -0,0 +1,215 @@
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from referenceStore import NUM_POSE_LANDMARKS, NUM_HAND_LANDMARKS, NUM_HANDS, NUM_LANDMARKS
+from stageMetrics import start_timer, record_stage
+
+# Constants
+HOLISTIC_MODE = 'holistic'  # One pass yields pose and both hands
+SEPARATE_MODE = 'separate'  # Separate Pose and Hands passes, like the original scripts
+ROI_MODE = 'roi'  # Pose pass, then hand landmarks only on crops around the visible wrists
+DEFAULT_MODE = HOLISTIC_MODE
+LIVE_MODE = ROI_MODE  # Default of the live sessions (camera, browser stream), where the CPU per frame matters most
+MODEL_COMPLEXITY = 1  # 0 (lite), 1 (full) or 2 (heavy) pose model
+MIN_DETECTION_CONFIDENCE = 0.5
+MIN_TRACKING_CONFIDENCE = 0.5
+POSE_SCALE = 1.0  # Frames are resized by this factor for the pose pass (e.g. 0.5 on slow laptops), landmarks stay normalized
+WRIST_JOINTS = (15, 16)  # Pose wrists the hand crops are centred on (left, right)
+ELBOW_JOINTS = (13, 14)
+INDEX_JOINTS = (19, 20)  # Pose index knuckles, the crop centre is halfway from the wrist to them
+WRIST_VISIBILITY = 0.5  # Pose visibility a wrist needs for its hand to be looked for
+HAND_CROP_SCALE = 1.6  # Side of a hand crop, in forearm lengths
+MIN_HAND_CROP = 96  # Smallest side of a hand crop in pixels
+
+
+def extractor_settings(mode=DEFAULT_MODE, pose_scale=POSE_SCALE):
+    """Returns the model settings an extractor is created with by default (used to key the extraction cache)."""
+    return {
+        'mode': mode,
+        'pose_scale': pose_scale,
+        'model_complexity': MODEL_COMPLEXITY,
+        'min_detection_confidence': MIN_DETECTION_CONFIDENCE,
+        'min_tracking_confidence': MIN_TRACKING_CONFIDENCE,
+        'mediapipe': mp.__version__,
+    }
+
+
+def create_landmark_extractor(mode=DEFAULT_MODE, static_image_mode=False, model_complexity=MODEL_COMPLEXITY,
+                              min_detection_confidence=MIN_DETECTION_CONFIDENCE, min_tracking_confidence=MIN_TRACKING_CONFIDENCE,
+                              pose_scale=POSE_SCALE):
+    """
+    Creates the MediaPipe models for one video stream. Each stream (or worker) needs its own extractor.
+
+    In ROI_MODE the hands are tracked by one single-hand model per wrist, on a small crop around it.
+    pose_scale resizes the frame for the pose pass (the whole holistic pass in HOLISTIC_MODE).
+    """
+    extractor = {'mode': mode, 'pose_scale': pose_scale}
+
+    if mode == HOLISTIC_MODE:
+        extractor['holistic'] = mp.solutions.holistic.Holistic(
+            static_image_mode=static_image_mode,
+            model_complexity=model_complexity,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence)
+    elif mode == SEPARATE_MODE:
+        extractor['pose'] = mp.solutions.pose.Pose(
+            static_image_mode=static_image_mode,
+            model_complexity=model_complexity,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence)
+        extractor['hands'] = mp.solutions.hands.Hands(
+            static_image_mode=static_image_mode,
+            max_num_hands=NUM_HANDS,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence)
+    elif mode == ROI_MODE:
+        extractor['pose'] = mp.solutions.pose.Pose(
+            static_image_mode=static_image_mode,
+            model_complexity=model_complexity,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence)
+        extractor['wrist_hands'] = [mp.solutions.hands.Hands(
+            static_image_mode=static_image_mode,
+            max_num_hands=1,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence) for _ in WRIST_JOINTS]
+    else:
+        raise ValueError(f"Unknown landmark extractor mode: {mode}")
+
+    return extractor
+
+
+def close_landmark_extractor(extractor):
+    """Releases the MediaPipe graphs of an extractor."""
+    for key in ('holistic', 'pose', 'hands'):
+        if key in extractor:
+            extractor[key].close()
+    for hands in extractor.get('wrist_hands', []):
+        hands.close()
+
+
+def landmarks_to_array(pose_landmarks, hand_landmarks):
+    """Packs MediaPipe pose landmarks and a list of hand landmark lists into a [75, 3] array (NaN when absent)."""
+    landmarks = np.full((NUM_LANDMARKS, 3), np.nan, dtype=np.float32)
+
+    if pose_landmarks:
+        landmarks[:NUM_POSE_LANDMARKS] = [(landmark.x, landmark.y, landmark.z) for landmark in pose_landmarks[:NUM_POSE_LANDMARKS]]
+
+    # Detected hands fill the hand slots in order, so a single hand is always hand 0
+    for hand_index, hand in enumerate(hand_landmarks[:NUM_HANDS]):
+        start = NUM_POSE_LANDMARKS + hand_index * NUM_HAND_LANDMARKS
+        landmarks[start:start + NUM_HAND_LANDMARKS] = [(landmark.x, landmark.y, landmark.z) for landmark in hand.landmark]
+
+    return landmarks
+
+
+def to_rgb(frame, scale=1.0):
+    """Converts a BGR frame to RGB, resized by scale first, marked read-only so MediaPipe can use it without copying."""
+    if scale != 1.0:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    rgb_frame.flags.writeable = False
+    return rgb_frame
+
+
+def hand_crop(pose_landmarks, side, width, height):
+    """
+    Pixel box (x0, y0, x1, y1) around the hand at one wrist of the pose (side 0 left, 1 right), or None when
+    that wrist is not visible. The box is centred between the wrist and the index knuckle and sized from the forearm.
+    """
+    wrist = pose_landmarks[WRIST_JOINTS[side]]
+    if wrist.visibility < WRIST_VISIBILITY or not (0 <= wrist.x <= 1 and 0 <= wrist.y <= 1):
+        return None
+
+    elbow, index = pose_landmarks[ELBOW_JOINTS[side]], pose_landmarks[INDEX_JOINTS[side]]
+    centre_x, centre_y = (wrist.x + index.x) / 2 * width, (wrist.y + index.y) / 2 * height
+    forearm = np.hypot((wrist.x - elbow.x) * width, (wrist.y - elbow.y) * height)
+    half = max(MIN_HAND_CROP, HAND_CROP_SCALE * forearm) / 2
+
+    x0, y0 = max(0, int(centre_x - half)), max(0, int(centre_y - half))
+    x1, y1 = min(width, int(centre_x + half)), min(height, int(centre_y + half))
+    return (x0, y0, x1, y1) if x1 > x0 and y1 > y0 else None
+
+
+def extract_hands_at_wrists(extractor, frame, boxes):
+    """
+    Runs each wrist's hand model on its crop (from hand_crop), skipping wrists without one.
+    Returns the detected hands as [21, 3] arrays in normalized coordinates of the whole frame.
+    """
+    height, width = frame.shape[:2]
+    hands = []
+    for hand_model, box in zip(extractor['wrist_hands'], boxes):
+        if box is None:
+            continue
+
+        x0, y0, x1, y1 = box
+        results = hand_model.process(to_rgb(frame[y0:y1, x0:x1]))
+        if not results.multi_hand_landmarks:
+            continue
+
+        # Crop coordinates back to the frame (z is scaled like x)
+        hand = np.array([(landmark.x, landmark.y, landmark.z) for landmark in results.multi_hand_landmarks[0].landmark], dtype=np.float32)
+        hand *= ((x1 - x0) / width, (y1 - y0) / height, (x1 - x0) / width)
+        hand[:, 0] += x0 / width
+        hand[:, 1] += y0 / height
+        hands.append(hand)
+    return hands
+
+
+def extract_landmarks(extractor, frame):
+    """
+    Runs landmark inference on a BGR frame, converting it to RGB once, and returns a [75, 3] array.
+
+    Stage timings (stageMetrics): color_conversion, then pose_inference and hand_inference, or
+    holistic_inference when one holistic pass yields both. In ROI_MODE hand_inference covers the crops,
+    and is not recorded when no wrist is visible.
+    """
+    started = start_timer()
+    pose_scale = extractor['pose_scale']
+    if extractor['mode'] == ROI_MODE:
+        # The hand crops are converted on their own, at full resolution
+        pose_frame = to_rgb(frame, pose_scale)
+        started = record_stage('color_conversion', started)
+        pose_results = extractor['pose'].process(pose_frame)
+        started = record_stage('pose_inference', started)
+        if not pose_results.pose_landmarks:
+            return landmarks_to_array([], [])
+
+        pose_landmarks = pose_results.pose_landmarks.landmark
+        boxes = [hand_crop(pose_landmarks, side, frame.shape[1], frame.shape[0]) for side in range(len(WRIST_JOINTS))]
+        hands = extract_hands_at_wrists(extractor, frame, boxes)
+        if any(boxes):
+            record_stage('hand_inference', started)
+
+        # Detected hands fill the hand slots in order, as in landmarks_to_array
+        landmarks = landmarks_to_array(pose_landmarks, [])
+        for hand_index, hand in enumerate(hands):
+            start = NUM_POSE_LANDMARKS + hand_index * NUM_HAND_LANDMARKS
+            landmarks[start:start + NUM_HAND_LANDMARKS] = hand
+        return landmarks
+
+    if extractor['mode'] == HOLISTIC_MODE:
+        rgb_frame = to_rgb(frame, pose_scale)
+        started = record_stage('color_conversion', started)
+        results = extractor['holistic'].process(rgb_frame)
+        record_stage('holistic_inference', started)
+        pose_landmarks = results.pose_landmarks.landmark if results.pose_landmarks else []
+        hand_landmarks = [hand for hand in (results.left_hand_landmarks, results.right_hand_landmarks) if hand]
+    else:
+        rgb_frame = to_rgb(frame)
+        pose_frame = to_rgb(frame, pose_scale) if pose_scale != 1.0 else rgb_frame
+        started = record_stage('color_conversion', started)
+        pose_results = extractor['pose'].process(pose_frame)
+        started = record_stage('pose_inference', started)
+        hand_results = extractor['hands'].process(rgb_frame)
+        record_stage('hand_inference', started)
+        pose_landmarks = pose_results.pose_landmarks.landmark if pose_results.pose_landmarks else []
+        hand_landmarks = hand_results.multi_hand_landmarks if hand_results.multi_hand_landmarks else []
+
+    return landmarks_to_array(pose_landmarks, hand_landmarks)
+
+
+def landmarks_to_row(landmarks):
+    """Flattens a [75, 3] landmark array into CSV values, writing None (an empty cell) for missing landmarks."""
+    return [None if value != value else value for value in landmarks.reshape(-1).tolist()]
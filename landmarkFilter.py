@@ -0,0 +1,121 @@
+import math
+
+import numpy as np
+
+from landmarkScoring import DEFAULT_TOLERANCE
+
+# Constants
+MIN_CUTOFF = 1.5  # Hz, cutoff of the One-Euro filter for a still joint (lower = smoother, more lag)
+BETA = 8.0  # How fast the cutoff rises with joint speed (normalized image units per second), so fast moves are not lagged
+DERIVATIVE_CUTOFF = 1.0  # Hz, cutoff used to smooth the joint speed itself
+DEFAULT_FPS = 30  # Frame interval assumed for the first update, or when two frames share a timestamp
+HYSTERESIS = 0.2  # A motor turns on above the tolerance and off only below (1 - HYSTERESIS) x tolerance
+MIN_DWELL = 0.3  # Seconds a motor keeps its state before it may change again
+
+
+def create_landmark_filter(min_cutoff=MIN_CUTOFF, beta=BETA, derivative_cutoff=DERIVATIVE_CUTOFF):
+    """
+    Creates a One-Euro filter for [75, 3] landmark frames, applied to every coordinate at once.
+
+    Returns the filter dict used by filter_landmarks.
+    """
+    return {
+        'min_cutoff': min_cutoff,
+        'beta': beta,
+        'derivative_cutoff': derivative_cutoff,
+        'previous': None,  # Last filtered frame, NaN where the joint was missing
+        'speed': None,  # Smoothed speed of every coordinate
+        'time': None,
+    }
+
+
+def smoothing_factor(cutoff, interval):
+    """Weight of the new sample in an exponential filter with the given cutoff (Hz) at the given sample interval (s)."""
+    return 1.0 / (1.0 + 1.0 / (2 * math.pi * cutoff * interval))
+
+
+def filter_landmarks(landmark_filter, landmarks, timestamp):
+    """
+    Smooths one [75, 3] landmark frame taken at timestamp (seconds) and returns the filtered frame.
+
+    Still joints are smoothed strongly, which removes MediaPipe's frame-to-frame jitter, and the cutoff
+    rises with the joint's speed so real movement goes through with little lag. A missing (NaN) joint stays
+    missing, and a joint that appears again starts from its new position instead of where it was last seen.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    previous = landmark_filter['previous']
+    if previous is None:
+        landmark_filter['previous'] = landmarks.copy()
+        landmark_filter['speed'] = np.zeros_like(landmarks)
+        landmark_filter['time'] = timestamp
+        return landmarks
+
+    interval = timestamp - landmark_filter['time']
+    if interval <= 0:
+        interval = 1.0 / DEFAULT_FPS
+    landmark_filter['time'] = timestamp
+
+    # Change since the last filtered frame, 0 where the joint is missing now or was missing before
+    change = landmarks - previous
+    change[change != change] = 0.0
+
+    # Smoothed speed of every coordinate (updated in place)
+    alpha = smoothing_factor(landmark_filter['derivative_cutoff'], interval)
+    speed = landmark_filter['speed']
+    speed *= 1 - alpha
+    speed += change * (alpha / interval)
+
+    # Cutoff per coordinate from its speed: min_cutoff + beta * |speed|. With r = 2 pi cutoff interval the
+    # weight of the new sample is r / (1 + r), so the filtered position is landmarks - change / (1 + r).
+    # A joint that just appeared has no change and keeps its new position, a missing one stays NaN.
+    ratio = np.abs(speed)
+    ratio *= 2 * math.pi * interval * landmark_filter['beta']
+    ratio += 1 + 2 * math.pi * interval * landmark_filter['min_cutoff']
+    change /= ratio
+    filtered = landmarks - change
+
+    landmark_filter['previous'] = filtered
+    return filtered
+
+
+def create_motor_gate(motor_joints, tolerance=DEFAULT_TOLERANCE, hysteresis=HYSTERESIS, min_dwell=MIN_DWELL):
+    """
+    Creates the on/off state machine of the glove motors of one exercise.
+
+    motor_joints maps each motor to the joints it reacts to (one exercise of testCamera.MOTOR_JOINTS).
+    Returns the gate dict used by update_motor_gate.
+    """
+    return {
+        'motors': {motor: np.asarray(joints) for motor, joints in (motor_joints or {}).items()},
+        'on_above': tolerance,
+        'off_below': tolerance * (1 - hysteresis),
+        'min_dwell': min_dwell,
+        'states': {motor: False for motor in motor_joints or {}},
+        'changed_at': {motor: None for motor in motor_joints or {}},
+        'changes': 0,
+    }
+
+
+def update_motor_gate(gate, distances, timestamp):
+    """
+    Updates the motor states from the per-joint distances of one frame taken at timestamp (seconds).
+
+    A motor turns on when any of its joints is beyond the tolerance and off once all of them are back
+    within (1 - hysteresis) x tolerance (missing joints count as within). Between the two thresholds it
+    keeps its state, and it never changes state twice within min_dwell seconds. Returns {motor: on}.
+    """
+    for motor, joints in gate['motors'].items():
+        # fmax skips missing (NaN) joints, NaN when they are all missing, which compares as within
+        worst = np.fmax.reduce(distances[joints])
+        state = gate['states'][motor]
+        wanted = bool(worst > (gate['off_below'] if state else gate['on_above']))
+        if wanted == state:
+            continue
+
+        changed_at = gate['changed_at'][motor]
+        if changed_at is not None and timestamp - changed_at < gate['min_dwell']:
+            continue
+        gate['states'][motor] = wanted
+        gate['changed_at'][motor] = timestamp
+        gate['changes'] += 1
+    return gate['states']
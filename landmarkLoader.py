@@ -0,0 +1,289 @@
+import csv
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from referenceStore import (NUM_POSE_LANDMARKS, NUM_HAND_LANDMARKS, NUM_LANDMARKS, COORDINATES, VALUES_PER_FRAME,
+                            POSE_LANDMARK_NAMES, BINARY_EXTENSION, landmark_columns, parse_timestamp, build_frame_table,
+                            load_reference_binary)
+
+# Constants
+FRAME_SCHEMA = 'frame'  # One row per frame: timestamp, [fps,] m, n, x + 225 values (test.py, output_landmarks_final.csv)
+WIDE_SCHEMA = 'wide'  # One row per video: n, m, x + every second/frame slot (extractLandmarksVideo.py)
+LONG_SCHEMA = 'long'  # One row per coordinate: n, m, x, time_frame_pose_x (landmarkStart.py, landmarkstovideo.py)
+BINARY_SCHEMA = 'binary'  # Memory-mapped .lmk file (referenceStore.py)
+FRAME_META_COLUMNS = ('timestamp', 'fps', 'm', 'n', 'x')
+CHUNK_ROWS = 2048  # Rows parsed at a time from per-frame files
+WIDE_SLOT = re.compile(r'^\d+(\.\d+)?_\d+(\.\d+)?_(pose|hand)_')  # e.g. 0.000000_0.000000_pose_0_x
+FRAME_TIMESTAMP = re.compile(r'^\d+(\.\d+)?(_\d+(\.\d+)?)?$')  # e.g. 0_12, 0.0_1.0 or a bare second 0.0
+HEADERLESS_META_COLUMNS = ('timestamp', 'm', 'n', 'x')  # Early per-frame files were written without a header row
+
+# Wide CSVs indexed so far: path -> {'signature': (size, mtime), 'slots', 'header_length', 'offsets': {(m, n, x): [offset, ...]}}
+wide_row_indexes = {}
+
+
+def detect_schema(path):
+    """Tells which layout a landmark file uses from its extension and header row (see the *_SCHEMA constants)."""
+    if os.path.splitext(path)[1] == BINARY_EXTENSION:
+        return BINARY_SCHEMA
+
+    with open(path, mode='r', newline='') as file:
+        header = next(csv.reader(file), [])
+
+    if 'time_frame_pose_x' in header:
+        return LONG_SCHEMA
+    if 'timestamp' in header:
+        return FRAME_SCHEMA
+    if len(header) > 3 and WIDE_SLOT.match(header[3]):
+        return WIDE_SCHEMA
+    if len(header) > len(HEADERLESS_META_COLUMNS) and FRAME_TIMESTAMP.match(header[0]):
+        return FRAME_SCHEMA
+    raise ValueError(f"Unknown landmark file layout: {path}")
+
+
+def parse_values(values):
+    """Converts a sequence of CSV strings ('' when missing) into a float32 array (float() per value beats NumPy's string conversion)."""
+    return np.array([float(value) if value else np.nan for value in values], dtype=np.float32)
+
+
+def wanted(key, m, n, x):
+    """Tells whether an (m, n, x) key passes the optional m, n, x filter."""
+    return (m is None or key[0] == m) and (n is None or key[1] == n) and (x is None or key[2] == x)
+
+
+def read_frame_schema(path, m=None, n=None, x=None, chunk_rows=CHUNK_ROWS):
+    """
+    Streams a per-frame CSV in chunks of chunk_rows rows, parsed by pandas' C reader straight into float32.
+
+    The landmark values follow the meta columns by position (rows without a hand are shorter and
+    padded with NaN), which also covers older files whose landmark column names differ or that have
+    no header row. Bare-second timestamps of older files are numbered by frame within their second.
+    Yields ((m, n, x), timestamps, fps, [rows, 75, 3] landmarks) per exercise and chunk.
+    """
+    with open(path, mode='r', newline='') as file:
+        header = next(csv.reader(file))
+    if 'timestamp' in header:
+        meta_columns = [column for column in header[:len(FRAME_META_COLUMNS)] if column in FRAME_META_COLUMNS]
+        skip_rows = 1
+    else:
+        meta_columns = list(HEADERLESS_META_COLUMNS)
+        skip_rows = 0
+    columns = meta_columns + landmark_columns()
+    frames_in_second = {}  # (m, n, x, second) -> frames seen, for bare-second timestamps
+
+    chunks = pd.read_csv(path, header=None, skiprows=skip_rows, names=columns, index_col=False, chunksize=chunk_rows,
+                         dtype={**{column: str for column in meta_columns if column != 'fps'}, **{column: np.float32 for column in landmark_columns()}})
+    for chunk in chunks:
+        for key, group in chunk.groupby(['m', 'n', 'x'], sort=False):
+            if not wanted(key, m, n, x):
+                continue
+            landmarks = group[columns[len(meta_columns):]].to_numpy(dtype=np.float32).reshape(-1, NUM_LANDMARKS, len(COORDINATES))
+            fps = float(group['fps'].iloc[0]) if 'fps' in group else None
+
+            timestamps = group['timestamp'].astype(str).tolist()
+            for i, timestamp in enumerate(timestamps):
+                if '_' not in timestamp:
+                    second = int(float(timestamp))
+                    frame_position = frames_in_second.get(key + (second,), 0)
+                    frames_in_second[key + (second,)] = frame_position + 1
+                    timestamps[i] = f"{second}_{frame_position}"
+            yield key, timestamps, fps, landmarks
+
+
+def read_row_at(file, offset):
+    """Reads the CSV row starting at a byte offset of an open file."""
+    file.seek(offset)
+    return next(csv.reader(file))
+
+
+def wide_slots(header):
+    """The "s_f" timestamp of each frame slot of a wide CSV header."""
+    return [f"{int(float(slot.split('_')[0]))}_{int(float(slot.split('_')[1]))}" for slot in header[3::VALUES_PER_FRAME]]
+
+
+def wide_row_index(path):
+    """
+    Indexes a wide CSV: its frame slots and, for each (m, n, x), the byte offsets of its rows (reading only
+    the start of each row).
+
+    The index is kept per file and rebuilt when the file changes, so later lookups of one exercise seek
+    straight to its rows instead of going through the whole file, and skip parsing the long header.
+    """
+    stat = os.stat(path)
+    cached = wide_row_indexes.get(path)
+    if cached is not None and cached['signature'] == (stat.st_size, stat.st_mtime):
+        return cached
+
+    offsets = {}
+    with open(path, mode='rb') as file:
+        header_line = file.readline()
+        header_commas = header_line.count(b',')
+        offset = file.tell()
+        for line in iter(file.readline, b''):
+            values = [value.decode('utf-8') for value in line.split(b',', 5)[:5]]
+            # Whole-exercise rows start with n, m, x, older per-frame rows with timestamp, frame_position, n, m, x
+            if line.count(b',') == header_commas:
+                key = (values[1], values[0], values[2])
+            else:
+                key = (values[3], values[2], values[4]) if len(values) == 5 else None
+            offsets.setdefault(key, []).append(offset)
+            offset += len(line)
+
+    header = next(csv.reader([header_line.decode('utf-8')]))
+    wide_row_indexes[path] = {'signature': (stat.st_size, stat.st_mtime), 'slots': wide_slots(header), 'header_length': len(header), 'offsets': offsets}
+    return wide_row_indexes[path]
+
+
+def read_wide_schema(path, m=None, n=None, x=None):
+    """
+    Streams a wide CSV one row at a time, skipping rows of other exercises before converting any value.
+
+    Rows that match the header hold one whole exercise (n, m, x followed by every second/frame slot).
+    Rows written per frame by older versions of extractLandmarksVideo.process_video hold timestamp,
+    frame_position, n, m, x and the landmarks, leaving the pose values out when no pose was detected.
+    When m, n and x are all given, only the rows of that exercise are read (see wide_row_index).
+    Yields ((m, n, x), timestamps, None, [frames, 75, 3] landmarks) per row.
+    """
+    with open(path, mode='r', newline='') as file:
+        if m is not None and n is not None and x is not None:
+            index = wide_row_index(path)
+            slots, header_length = index['slots'], index['header_length']
+            reader = (read_row_at(file, offset) for offset in index['offsets'].get((m, n, x), []))
+        else:
+            reader = csv.reader(file)
+            header = next(reader)
+            slots, header_length = wide_slots(header), len(header)
+
+        for row in reader:
+            if len(row) == header_length:
+                key = (row[1], row[0], row[2])
+                if not wanted(key, m, n, x):
+                    continue
+                landmarks = parse_values(row[3:]).reshape(-1, NUM_LANDMARKS, len(COORDINATES))
+                yield key, slots[:len(landmarks)], None, landmarks
+            elif len(row) >= 5:
+                key = (row[3], row[2], row[4])
+                if not wanted(key, m, n, x):
+                    continue
+                second, frame_position = row[0].split('_')[:2]
+                values = row[5:5 + VALUES_PER_FRAME]
+
+                # Pose values are only missing when the row is a whole number of hands long
+                if len(values) % (NUM_HAND_LANDMARKS * len(COORDINATES)) == 0 and len(values) < NUM_POSE_LANDMARKS * len(COORDINATES):
+                    values = [''] * (NUM_POSE_LANDMARKS * len(COORDINATES)) + values
+                frame = np.full(VALUES_PER_FRAME, np.nan, dtype=np.float32)
+                frame[:len(values)] = parse_values(values)
+                yield key, [f"{int(float(second))}_{int(float(frame_position))}"], None, frame.reshape(1, NUM_LANDMARKS, len(COORDINATES))
+
+
+def parse_long_value(value):
+    """
+    Parses one cell of the long layout, '{second}_{frame}_{pose|hand}_{landmark}_{coordinate}_{value}', into
+    (timestamp, landmark index, coordinate index, value). The pose landmark is its index or MediaPipe name,
+    a hand landmark is '{hand}_{index}'. Returns None for a cell that does not follow the layout.
+    """
+    parts = value.split('_')
+    if len(parts) < 6 or parts[-2] not in COORDINATES:
+        return None
+
+    try:
+        timestamp = f"{int(float(parts[0]))}_{int(float(parts[1]))}"
+        number = float(parts[-1])
+        landmark = parts[3:-2]
+        if parts[2] == 'pose':
+            name = '_'.join(landmark)
+            index = int(name) if name.isdigit() else POSE_LANDMARK_NAMES.index(name)
+        elif parts[2] == 'hand' and len(landmark) == 2:
+            index = NUM_POSE_LANDMARKS + int(landmark[0]) * NUM_HAND_LANDMARKS + int(landmark[1])
+        else:
+            return None
+    except ValueError:
+        return None
+
+    if not 0 <= index < NUM_LANDMARKS:
+        return None
+    return timestamp, index, COORDINATES.index(parts[-2]), number
+
+
+def read_long_schema(path, m=None, n=None, x=None):
+    """
+    Streams a long CSV (one coordinate per row, see parse_long_value), filling one [75, 3] frame per timestamp.
+
+    Yields ((m, n, x), timestamps, None, [frames, 75, 3] landmarks) per exercise, frames ordered by timestamp.
+    """
+    frames = {}
+    with open(path, mode='r', newline='') as file:
+        reader = csv.reader(file)
+        next(reader)
+        for row in reader:
+            if len(row) < 4:
+                continue
+            key = (row[1], row[0], row[2])
+            if not wanted(key, m, n, x):
+                continue
+            parsed = parse_long_value(row[3])
+            if parsed is None:
+                continue
+
+            timestamp, index, coordinate, number = parsed
+            exercise = frames.setdefault(key, {})
+            if timestamp not in exercise:
+                exercise[timestamp] = np.full((NUM_LANDMARKS, len(COORDINATES)), np.nan, dtype=np.float32)
+            exercise[timestamp][index, coordinate] = number
+
+    for key, exercise in frames.items():
+        timestamps = sorted(exercise, key=parse_timestamp)
+        yield key, timestamps, None, np.stack([exercise[timestamp] for timestamp in timestamps])
+
+
+def load_landmarks(path, m=None, n=None, x=None, schema=None):
+    """
+    Loads any landmark file (per-frame, wide, long CSV or binary .lmk) into a store keyed by (m, n, x).
+
+    The layout is detected from the file unless schema is given. m, n and x optionally restrict the
+    exercises loaded. Every exercise holds the same typed fields whatever the layout:
+    - landmarks: float32 array of shape [frames, 75, 3] (NaN when a landmark was not detected)
+    - fps: frame rate of the source video (the number of frames per second when the layout does not record it)
+    - frame_table: [seconds, frame_positions] int array mapping a timestamp to its frame index
+    - timestamps: the "s_f" timestamp of every frame
+    - schema, source: the layout and path it was loaded from
+    """
+    schema = schema or detect_schema(path)
+    if schema == BINARY_SCHEMA:
+        exercise = load_reference_binary(path)
+        exercise.update({'schema': schema, 'source': path})
+        return {exercise['key']: exercise} if wanted(exercise['key'], m, n, x) else {}
+
+    readers = {FRAME_SCHEMA: read_frame_schema, WIDE_SCHEMA: read_wide_schema, LONG_SCHEMA: read_long_schema}
+    if schema not in readers:
+        raise ValueError(f"Unknown landmark file layout: {schema}")
+
+    parts = {}
+    for key, timestamps, fps, landmarks in readers[schema](path, m, n, x):
+        exercise = parts.setdefault(key, {'timestamps': [], 'blocks': [], 'fps': fps})
+        exercise['timestamps'] += timestamps
+        exercise['blocks'].append(landmarks)
+
+    store = {}
+    for key, exercise in parts.items():
+        timestamps = exercise['timestamps']
+        fps = exercise['fps'] or float(max(parse_timestamp(timestamp)[1] for timestamp in timestamps) + 1)
+        store[key] = {
+            'landmarks': np.concatenate(exercise['blocks']),
+            'fps': float(fps),
+            'frame_table': build_frame_table(timestamps),
+            'timestamps': timestamps,
+            'schema': schema,
+            'source': path,
+        }
+    return store
+
+
+def load_exercise(path, m, n, x, schema=None):
+    """Loads a single exercise from any landmark file, or returns None (with a message) when it is not there."""
+    exercise = load_landmarks(path, m, n, x, schema).get((m, n, x))
+    if exercise is None:
+        print(f"No reference landmarks found for m={m}, n={n}, x={x} in {path}.")
+    return exercise
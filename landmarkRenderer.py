@@ -0,0 +1,154 @@
+import collections
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from referenceStore import NUM_POSE_LANDMARKS, NUM_HAND_LANDMARKS, NUM_HANDS, NUM_LANDMARKS
+
+# Constants
+FRAME_SIZE = (640, 480)  # Output width, height
+LANDMARK_RADIUS = 5
+LINE_THICKNESS = 2
+POSE_COLOR = (0, 255, 0)  # Green for pose
+HAND_COLOR = (255, 0, 0)  # Blue for hands
+CHUNK_SIZE = 32  # Frames drawn and encoded per task
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+VIDEO_CODEC = 'mp4v'
+IMAGE_FORMAT = '.png'
+IMAGE_WRITE_PARAMS = [cv2.IMWRITE_PNG_FILTER, cv2.IMWRITE_PNG_FILTER_NONE]  # Mostly black frames compress well unfiltered, and faster
+
+# MediaPipe pose and hand topologies
+POSE_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19),
+    (12, 14), (14, 16), (16, 18), (16, 20), (16, 22), (18, 20),
+    (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28),
+    (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32),
+)
+HAND_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 4), (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12), (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+)
+
+
+def skeleton_connections():
+    """Returns (connections [E, 2] landmark indices into the [75, 3] layout, colors [E, 3]) for pose and both hands."""
+    connections = list(POSE_CONNECTIONS)
+    colors = [POSE_COLOR] * len(POSE_CONNECTIONS)
+    for hand_index in range(NUM_HANDS):
+        start = NUM_POSE_LANDMARKS + hand_index * NUM_HAND_LANDMARKS
+        connections += [(start + a, start + b) for a, b in HAND_CONNECTIONS]
+        colors += [HAND_COLOR] * len(HAND_CONNECTIONS)
+    return np.array(connections, dtype=np.int64), np.array(colors, dtype=np.uint8)
+
+
+CONNECTIONS, CONNECTION_COLORS = skeleton_connections()
+CONNECTION_GROUPS = [(color, (CONNECTION_COLORS == color).all(axis=1)) for color in (POSE_COLOR, HAND_COLOR)]
+LANDMARK_GROUPS = [(POSE_COLOR, np.arange(NUM_LANDMARKS) < NUM_POSE_LANDMARKS), (HAND_COLOR, np.arange(NUM_LANDMARKS) >= NUM_POSE_LANDMARKS)]
+
+
+def landmark_pixels(landmarks, frame_size=FRAME_SIZE):
+    """Scales [F, 75, 3] normalized landmarks to pixels. Returns (points [F, 75, 2] int32, visible [F, 75] bool)."""
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    visible = ~np.isnan(landmarks[:, :, :2]).any(axis=2)
+    points = np.zeros(landmarks.shape[:2] + (2,), dtype=np.int32)
+    points[visible] = (landmarks[:, :, :2][visible] * frame_size).astype(np.int32)
+    return points, visible
+
+
+def draw_skeletons(landmarks, frame_size=FRAME_SIZE, radius=LANDMARK_RADIUS, thickness=LINE_THICKNESS):
+    """
+    Draws the skeleton of every frame of a [F, 75, 3] landmark chunk on black frames. Returns [F, height, width, 3] uint8.
+
+    Missing (NaN) landmarks, and the connections touching them, are left out. Scaling and visibility
+    are computed for the whole chunk at once; each frame then takes one polylines call per color for
+    the connections and one for the joints (zero-length segments 2 * radius thick, the same discs as
+    cv2.circle with that radius).
+    """
+    width, height = frame_size
+    points, visible = landmark_pixels(landmarks, frame_size)
+    images = np.zeros((len(points), height, width, 3), dtype=np.uint8)
+
+    segments = points[:, CONNECTIONS]  # [F, E, 2, 2]
+    drawn = visible[:, CONNECTIONS[:, 0]] & visible[:, CONNECTIONS[:, 1]]
+    joints = np.repeat(points[:, :, None], 2, axis=2)  # [F, 75, 2, 2]
+
+    for frame_index in range(len(points)):
+        image = images[frame_index]
+        for color, group in CONNECTION_GROUPS:
+            selected = drawn[frame_index] & group
+            if selected.any():
+                cv2.polylines(image, list(segments[frame_index, selected]), False, color, thickness)
+        for color, group in LANDMARK_GROUPS:
+            selected = visible[frame_index] & group
+            if selected.any():
+                cv2.polylines(image, list(joints[frame_index, selected]), False, color, 2 * radius)
+
+    return images
+
+
+def render_chunk(landmarks, start, frame_size, image_folder=None, image_format=IMAGE_FORMAT):
+    """Draws one chunk and, for an image sequence, encodes and writes it. Returns the drawn frames (None once written)."""
+    images = draw_skeletons(landmarks, frame_size)
+    if image_folder is None:
+        return images
+
+    for offset, image in enumerate(images):
+        cv2.imwrite(os.path.join(image_folder, f"frame_{start + offset:03d}{image_format}"), image,
+                    IMAGE_WRITE_PARAMS if image_format == '.png' else [])
+    return None
+
+
+def write_chunk(out, images):
+    """Writes the frames of a finished chunk to the video writer (chunks of an image sequence are already written)."""
+    if out is None:
+        return
+    for image in images:
+        out.write(image)
+
+
+def render_landmarks(landmarks, output_path, fps=30, frame_size=FRAME_SIZE, skip_empty=False, workers=None,
+                     chunk_size=CHUNK_SIZE, image_format=IMAGE_FORMAT):
+    """
+    Renders [F, 75, 3] landmarks (e.g. exercise['landmarks'] from referenceStore) as skeleton frames.
+
+    output_path ending in a video extension writes a video at fps, anything else is a folder that
+    receives an image sequence (frame_000.png, ...; earlier frames in it are removed). With skip_empty,
+    frames without any landmark are left out. Chunks of chunk_size frames are drawn (and, for images,
+    encoded) on `workers` threads; video frames are written in order as their chunks finish.
+    Returns the number of frames written.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    if skip_empty:
+        landmarks = landmarks[~np.isnan(landmarks[:, :, :2]).all(axis=(1, 2))]
+
+    is_video = os.path.splitext(output_path)[1].lower() in VIDEO_EXTENSIONS
+    out = None
+    if is_video:
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*VIDEO_CODEC), fps, frame_size)
+        image_folder = None
+    else:
+        image_folder = output_path
+        if not os.path.exists(image_folder):
+            os.makedirs(image_folder)
+        for filename in os.listdir(image_folder):
+            if filename.startswith('frame_') and filename.endswith(image_format):
+                os.unlink(os.path.join(image_folder, filename))
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # At most two chunks per worker are in flight, so long videos are never held in memory at once
+        pending = collections.deque()
+        for start in range(0, len(landmarks), chunk_size):
+            pending.append(executor.submit(render_chunk, landmarks[start:start + chunk_size], start, frame_size, image_folder, image_format))
+            if len(pending) >= 2 * workers:
+                write_chunk(out, pending.popleft().result())
+        while pending:
+            write_chunk(out, pending.popleft().result())
+
+    if is_video:
+        out.release()
+    return len(landmarks)
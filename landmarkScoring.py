@@ -0,0 +1,75 @@
+import numpy as np
+
+from referenceStore import NUM_LANDMARKS, VALUES_PER_FRAME
+
+# Constants
+DEFAULT_TOLERANCE = 0.05  # Allowed distance from the reference joint, in normalized image units
+
+
+def score_frame(live_landmarks, reference_landmarks, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares a live [75, 3] landmark frame against a [75, 3] reference frame in a single NumPy pass.
+
+    Only x and y are compared. Landmarks that are missing (NaN) in either frame are left out.
+    Returns (distances, out_of_tolerance, score):
+    - distances: per-joint distance, NaN where the joint is missing
+    - out_of_tolerance: per-joint bool mask, False where the joint is missing
+    - score: fraction of the available joints within tolerance (NaN when no joint can be compared)
+    """
+    live_landmarks = np.asarray(live_landmarks, dtype=np.float32)
+    reference_landmarks = np.asarray(reference_landmarks, dtype=np.float32)
+
+    delta = live_landmarks[:, :2] - reference_landmarks[:, :2]
+    distances = np.hypot(delta[:, 0], delta[:, 1])
+
+    # NaN distances compare as False, so missing joints are never out of tolerance
+    out_of_tolerance = distances > tolerance
+    compared = np.count_nonzero(distances == distances)
+    score = 1.0 - np.count_nonzero(out_of_tolerance) / compared if compared else float('nan')
+
+    return distances, out_of_tolerance, score
+
+
+def score_frames(live_landmarks, reference_landmarks, tolerance=DEFAULT_TOLERANCE):
+    """
+    Batched score_frame: compares [F, 75, 3] live frames against [F, 75, 3] reference frames in one pass.
+
+    Returns (distances [F, 75], out_of_tolerance [F, 75], scores [F]), with the same NaN rules as score_frame.
+    """
+    live_landmarks = np.asarray(live_landmarks, dtype=np.float32)
+    reference_landmarks = np.asarray(reference_landmarks, dtype=np.float32)
+
+    delta = live_landmarks[:, :, :2] - reference_landmarks[:, :, :2]
+    distances = np.hypot(delta[:, :, 0], delta[:, :, 1])
+
+    out_of_tolerance = distances > tolerance
+    compared = np.count_nonzero(distances == distances, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = 1.0 - np.count_nonzero(out_of_tolerance, axis=1) / compared
+
+    return distances, out_of_tolerance, scores.astype(np.float32)
+
+
+def unpack_landmark_frames(payload):
+    """
+    Reads a packed payload of little-endian float32 landmarks, 75 x 3 values per frame, into a [F, 75, 3] array.
+
+    Missing landmarks are NaN. Raises ValueError when the payload is not a whole number of frames.
+    """
+    frame_bytes = VALUES_PER_FRAME * 4
+    if not payload or len(payload) % frame_bytes:
+        raise ValueError(f"Payload must hold whole frames of {VALUES_PER_FRAME} float32 values ({frame_bytes} bytes each).")
+    return np.frombuffer(payload, dtype='<f4').reshape(-1, NUM_LANDMARKS, 3)
+
+
+def pack_score_results(scores, out_of_tolerance):
+    """
+    Packs batched results as bytes: F float32 scores (NaN when nothing could be compared) followed by
+    F joint masks of 10 bytes each (np.packbits of the 75 out-of-tolerance flags, big bit order).
+    """
+    return np.asarray(scores, dtype='<f4').tobytes() + np.packbits(out_of_tolerance, axis=1).tobytes()
+
+
+def empty_landmarks():
+    """Returns a [75, 3] landmark array with every landmark missing (NaN)."""
+    return np.full((NUM_LANDMARKS, 3), np.nan, dtype=np.float32)
@@ -1,20 +1,22 @@
-import pandas as pd
+import numpy as np
+
+from referenceStore import POSE_LANDMARK_NAMES
+from landmarkLoader import load_landmarks
 
 def get_left_shoulder_coordinates(csv_file):
-    # Read the CSV file
-    data = pd.read_csv(csv_file)
+    # Read every exercise of the landmark file as [frames, 75, 3] arrays
+    store = load_landmarks(csv_file)
     
     # Initialize coordinates
     left_shoulder_coordinates = {'x': None, 'y': None, 'z': None}
     
-    # Iterate through the DataFrame to find left shoulder coordinates
-    for index, row in data.iterrows():
-        if 'left_shoulder_x' in row['time_frame_pose_x']:
-            left_shoulder_coordinates['x'] = row['time_frame_pose_x'].split('_')[-1]
-        elif 'left_shoulder_y' in row['time_frame_pose_x']:
-            left_shoulder_coordinates['y'] = row['time_frame_pose_x'].split('_')[-1]
-        elif 'left_shoulder_z' in row['time_frame_pose_x']:
-            left_shoulder_coordinates['z'] = row['time_frame_pose_x'].split('_')[-1]
+    # Keep the last frame where the left shoulder was detected
+    left_shoulder = POSE_LANDMARK_NAMES.index('left_shoulder')
+    for exercise in store.values():
+        detected = np.flatnonzero(~np.isnan(exercise['landmarks'][:, left_shoulder, 0]))
+        if len(detected):
+            x, y, z = exercise['landmarks'][detected[-1], left_shoulder].tolist()
+            left_shoulder_coordinates = {'x': x, 'y': y, 'z': z}
     
     return left_shoulder_coordinates
 
@@ -0,0 +1,103 @@
+import csv
+import os
+
+import numpy as np
+
+from referenceStore import VALUES_PER_FRAME, landmark_vector, exercise_file_name, write_reference_binary
+
+# Constants
+BATCH_SIZE = 256  # Rows buffered before they are written out
+CSV_BACKEND = 'csv'  # One text file, rows in the given header
+BINARY_BACKEND = 'binary'  # A folder of per-exercise .lmk files (see referenceStore)
+META_COLUMNS = ('timestamp', 'fps', 'm', 'n', 'x')  # Columns the binary backend needs besides the landmarks
+
+
+def open_landmark_writer(path, header, backend=CSV_BACKEND, batch_size=BATCH_SIZE, append=False):
+    """
+    Opens a landmark output once for a whole extraction run.
+
+    The header is fixed when the writer is opened and every row is checked against its width.
+    The CSV backend writes the header (unless appending to an existing file) and flushes rows in batches.
+    The binary backend expects the per-frame layout (timestamp, fps, m, n, x + 225 landmark values)
+    and writes one memory-mappable .lmk file per exercise into the `path` folder when closed.
+    """
+    header = list(header)
+    writer = {
+        'path': path,
+        'header': header,
+        'width': len(header),
+        'backend': backend,
+        'batch_size': batch_size,
+        'buffer': [],
+        'rows_written': 0,
+    }
+
+    if backend == CSV_BACKEND:
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        writer['file'] = open(path, mode='a' if append else 'w', newline='')
+        writer['csv'] = csv.writer(writer['file'])
+        if write_header:
+            writer['csv'].writerow(header)
+    elif backend == BINARY_BACKEND:
+        missing = [column for column in META_COLUMNS if column not in header]
+        if missing or len(header) - len(META_COLUMNS) != VALUES_PER_FRAME:
+            raise ValueError(f"The binary backend needs {', '.join(META_COLUMNS)} and {VALUES_PER_FRAME} landmark columns.")
+        writer['meta_indices'] = {column: header.index(column) for column in META_COLUMNS}
+        writer['landmark_indices'] = [i for i, column in enumerate(header) if column not in META_COLUMNS]
+        writer['exercises'] = {}  # (m, n, x) -> {'fps', 'timestamps', 'blocks'}
+        if not os.path.exists(path):
+            os.makedirs(path)
+    else:
+        raise ValueError(f"Unknown landmark writer backend: {backend}")
+
+    return writer
+
+
+def write_row(writer, row):
+    """Buffers one row, raising ValueError when its width does not match the header."""
+    if len(row) != writer['width']:
+        raise ValueError(f"Row has {len(row)} values but {writer['path']} has {writer['width']} columns.")
+
+    writer['buffer'].append(row)
+    if len(writer['buffer']) >= writer['batch_size']:
+        flush_landmark_writer(writer)
+
+
+def write_rows(writer, rows):
+    """Buffers several rows (see write_row)."""
+    for row in rows:
+        write_row(writer, row)
+
+
+def flush_landmark_writer(writer):
+    """Writes out the buffered rows."""
+    rows = writer['buffer']
+    if not rows:
+        return
+
+    if writer['backend'] == CSV_BACKEND:
+        writer['csv'].writerows(rows)
+    else:
+        meta = writer['meta_indices']
+        for row in rows:
+            key = (row[meta['m']], row[meta['n']], row[meta['x']])
+            exercise = writer['exercises'].setdefault(key, {'fps': row[meta['fps']], 'timestamps': [], 'blocks': []})
+            exercise['timestamps'].append(row[meta['timestamp']])
+            exercise['blocks'].append(landmark_vector([row[i] for i in writer['landmark_indices']]))
+
+    writer['rows_written'] += len(rows)
+    writer['buffer'] = []
+
+
+def close_landmark_writer(writer):
+    """Flushes the remaining rows and closes the output. Returns the number of rows written."""
+    flush_landmark_writer(writer)
+
+    if writer['backend'] == CSV_BACKEND:
+        writer['file'].close()
+    else:
+        for (m, n, x), exercise in writer['exercises'].items():
+            binary_file = os.path.join(writer['path'], exercise_file_name(m, n, x))
+            write_reference_binary(binary_file, np.array(exercise['blocks']), exercise['fps'], m, n, x, exercise['timestamps'])
+
+    return writer['rows_written']
@@ -0,0 +1,197 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+# Constants
+POOL_SIZE = 2  # Warm extractors kept, one per session that may run at the same time
+WARMUP_VIDEO = os.path.join('videos', 'arm_stretch-8_12_weeks-easy.mp4')  # A person on camera, to run the whole pose and hand path once
+WARMUP_FRAMES = 2  # Frames of WARMUP_VIDEO run through each new extractor
+FRAME_SIZE = (640, 480)  # Blank frame used when the warm-up video is missing, and to drop the tracking state (forget_tracking)
+
+
+def create_model_pool(size=POOL_SIZE, mode=None):
+    """
+    Creates a pool of landmark extractors (landmarkExtractor) for sessions to borrow.
+
+    mode defaults to landmarkExtractor.LIVE_MODE. Nothing is loaded until start_model_pool is called.
+    Returns the pool dict used by the other functions.
+    """
+    return {
+        'size': size,
+        'mode': mode,
+        'idle': queue.Queue(),  # Warm extractors waiting for a session
+        'lock': threading.Lock(),
+        'created': 0,
+        'returning': 0,  # Extractors being reset by release_extractor, each with a slot kept for it in idle
+        'thread': None,
+        'warmup_frames': None,
+        'ready_at': None,  # Seconds from start_model_pool until every extractor was warm
+        'counters': {'acquired': 0, 'warm': 0, 'cold': 0},
+    }
+
+
+def blank_frame():
+    """A black frame: no one in view, so the models drop whatever they were tracking."""
+    return np.zeros((FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+
+
+def forget_tracking(extractor):
+    """
+    Drops what the models of an extractor were tracking, so its next frame starts with a fresh detection.
+
+    A blank frame goes through the extractor; in roi mode it stops at the pose model (no wrist in view),
+    so each wrist hand model also gets a blank crop of its own.
+    """
+    from landmarkExtractor import MIN_HAND_CROP, extract_landmarks, to_rgb
+
+    extract_landmarks(extractor, blank_frame())
+    for hands in extractor.get('wrist_hands', []):
+        hands.process(to_rgb(np.zeros((MIN_HAND_CROP, MIN_HAND_CROP, 3), dtype=np.uint8)))
+
+
+def read_warmup_frames(video_path=WARMUP_VIDEO, count=WARMUP_FRAMES):
+    """The first frames of the warm-up video, or a blank frame when it cannot be read."""
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames or [blank_frame()]
+
+
+def create_warm_extractor(pool):
+    """
+    Creates one extractor and runs the warm-up frames through it. MediaPipe builds its graphs and
+    loads each model on first use, so this takes the first-frame cost off the session.
+    """
+    from landmarkExtractor import LIVE_MODE, create_landmark_extractor, extract_landmarks
+
+    if pool['warmup_frames'] is None:
+        pool['warmup_frames'] = read_warmup_frames()
+    extractor = create_landmark_extractor(pool['mode'] or LIVE_MODE)
+    for frame in pool['warmup_frames']:
+        extract_landmarks(extractor, frame)
+    forget_tracking(extractor)
+    return extractor
+
+
+def put_idle_extractor(pool, extractor, reserved=False):
+    """
+    Puts a warm extractor in the idle queue when the pool has room for it, and closes it otherwise (the
+    pool filled up or was closed meanwhile). reserved gives back the slot release_extractor kept for it.
+    """
+    from landmarkExtractor import close_landmark_extractor
+
+    with pool['lock']:
+        if reserved:
+            pool['returning'] -= 1
+        keep = pool['idle'].qsize() + pool['returning'] < pool['size']
+        if keep:
+            pool['idle'].put(extractor)
+        else:
+            pool['created'] -= 1
+    if not keep:
+        close_landmark_extractor(extractor)
+
+
+def warm_pool(pool, started):
+    """Background thread body: fills the pool with warm extractors."""
+    while True:
+        with pool['lock']:
+            if pool['created'] >= pool['size']:
+                break
+            pool['created'] += 1
+        try:
+            put_idle_extractor(pool, create_warm_extractor(pool))
+        except Exception as e:
+            print(f"Error warming the landmark models: {e}")
+            with pool['lock']:
+                pool['created'] -= 1
+            return
+    pool['ready_at'] = time.perf_counter() - started
+
+
+def start_model_pool(pool):
+    """
+    Imports the landmark models and warms the pool's extractors on a background thread, returning right away.
+    Only the first call starts the thread, so it can be called before every use of the pool.
+    """
+    with pool['lock']:
+        if pool['size'] > 0 and pool['thread'] is None:
+            pool['thread'] = threading.Thread(target=warm_pool, args=(pool, time.perf_counter()), daemon=True)
+            pool['thread'].start()
+    return pool
+
+
+def acquire_extractor(pool):
+    """
+    Lends a warm extractor to a session. When none is idle (the pool is still warming, or every one is
+    in use) a new one is created right away instead of waiting. Give it back with release_extractor.
+    """
+    try:
+        extractor = pool['idle'].get_nowait()
+        with pool['lock']:
+            pool['counters']['acquired'] += 1
+            pool['counters']['warm'] += 1
+        return extractor
+    except queue.Empty:
+        pass
+
+    from landmarkExtractor import LIVE_MODE, create_landmark_extractor
+
+    with pool['lock']:
+        pool['counters']['acquired'] += 1
+        pool['counters']['cold'] += 1
+        pool['created'] += 1
+    return create_landmark_extractor(pool['mode'] or LIVE_MODE)
+
+
+def release_extractor(pool, extractor):
+    """
+    Takes an extractor back after a session, and closes it when the pool is already full. Its tracking
+    state is cleared with forget_tracking, so the next session starts with a fresh detection (resetting
+    the graphs would undo the warm-up).
+    """
+    from landmarkExtractor import close_landmark_extractor
+
+    # Keep a slot for it while it is reset, so releases at the same time cannot overfill the pool
+    with pool['lock']:
+        keep = pool['idle'].qsize() + pool['returning'] < pool['size']
+        if keep:
+            pool['returning'] += 1
+        else:
+            pool['created'] -= 1
+    if not keep:
+        close_landmark_extractor(extractor)
+        return
+
+    try:
+        forget_tracking(extractor)
+    except Exception:
+        with pool['lock']:
+            pool['returning'] -= 1
+            pool['created'] -= 1
+        close_landmark_extractor(extractor)
+        raise
+    put_idle_extractor(pool, extractor, reserved=True)
+
+
+def close_model_pool(pool):
+    """Closes the idle extractors of a pool (those still lent out, or being released, are closed when they are released)."""
+    from landmarkExtractor import close_landmark_extractor
+
+    with pool['lock']:
+        pool['size'] = 0
+    while True:
+        try:
+            close_landmark_extractor(pool['idle'].get_nowait())
+        except queue.Empty:
+            return
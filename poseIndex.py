@@ -0,0 +1,144 @@
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from referenceStore import load_reference_binaries
+
+# Constants
+INDEX_JOINTS = [0] + list(range(11, 33))  # Nose and body joints; the other face points and the hands (often missing) are left out
+LEFT_HIP, RIGHT_HIP, LEFT_SHOULDER, RIGHT_SHOULDER = 23, 24, 11, 12
+INDEX_COMPONENTS = 12  # Principal components the tree is built over (poses vary along few directions)
+CANDIDATE_FACTOR = 4  # Candidates taken from the tree per neighbour asked for, then ranked by exact distance
+DETECTION_NEIGHBOURS = 5  # Reference frames each live frame votes with
+MAX_DETECTION_DISTANCE = 2.5  # Farthest normalized pose distance (torso lengths) a neighbour votes from; poses of other exercises are 0.6-3.8 away, random landmarks 3.2 or more
+
+
+def pose_vectors(landmarks):
+    """
+    Normalized pose vectors of [F, 75, 3] landmarks: x, y of INDEX_JOINTS relative to the hip center and
+    divided by the torso length, so a pose matches whatever the patient's place and distance to the
+    camera. Returns [F, 2 * len(INDEX_JOINTS)] float32, NaN rows for frames without a pose.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    points = landmarks[:, :, :2]
+    hips = (points[:, LEFT_HIP] + points[:, RIGHT_HIP]) / 2
+    shoulders = (points[:, LEFT_SHOULDER] + points[:, RIGHT_SHOULDER]) / 2
+    torso = np.linalg.norm(shoulders - hips, axis=1)
+    torso[~(torso > 1e-6)] = np.nan
+
+    vectors = (points[:, INDEX_JOINTS] - hips[:, None]) / torso[:, None, None]
+    vectors = vectors.reshape(len(landmarks), -1)
+    vectors[np.isnan(vectors).any(axis=1)] = np.nan
+    return vectors
+
+
+def build_pose_index(store, components=INDEX_COMPONENTS):
+    """
+    Builds a nearest-pose index over every frame of every exercise in a store keyed by (m, n, x).
+
+    The pose vectors are projected on their first principal components and put in a KD-tree, so
+    a query costs about log(frames) whatever the number of exercises. Returns the index dict used
+    by nearest_poses and detect_exercise, or None when the store holds no pose.
+    """
+    exercises = sorted(store)
+    vectors, exercise_ids, frames = [], [], []
+    for exercise_id, key in enumerate(exercises):
+        exercise_vectors = pose_vectors(store[key]['landmarks'])
+        valid = np.flatnonzero(~np.isnan(exercise_vectors).any(axis=1))
+        vectors.append(exercise_vectors[valid])
+        exercise_ids.append(np.full(len(valid), exercise_id, dtype=np.int32))
+        frames.append(valid.astype(np.int32))
+
+    vectors = np.concatenate(vectors) if vectors else np.zeros((0, 2 * len(INDEX_JOINTS)), dtype=np.float32)
+    if not len(vectors):
+        return None
+
+    mean = vectors.mean(axis=0)
+    basis = np.linalg.svd(vectors - mean, full_matrices=False)[2][:components]
+    return {
+        'tree': cKDTree((vectors - mean) @ basis.T),
+        'mean': mean,
+        'basis': basis,
+        'vectors': vectors,
+        'exercise_ids': np.concatenate(exercise_ids),
+        'frames': np.concatenate(frames),
+        'exercises': exercises,
+        'lengths': [len(store[key]['landmarks']) for key in exercises],
+    }
+
+
+def load_pose_index(binary_dir='references', csv_files=('output_landmarks_final.csv',)):
+    """Builds the index over the whole reference library: every exercise of the CSV files and the binary references."""
+    # Imported here because landmarkLoader is only needed for the CSV files
+    from landmarkLoader import load_landmarks
+
+    store = {}
+    for csv_file in csv_files:
+        if os.path.exists(csv_file):
+            store.update(load_landmarks(csv_file))
+    if os.path.isdir(binary_dir):
+        store.update(load_reference_binaries(binary_dir))
+    return build_pose_index(store)
+
+
+def nearest_poses(index, live_landmarks, k=DETECTION_NEIGHBOURS):
+    """
+    Finds the k reference frames nearest to each of [F, 75, 3] live frames (or one [75, 3] frame).
+
+    Returns (keys, frames, distances): [F, k] exercise ids (index into index['exercises']), reference
+    frame indices and normalized pose distances, with -1 / inf for frames without a pose.
+    """
+    live_landmarks = np.asarray(live_landmarks, dtype=np.float32)
+    if live_landmarks.ndim == 2:
+        live_landmarks = live_landmarks[None]
+    vectors = pose_vectors(live_landmarks)
+    valid = ~np.isnan(vectors).any(axis=1)
+
+    exercise_ids = np.full((len(vectors), k), -1, dtype=np.int32)
+    frames = np.full((len(vectors), k), -1, dtype=np.int32)
+    distances = np.full((len(vectors), k), np.inf, dtype=np.float32)
+    if not valid.any():
+        return exercise_ids, frames, distances
+
+    # Candidates from the tree in the projected space, ranked by their exact distance
+    candidates_wanted = min(k * CANDIDATE_FACTOR, len(index['vectors']))
+    candidates = index['tree'].query((vectors[valid] - index['mean']) @ index['basis'].T, candidates_wanted)[1]
+    candidates = candidates.reshape(int(valid.sum()), -1)
+    exact = np.linalg.norm(index['vectors'][candidates] - vectors[valid][:, None], axis=2)
+    order = np.argsort(exact, axis=1)[:, :k]
+    nearest = np.take_along_axis(candidates, order, axis=1)
+
+    kept = min(k, nearest.shape[1])
+    exercise_ids[valid, :kept] = index['exercise_ids'][nearest]
+    frames[valid, :kept] = index['frames'][nearest]
+    distances[valid, :kept] = np.take_along_axis(exact, order, axis=1)
+    return exercise_ids, frames, distances
+
+
+def detect_exercise(index, live_landmarks, k=DETECTION_NEIGHBOURS, max_distance=MAX_DETECTION_DISTANCE):
+    """
+    Tells which exercise, and where in it, a few recent [F, 75, 3] live frames are from.
+
+    Every neighbour of every frame within max_distance votes for its exercise; the phase is the nearest
+    frame of the winning exercise to the latest frame with a vote. Returns a dict with the (m, n, x) 'key',
+    the reference 'frame', the 'phase' (0 to 1 through the exercise), the 'confidence' (share of the votes)
+    and the pose 'distance', or None when no frame holds a pose close to any reference pose.
+    """
+    exercise_ids, frames, distances = nearest_poses(index, live_landmarks, k)
+    exercise_ids[~(distances <= max_distance)] = -1
+    votes = np.bincount(exercise_ids[exercise_ids >= 0], minlength=len(index['exercises']))
+    if not votes.sum():
+        return None
+
+    winner = int(np.argmax(votes))
+    latest = np.flatnonzero((exercise_ids == winner).any(axis=1))[-1]
+    match = np.flatnonzero(exercise_ids[latest] == winner)[0]
+    frame = int(frames[latest, match])
+    return {
+        'key': index['exercises'][winner],
+        'frame': frame,
+        'phase': frame / index['lengths'][winner],
+        'confidence': float(votes[winner] / votes.sum()),
+        'distance': float(distances[latest, match]),
+    }
@@ -0,0 +1,266 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+# Constants
+NUM_POSE_LANDMARKS = 33  # Number of pose landmarks
+NUM_HAND_LANDMARKS = 21  # Number of landmarks per hand
+NUM_HANDS = 2  # Assuming two hands
+NUM_LANDMARKS = NUM_POSE_LANDMARKS + NUM_HANDS * NUM_HAND_LANDMARKS  # 75 landmarks per frame
+COORDINATES = ('x', 'y', 'z')
+VALUES_PER_FRAME = NUM_LANDMARKS * len(COORDINATES)  # 225 floats per frame
+
+# Binary reference format: magic, version, header length, JSON header, padding, float32 [frames, 75, 3] data
+BINARY_MAGIC = b'FMFY'
+BINARY_VERSION = 1
+BINARY_EXTENSION = '.lmk'
+BINARY_ALIGNMENT = 64  # Data starts on a 64 byte boundary so it can be memory-mapped directly
+BINARY_PREFIX = struct.Struct('<4sII')  # magic, version, header length
+
+# MediaPipe pose landmark names, in index order (used by the long time_frame_pose_x layout)
+POSE_LANDMARK_NAMES = (
+    'nose', 'left_eye_inner', 'left_eye', 'left_eye_outer', 'right_eye_inner', 'right_eye', 'right_eye_outer',
+    'left_ear', 'right_ear', 'mouth_left', 'mouth_right', 'left_shoulder', 'right_shoulder', 'left_elbow',
+    'right_elbow', 'left_wrist', 'right_wrist', 'left_pinky', 'right_pinky', 'left_index', 'right_index',
+    'left_thumb', 'right_thumb', 'left_hip', 'right_hip', 'left_knee', 'right_knee', 'left_ankle', 'right_ankle',
+    'left_heel', 'right_heel', 'left_foot_index', 'right_foot_index',
+)
+
+
+def landmark_columns():
+    """Returns the landmark column names of the per-frame CSV layout, in [landmarks, 3] order."""
+    columns = []
+
+    # Pose landmark columns
+    for i in range(NUM_POSE_LANDMARKS):
+        for coordinate in COORDINATES:
+            columns.append(f'pose_landmark_{i}_{coordinate}')
+
+    # Hand landmark columns (for both hands)
+    for hand_index in range(NUM_HANDS):
+        for i in range(NUM_HAND_LANDMARKS):
+            for coordinate in COORDINATES:
+                columns.append(f'hand_{hand_index}_landmark_{i}_{coordinate}')
+
+    return columns
+
+
+def parse_timestamp(timestamp):
+    """Splits a "s_f" timestamp string into its (second, frame_position) integers."""
+    second, frame_position = str(timestamp).split('_')
+    return int(float(second)), int(float(frame_position))
+
+
+def build_frame_table(timestamps):
+    """Builds a [seconds, frame_positions] table mapping each timestamp to its integer frame (-1 when absent)."""
+    positions = [parse_timestamp(timestamp) for timestamp in timestamps]
+    if not positions:
+        return np.full((0, 0), -1, dtype=np.int32)
+
+    seconds = max(second for second, _ in positions) + 1
+    frames_per_second = max(frame_position for _, frame_position in positions) + 1
+    frame_table = np.full((seconds, frames_per_second), -1, dtype=np.int32)
+
+    for frame_index, (second, frame_position) in enumerate(positions):
+        # Keep the first row if a timestamp is repeated, like the old pandas filter + .values[0]
+        if frame_table[second, frame_position] == -1:
+            frame_table[second, frame_position] = frame_index
+
+    return frame_table
+
+
+def get_exercise(store, m, n, x):
+    """Returns the stored exercise for (m, n, x), or None when it is not in the store."""
+    exercise = store.get((m, n, x))
+    if exercise is None:
+        print(f"No reference landmarks found for m={m}, n={n}, x={x}.")
+    return exercise
+
+
+def frame_index_from_timestamp(exercise, second, frame_position):
+    """Converts a (second, frame_position) pair into an integer frame index, or -1 when it has no frame."""
+    frame_table = exercise['frame_table']
+    if 0 <= second < frame_table.shape[0] and 0 <= frame_position < frame_table.shape[1]:
+        return int(frame_table[second, frame_position])
+    return -1
+
+
+def get_reference_frame(exercise, frame_index):
+    """Returns the [75, 3] landmark array of the given integer frame, or None when it is out of range."""
+    if exercise is None or frame_index < 0 or frame_index >= len(exercise['landmarks']):
+        return None
+    return exercise['landmarks'][frame_index]
+
+
+def reference_frame_at(exercise, seconds, loop=True):
+    """
+    Returns the reference [75, 3] pose at a time in seconds since the exercise started, using the exercise fps.
+
+    The pose is linearly interpolated between the two nearest frames; a landmark missing (NaN) in one of
+    them is taken from the other. With loop set, the reference repeats once it reaches its last frame.
+    """
+    if exercise is None or not len(exercise['landmarks']):
+        return None
+
+    landmarks = exercise['landmarks']
+    frames = len(landmarks)
+    position = max(0.0, seconds * exercise['fps'])
+    if loop:
+        position %= frames
+    elif position >= frames - 1:
+        return landmarks[frames - 1]
+
+    index = int(position)
+    fraction = position - index
+    current = landmarks[index]
+    following = landmarks[(index + 1) % frames]
+
+    frame = current + (following - current) * np.float32(fraction)
+    return np.where(np.isnan(frame), np.where(np.isnan(current), following, current), frame)
+
+
+def reference_frames_at(exercise, seconds, loop=True):
+    """Batched reference_frame_at: returns the [F, 75, 3] reference poses at an array of times in seconds."""
+    landmarks = np.asarray(exercise['landmarks'])
+    frames = len(landmarks)
+    positions = np.maximum(np.asarray(seconds, dtype=np.float64), 0.0) * exercise['fps']
+    if loop:
+        positions %= frames
+    else:
+        positions = np.minimum(positions, frames - 1)
+
+    indices = positions.astype(np.int64)
+    fractions = (positions - indices).astype(np.float32)[:, None, None]
+    current = landmarks[indices]
+    following = landmarks[(indices + 1) % frames if loop else np.minimum(indices + 1, frames - 1)]
+
+    interpolated = current + (following - current) * fractions
+    return np.where(np.isnan(interpolated), np.where(np.isnan(current), following, current), interpolated)
+
+
+def landmark_vector(values, size=VALUES_PER_FRAME):
+    """Converts one row of landmark values (None or '' when missing) into a float32 vector of `size` values (225 by default)."""
+    vector = np.full(size, np.nan, dtype=np.float32)
+    values = [np.nan if value is None or value == '' else float(value) for value in values[:size]]
+    vector[:len(values)] = values
+    return vector
+
+
+def exercise_file_name(m, n, x):
+    """Returns the binary file name of an exercise, following the video naming (n-m-x, e.g. knee-3_6_weeks-medium)."""
+    return f"{n}-{m}-{x}{BINARY_EXTENSION}"
+
+
+def write_reference_binary(binary_file, landmarks, fps, m, n, x, timestamps=None):
+    """Writes one exercise as a JSON header followed by a float32 [frames, 75, 3] array."""
+    landmarks = np.ascontiguousarray(np.asarray(landmarks, dtype='<f4').reshape(-1, NUM_LANDMARKS, len(COORDINATES)))
+
+    header = {
+        'm': m,
+        'n': n,
+        'x': x,
+        'fps': float(fps),
+        'frames': len(landmarks),
+        'layout': {
+            'pose_landmarks': NUM_POSE_LANDMARKS,
+            'hands': NUM_HANDS,
+            'hand_landmarks': NUM_HAND_LANDMARKS,
+            'coordinates': list(COORDINATES),
+        },
+        'dtype': 'float32',
+        'timestamps': [str(timestamp) for timestamp in timestamps] if timestamps is not None else None,
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    # Pad the header so the float data is aligned
+    data_offset = BINARY_PREFIX.size + len(header_bytes)
+    padding = -data_offset % BINARY_ALIGNMENT
+
+    with open(binary_file, mode='wb') as file:
+        file.write(BINARY_PREFIX.pack(BINARY_MAGIC, BINARY_VERSION, len(header_bytes)))
+        file.write(header_bytes)
+        file.write(b' ' * padding)
+        file.write(landmarks.tobytes())
+
+
+def read_binary_header(binary_file):
+    """Reads the JSON header of a binary reference file, returning (header, data_offset)."""
+    with open(binary_file, mode='rb') as file:
+        magic, version, header_length = BINARY_PREFIX.unpack(file.read(BINARY_PREFIX.size))
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError(f"{binary_file} is not a version {BINARY_VERSION} reference file.")
+        header = json.loads(file.read(header_length))
+
+    data_offset = BINARY_PREFIX.size + header_length
+    data_offset += -data_offset % BINARY_ALIGNMENT
+    return header, data_offset
+
+
+def load_reference_binary(binary_file):
+    """Memory-maps a binary reference file into the same exercise dict as landmarkLoader.load_landmarks (no copies)."""
+    header, data_offset = read_binary_header(binary_file)
+
+    if header['frames']:
+        landmarks = np.memmap(binary_file, dtype='<f4', mode='r', offset=data_offset,
+                              shape=(header['frames'], NUM_LANDMARKS, len(COORDINATES)))
+    else:
+        landmarks = np.empty((0, NUM_LANDMARKS, len(COORDINATES)), dtype=np.float32)
+
+    timestamps = header['timestamps']
+    if timestamps is None:
+        # Without timestamps, assume whole frames per second in order
+        frames_per_second = max(1, int(round(header['fps'])))
+        timestamps = [f"{i // frames_per_second}_{i % frames_per_second}" for i in range(header['frames'])]
+
+    return {
+        'landmarks': landmarks,
+        'fps': header['fps'],
+        'frame_table': build_frame_table(timestamps),
+        'timestamps': timestamps,
+        'key': (header['m'], header['n'], header['x']),
+    }
+
+
+def load_reference_binaries(binary_dir):
+    """Memory-maps every binary reference file in a folder, returning a store keyed by (m, n, x)."""
+    store = {}
+    for file_name in sorted(os.listdir(binary_dir)):
+        if file_name.endswith(BINARY_EXTENSION):
+            exercise = load_reference_binary(os.path.join(binary_dir, file_name))
+            store[exercise['key']] = exercise
+    return store
+
+
+def open_exercise(m, n, x, binary_dir='references', csv_file='output_landmarks_final.csv'):
+    """Opens one exercise, memory-mapping its binary file when it exists and falling back to the CSV (any layout)."""
+    binary_file = os.path.join(binary_dir, exercise_file_name(m, n, x))
+    if os.path.exists(binary_file):
+        return load_reference_binary(binary_file)
+
+    # Imported here because landmarkLoader builds on this module
+    from landmarkLoader import load_landmarks
+    return get_exercise(load_landmarks(csv_file, m, n, x), m, n, x)
+
+
+def convert_csv_to_binary(csv_file, binary_dir='references'):
+    """One-shot converter: writes every exercise of an existing reference CSV (any layout) as a binary file in binary_dir."""
+    from landmarkLoader import load_landmarks
+    store = load_landmarks(csv_file)
+
+    if not os.path.exists(binary_dir):
+        os.makedirs(binary_dir)
+
+    written = []
+    for (m, n, x), exercise in store.items():
+        binary_file = os.path.join(binary_dir, exercise_file_name(m, n, x))
+        write_reference_binary(binary_file, exercise['landmarks'], exercise['fps'], m, n, x, exercise.get('timestamps'))
+        written.append(binary_file)
+        print(f"Wrote {binary_file} ({len(exercise['landmarks'])} frames)")
+    return written
+
+
+if __name__ == '__main__':
+    # Convert the existing reference CSV into memory-mappable binary files
+    convert_csv_to_binary('output_landmarks_final.csv', 'references')
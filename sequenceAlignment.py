@@ -0,0 +1,277 @@
+import math
+
+import numpy as np
+
+from landmarkScoring import DEFAULT_TOLERANCE, score_frames
+
+# Constants
+WINDOW_FRACTION = 0.1  # Sakoe-Chiba radius as a fraction of the longer sequence, when no window is given
+MISSING_COST = 0.5  # Cost of a frame pair with no joint detected in both (normalized image units)
+BLOCK_ROWS = 32  # Live frames whose band costs are computed together (and checked for early abandoning)
+ONLINE_WINDOW = 30  # Reference frames the online alignment looks ahead of its current position per live frame
+ONLINE_BACKTRACK = 5  # Reference frames it may step back, to recover from running ahead
+ONLINE_MAX_STEP = 4  # Reference frames the path may advance per live frame (the camera may run slower than the reference)
+
+
+def band_limits(live_frames, reference_frames, window):
+    """
+    Returns the Sakoe-Chiba band as (lows, highs): for live frame i, the reference frames lows[i]:highs[i].
+
+    The band follows the diagonal scaled to both lengths, widened by `window` reference frames on each side,
+    and always contains the start and end of both sequences. The window is at least the reference frames
+    per live frame, so the bands of neighbouring rows overlap and a path through the band always exists.
+    """
+    window = max(window, math.ceil(reference_frames / live_frames))
+    centers = np.arange(live_frames) * ((reference_frames - 1) / max(live_frames - 1, 1))
+    lows = np.clip(np.floor(centers - window), 0, reference_frames - 1).astype(np.int64)
+    highs = np.clip(np.ceil(centers + window) + 1, 1, reference_frames).astype(np.int64)
+    lows[0] = 0
+    highs[-1] = reference_frames
+    return lows, highs
+
+
+def joint_distances(live_landmarks, reference_landmarks):
+    """Per-joint x, y distances between paired [..., 75, 3] frames (NaN where a joint is missing in either)."""
+    delta = live_landmarks[..., :2] - reference_landmarks[..., :2]
+    return np.hypot(delta[..., 0], delta[..., 1])
+
+
+def planar_coordinates(landmarks):
+    """Splits [F, 75, 3] landmarks into contiguous [F, 75] x and y arrays, several times faster to difference than strided views."""
+    return np.ascontiguousarray(landmarks[..., 0]), np.ascontiguousarray(landmarks[..., 1])
+
+
+def frame_costs(distances, missing_cost=MISSING_COST):
+    """Mean joint distance of each frame pair over the joints both frames have, missing_cost when they share none."""
+    present = distances == distances
+    count = present.sum(axis=-1)
+    total = np.where(present, distances, 0).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, missing_cost).astype(np.float64)
+
+
+def align_sequences(live_landmarks, reference_landmarks, window=None, abandon_above=None, missing_cost=MISSING_COST):
+    """
+    Aligns a [N, 75, 3] live sequence to a [M, 75, 3] reference with banded DTW.
+
+    Only cells within `window` reference frames of the scaled diagonal are computed (Sakoe-Chiba band,
+    WINDOW_FRACTION of the longer sequence by default). Frame costs are computed for blocks of rows at
+    once, and each row of the accumulated cost is filled in one vectorized pass. When every cell of a row
+    already costs more than abandon_above, the alignment is abandoned and None is returned.
+
+    Returns a dict with the total `distance`, the mean cost along the path (`normalized_distance`) and the
+    warping `path` as [P, 2] (live frame, reference frame) index pairs.
+    """
+    live_landmarks = np.asarray(live_landmarks, dtype=np.float32)
+    reference_landmarks = np.asarray(reference_landmarks, dtype=np.float32)
+    live_frames, reference_frames = len(live_landmarks), len(reference_landmarks)
+    if not live_frames or not reference_frames:
+        return None
+
+    if window is None:
+        window = max(1, int(WINDOW_FRACTION * max(live_frames, reference_frames)))
+    lows, highs = band_limits(live_frames, reference_frames, window)
+    width = int((highs - lows).max())
+    live_x, live_y = planar_coordinates(live_landmarks)
+    reference_x, reference_y = planar_coordinates(reference_landmarks)
+
+    # Accumulated cost of the band, row i holds reference frames lows[i]:lows[i] + width
+    accumulated = np.full((live_frames, width), np.inf)
+    previous = np.full(reference_frames + 1, np.inf)  # Accumulated cost of the previous row over all reference frames
+    current = np.full(reference_frames + 1, np.inf)
+
+    for block_start in range(0, live_frames, BLOCK_ROWS):
+        block_end = min(block_start + BLOCK_ROWS, live_frames)
+
+        # Every band cell of the block in one pass: [rows, width] costs, inf outside the band
+        offsets = np.arange(width)
+        columns = lows[block_start:block_end, None] + offsets
+        inside = columns < highs[block_start:block_end, None]
+        columns = np.minimum(columns, reference_frames - 1)
+        delta_x = live_x[block_start:block_end, None] - reference_x[columns]
+        delta_y = live_y[block_start:block_end, None] - reference_y[columns]
+        distances = np.sqrt(delta_x * delta_x + delta_y * delta_y)
+        costs = np.where(inside, frame_costs(distances, missing_cost), np.inf)
+
+        for row in range(block_start, block_end):
+            low, high = lows[row], highs[row]
+            cost = costs[row - block_start, :high - low]
+
+            # Best way into each cell from the previous row (down or diagonal)
+            if row == 0:
+                entry = np.full(high - low, np.inf)
+                entry[0] = 0.0
+            else:
+                entry = np.minimum(previous[low:high], previous[low - 1:high - 1] if low > 0 else
+                                   np.concatenate(([np.inf], previous[low:high - 1])))
+            entry = entry + cost
+
+            # Moves along the row: D[j] = min(entry[j], D[j - 1] + cost[j]), as a running minimum of cumulative sums
+            cumulative = np.cumsum(cost)
+            row_cost = cumulative + np.minimum.accumulate(entry - cumulative)
+
+            accumulated[row, :high - low] = row_cost
+            current[:] = np.inf
+            current[low:high] = row_cost
+            previous, current = current, previous
+
+            if abandon_above is not None and row_cost.min() > abandon_above:
+                return None
+
+    distance = accumulated[-1, reference_frames - 1 - lows[-1]]
+    if not np.isfinite(distance) or (abandon_above is not None and distance > abandon_above):
+        return None
+
+    path = warping_path(accumulated, lows, highs, reference_frames)
+    return {
+        'distance': float(distance),
+        'normalized_distance': float(distance / len(path)),
+        'path': path,
+    }
+
+
+def warping_path(accumulated, lows, highs, reference_frames):
+    """Backtracks the cheapest path from the last cell of the band to the first. Returns [P, 2] index pairs."""
+    def cell(row, column):
+        if row < 0 or column < lows[row] or column >= highs[row]:
+            return np.inf
+        return accumulated[row, column - lows[row]]
+
+    row, column = len(accumulated) - 1, reference_frames - 1
+    path = [(row, column)]
+    while row > 0 or column > 0:
+        steps = ((row - 1, column - 1), (row - 1, column), (row, column - 1))
+        row, column = min(steps, key=lambda step: cell(*step))
+        path.append((row, column))
+    return np.array(path[::-1], dtype=np.int64)
+
+
+def score_aligned_session(live_landmarks, reference_landmarks, tolerance=DEFAULT_TOLERANCE, window=None, missing_cost=MISSING_COST):
+    """
+    Offline scoring of a recorded session: aligns it to the reference with align_sequences, then scores
+    each live frame against the reference frame it was matched to, so a patient who is simply slower is
+    not penalized for it.
+
+    Returns the alignment dict plus, per live frame, the matched `reference_index` [N], aligned per-joint
+    `joint_errors` [N, 75] (NaN where missing), `out_of_tolerance` [N, 75] and `scores` [N], and the
+    mean error of each joint over the session, `mean_joint_errors` [75]. Returns None when a sequence is empty.
+    """
+    live_landmarks = np.asarray(live_landmarks, dtype=np.float32)
+    reference_landmarks = np.asarray(reference_landmarks, dtype=np.float32)
+    alignment = align_sequences(live_landmarks, reference_landmarks, window, missing_cost=missing_cost)
+    if alignment is None:
+        return None
+
+    # A live frame matched to several reference frames keeps its cheapest match
+    path = alignment['path']
+    costs = frame_costs(joint_distances(live_landmarks[path[:, 0]], reference_landmarks[path[:, 1]]), missing_cost)
+    order = np.lexsort((costs, path[:, 0]))
+    first = np.unique(path[order, 0], return_index=True)[1]
+    reference_index = path[order[first], 1]
+
+    joint_errors, out_of_tolerance, scores = score_frames(live_landmarks, reference_landmarks[reference_index], tolerance)
+    with np.errstate(invalid='ignore'):
+        present = joint_errors == joint_errors
+        mean_joint_errors = np.where(present, joint_errors, 0).sum(axis=0) / np.maximum(present.sum(axis=0), 1)
+    mean_joint_errors[~present.any(axis=0)] = np.nan
+
+    alignment.update({
+        'reference_index': reference_index,
+        'joint_errors': joint_errors,
+        'out_of_tolerance': out_of_tolerance,
+        'scores': scores,
+        'mean_joint_errors': mean_joint_errors.astype(np.float32),
+    })
+    return alignment
+
+
+def create_online_alignment(reference_landmarks, window=ONLINE_WINDOW, max_step=ONLINE_MAX_STEP, loop=True, missing_cost=MISSING_COST, start=0):
+    """
+    Starts following a live stream through a [M, 75, 3] reference with open-end DTW (see update_online_alignment),
+    from reference frame `start` (e.g. the phase poseIndex.detect_exercise found).
+
+    With loop, the reference is treated as cyclic so the patient can repeat the exercise. Returns the
+    alignment dict; 'position' holds the reference frame the patient is estimated to be at.
+    """
+    reference_landmarks = np.asarray(reference_landmarks, dtype=np.float32)
+    reference_x, reference_y = planar_coordinates(reference_landmarks)
+    frames = len(reference_landmarks)
+    backtrack = min(ONLINE_BACKTRACK, max(frames - 2, 0))
+    return {
+        'reference_x': reference_x,
+        'reference_y': reference_y,
+        'offsets': np.arange(-backtrack, max(1, min(window, frames - backtrack - 1)) + 1),
+        'steps': np.arange(max_step + 1),
+        'loop': loop,
+        'missing_cost': missing_cost,
+        'accumulated': np.full(frames, np.inf),  # Accumulated cost of the last live frame, inf outside its window
+        'indices': np.zeros(0, dtype=np.int64),  # Reference frames of the last window
+        'position': int(start) % max(frames, 1),
+        'cost': np.nan,  # Frame cost at the position, how well the live pose matches it
+        'frames': 0,
+    }
+
+
+def update_online_alignment(alignment, live_landmarks):
+    """
+    Advances the online alignment by one live [75, 3] frame and returns the matched reference frame index.
+
+    Only the reference frames from ONLINE_BACKTRACK behind to `window` ahead of the current position
+    are updated, in one vectorized DTW row, so each frame costs the same however long the session runs.
+    The path starts at the first reference frame and may end anywhere (open end); the position is the
+    cheapest cell of the row, i.e. the end of the best path so far. Frames without any landmark leave
+    the alignment where it is.
+    """
+    live_landmarks = np.asarray(live_landmarks, dtype=np.float32)
+    if np.isnan(live_landmarks[:, :2]).all():
+        return alignment['position']
+
+    frames = len(alignment['accumulated'])
+    indices = alignment['position'] + alignment['offsets']
+    if alignment['loop']:
+        indices %= frames
+    else:
+        indices = indices[(indices >= 0) & (indices < frames)]
+
+    delta_x = live_landmarks[:, 0] - alignment['reference_x'][indices]
+    delta_y = live_landmarks[:, 1] - alignment['reference_y'][indices]
+    cost = frame_costs(np.sqrt(delta_x * delta_x + delta_y * delta_y), alignment['missing_cost'])
+
+    # Each live frame pays its cost once and moves the path 0 to max_step reference frames on, so keeping
+    # pace with a reference recorded at a higher frame rate costs no more than standing still
+    accumulated = alignment['accumulated']
+    if alignment['frames'] == 0:
+        entry = np.where(indices == alignment['position'], 0.0, np.inf)
+    else:
+        sources = indices[:, None] - alignment['steps']
+        if alignment['loop']:
+            entry = accumulated[sources % frames].min(axis=1)
+        else:
+            entry = np.where(sources >= 0, accumulated[np.maximum(sources, 0)], np.inf).min(axis=1)
+    row_cost = entry + cost
+    best = int(np.argmin(row_cost))
+
+    accumulated[alignment['indices']] = np.inf
+    accumulated[indices] = row_cost - row_cost[best]  # Keeps values bounded, the position only depends on differences
+    alignment['indices'] = indices
+    alignment['position'] = int(indices[best])
+    alignment['cost'] = float(cost[best])
+    alignment['frames'] += 1
+    return alignment['position']
+
+
+def score_recorded_session(recording_path, m, n, x, tolerance=DEFAULT_TOLERANCE, window=None,
+                           reference_dir='references', reference_csv='output_landmarks_final.csv'):
+    """
+    Scores a recorded session file (any layout landmarkLoader reads, e.g. the CSV test.py writes) against
+    the reference of exercise (m, n, x). See score_aligned_session for the result; None when either is missing.
+    """
+    # Imported here so the alignment itself only depends on NumPy
+    from landmarkLoader import load_exercise
+    from referenceStore import open_exercise
+
+    recording = load_exercise(recording_path, m, n, x)
+    exercise = open_exercise(m, n, x, reference_dir, reference_csv)
+    if recording is None or exercise is None:
+        return None
+    return score_aligned_session(recording['landmarks'], exercise['landmarks'], tolerance, window)
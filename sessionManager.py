@@ -0,0 +1,221 @@
+import collections
+import threading
+import time
+import uuid
+
+import numpy as np
+
+# Constants
+MAX_SESSIONS = 2  # Sessions allowed to run at the same time
+SCORE_HISTORY = 300  # Recent frame scores kept per session
+SESSION_TTL = 600  # Seconds a finished session stays available for polling
+FPS_WINDOW = 30  # Recent frames a session's frame rate is measured over
+
+STARTING = 'starting'
+RUNNING = 'running'
+STOPPING = 'stopping'
+FINISHED = 'finished'
+STOPPED = 'stopped'
+FAILED = 'failed'
+ACTIVE_STATES = (STARTING, RUNNING, STOPPING)
+
+
+def create_session_manager(max_sessions=MAX_SESSIONS, session_ttl=SESSION_TTL):
+    """Creates the registry of exercise sessions. Returns the manager dict used by the other functions."""
+    return {
+        'lock': threading.Lock(),
+        'sessions': {},  # session id -> session dict
+        'max_sessions': max_sessions,
+        'session_ttl': session_ttl,
+    }
+
+
+def active_sessions(manager):
+    """Returns the number of sessions that are starting, running or stopping."""
+    with manager['lock']:
+        return sum(1 for session in manager['sessions'].values() if session['status'] in ACTIVE_STATES)
+
+
+def open_session(manager, m, n, x):
+    """
+    Registers a new session for an exercise, counted against max_sessions.
+
+    Returns the session dict, or None when max_sessions sessions are already active. Whoever feeds
+    the session reports frames with record_frame and ends it with finish_session.
+    """
+    with manager['lock']:
+        prune_sessions(manager)
+        if sum(1 for session in manager['sessions'].values() if session['status'] in ACTIVE_STATES) >= manager['max_sessions']:
+            return None
+
+        session = {
+            'id': uuid.uuid4().hex,
+            'exercise': {'m': m, 'n': n, 'x': x},
+            'status': STARTING,
+            'stop_event': threading.Event(),
+            'lock': threading.Lock(),
+            'thread': None,
+            'frames': 0,
+            'latest_score': None,
+            'latest_out_of_tolerance': [],
+            'scores': collections.deque(maxlen=SCORE_HISTORY),
+            'frame_times': collections.deque(maxlen=FPS_WINDOW),
+            'first_frame_id': None,
+            'last_frame_id': None,
+            'result': None,
+            'error': None,
+            'started_at': time.time(),
+            'first_frame_at': None,
+            'finished_at': None,
+        }
+        manager['sessions'][session['id']] = session
+        return session
+
+
+def record_frame(session, frame_id, distances, out_of_tolerance, score):
+    """
+    Records the score of one frame of a session.
+
+    frame_id numbers the frames of the source (camera frames, or the browser's sequence numbers),
+    so the ids skipped between recorded frames count as dropped.
+    """
+    with session['lock']:
+        if session['status'] == STARTING:
+            session['status'] = RUNNING
+            session['first_frame_at'] = time.time()
+        session['frames'] += 1
+        session['frame_times'].append(time.perf_counter())
+        if session['first_frame_id'] is None:
+            session['first_frame_id'] = frame_id
+        session['last_frame_id'] = frame_id
+        session['latest_score'] = None if score != score else float(score)
+        session['latest_out_of_tolerance'] = np.flatnonzero(out_of_tolerance).tolist()
+        session['scores'].append(session['latest_score'])
+
+
+def finish_session(session, result=None, error=None):
+    """Marks a session as finished, stopped (when it was asked to stop) or failed (when error is set)."""
+    with session['lock']:
+        session['result'] = result
+        session['error'] = error
+        if error is not None:
+            session['status'] = FAILED
+        else:
+            session['status'] = STOPPED if session['stop_event'].is_set() else FINISHED
+        session['finished_at'] = time.time()
+
+
+def start_session(manager, run, m, n, x):
+    """
+    Starts an exercise session on a background worker thread and returns its id right away.
+
+    run is called on the worker as run(m, n, x, stop_event, on_frame) and should return once the exercise
+    ends or stop_event is set, calling on_frame(frame_id, distances, out_of_tolerance, score) for each frame.
+    Returns None when max_sessions sessions are already active.
+    """
+    session = open_session(manager, m, n, x)
+    if session is None:
+        return None
+
+    session['thread'] = threading.Thread(target=run_session, args=(session, run), daemon=True)
+    session['thread'].start()
+    return session['id']
+
+
+def run_session(session, run):
+    """Worker thread body: runs the exercise and records how it ended."""
+    def on_frame(frame_id, distances, out_of_tolerance, score):
+        record_frame(session, frame_id, distances, out_of_tolerance, score)
+
+    try:
+        exercise = session['exercise']
+        result = run(exercise['m'], exercise['n'], exercise['x'], session['stop_event'], on_frame)
+        finish_session(session, result)
+    except Exception as e:
+        print(f"Error in session {session['id']}: {e}")
+        finish_session(session, error=str(e))
+
+
+def get_session(manager, session_id):
+    """Returns the session dict for an id, or None when it does not exist (or has expired)."""
+    with manager['lock']:
+        return manager['sessions'].get(session_id)
+
+
+def list_sessions(manager):
+    """Returns every session still kept by the manager."""
+    with manager['lock']:
+        return list(manager['sessions'].values())
+
+
+def session_rates(session):
+    """Returns (fps over the last FPS_WINDOW frames, frames dropped by the source so far). Call with the session lock held."""
+    times = session['frame_times']
+    fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+    dropped = 0
+    if session['first_frame_id'] is not None:
+        dropped = max(0, session['last_frame_id'] - session['first_frame_id'] + 1 - session['frames'])
+    return fps, dropped
+
+
+def session_status(session):
+    """Summarizes a session for the status endpoint."""
+    with session['lock']:
+        scores = [score for score in session['scores'] if score is not None]
+        fps, dropped = session_rates(session)
+        return {
+            'session_id': session['id'],
+            'exercise': session['exercise'],
+            'status': session['status'],
+            'frames': session['frames'],
+            'fps': round(fps, 2),
+            'dropped_frames': dropped,
+            'time_to_first_frame': round(session['first_frame_at'] - session['started_at'], 3) if session['first_frame_at'] else None,
+            'latest_score': session['latest_score'],
+            'mean_score': float(np.mean(scores)) if scores else None,
+            'started_at': session['started_at'],
+            'finished_at': session['finished_at'],
+            'result': session['result'],
+            'error': session['error'],
+        }
+
+
+def session_scores(session, since=0):
+    """Returns the recent frame scores of a session (from position `since` of the kept history) for the scores endpoint."""
+    with session['lock']:
+        scores = list(session['scores'])
+        return {
+            'session_id': session['id'],
+            'status': session['status'],
+            'frames': session['frames'],
+            'latest_score': session['latest_score'],
+            'out_of_tolerance': session['latest_out_of_tolerance'],
+            'scores': scores[since:],
+        }
+
+
+def stop_session(session, timeout=None):
+    """Asks a session to stop, optionally waiting up to timeout seconds for its worker to finish."""
+    with session['lock']:
+        if session['status'] in (STARTING, RUNNING):
+            session['status'] = STOPPING
+    session['stop_event'].set()
+    if timeout is not None and session['thread'] is not None:
+        session['thread'].join(timeout)
+
+
+def stop_all_sessions(manager, timeout=1.0):
+    """Stops every active session, e.g. when the server shuts down."""
+    with manager['lock']:
+        sessions = list(manager['sessions'].values())
+    for session in sessions:
+        stop_session(session, timeout)
+
+
+def prune_sessions(manager):
+    """Forgets sessions that finished more than session_ttl seconds ago. The caller holds the manager lock."""
+    now = time.time()
+    expired = [session_id for session_id, session in manager['sessions'].items()
+               if session['finished_at'] is not None and now - session['finished_at'] > manager['session_ttl']]
+    for session_id in expired:
+        del manager['sessions'][session_id]
@@ -0,0 +1,122 @@
+import bisect
+import collections
+import os
+import threading
+import time
+
+import numpy as np
+
+# Constants
+HISTOGRAM_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)  # Upper bounds in seconds
+METRICS_WINDOW = 1000  # Recent durations kept per stage for the rolling quantiles
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = 'formify'
+
+# Stage timings of this process, shared by every thread. Disabled unless FORMIFY_METRICS=1 or enable_metrics is called.
+registry = {
+    'enabled': os.environ.get('FORMIFY_METRICS', '0') == '1',
+    'lock': threading.Lock(),
+    'stages': {},  # stage name -> histogram dict
+}
+
+
+def enable_metrics(enabled=True):
+    """Turns stage timing on or off for the whole process."""
+    registry['enabled'] = enabled
+
+
+def reset_metrics():
+    """Forgets every recorded stage timing."""
+    with registry['lock']:
+        registry['stages'].clear()
+
+
+def start_timer():
+    """Starts timing a stage: returns the current time, or None when metrics are disabled (then record_stage does nothing)."""
+    return time.perf_counter() if registry['enabled'] else None
+
+
+def record_stage(stage, started):
+    """
+    Records the time since `started` (from start_timer) for a stage.
+
+    Returns the current time, so the next stage can start from it, or None when metrics are disabled.
+    """
+    if started is None:
+        return None
+
+    now = time.perf_counter()
+    elapsed = now - started
+    with registry['lock']:
+        histogram = registry['stages'].get(stage)
+        if histogram is None:
+            histogram = registry['stages'][stage] = {
+                'buckets': [0] * (len(HISTOGRAM_BUCKETS) + 1),  # Last bucket is +Inf
+                'sum': 0.0,
+                'count': 0,
+                'recent': collections.deque(maxlen=METRICS_WINDOW),
+            }
+        histogram['buckets'][bisect.bisect_left(HISTOGRAM_BUCKETS, elapsed)] += 1
+        histogram['sum'] += elapsed
+        histogram['count'] += 1
+        histogram['recent'].append(elapsed)
+    return now
+
+
+def stage_report():
+    """Summarizes every stage: total count and mean / p50 / p95 / p99 milliseconds over its recent durations."""
+    with registry['lock']:
+        stages = {stage: (histogram['count'], list(histogram['recent'])) for stage, histogram in registry['stages'].items()}
+
+    report = {}
+    for stage, (count, recent) in stages.items():
+        recent = np.array(recent) * 1000
+        report[stage] = {
+            'count': count,
+            'mean_ms': round(float(recent.mean()), 3),
+            **{f"p{int(quantile * 100)}_ms": round(float(np.quantile(recent, quantile)), 3) for quantile in QUANTILES},
+        }
+    return report
+
+
+def escape_label(value):
+    """Escapes a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def metric_line(name, labels, value):
+    """Formats one Prometheus text sample, e.g. formify_session_fps{session_id="..."} 24.5"""
+    label_text = ','.join(f'{key}="{escape_label(label)}"' for key, label in labels.items())
+    return f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}" if label_text else f"{METRIC_PREFIX}_{name} {value}"
+
+
+def prometheus_text():
+    """
+    Renders the stage timings in the Prometheus text format: a cumulative histogram of every stage
+    (formify_stage_seconds) and its rolling quantiles over the last METRICS_WINDOW durations
+    (formify_stage_recent_seconds). Returns a list of lines.
+    """
+    with registry['lock']:
+        stages = {stage: (list(histogram['buckets']), histogram['sum'], histogram['count'], list(histogram['recent']))
+                  for stage, histogram in sorted(registry['stages'].items())}
+
+    lines = [
+        f"# HELP {METRIC_PREFIX}_stage_seconds Duration of each processing stage.",
+        f"# TYPE {METRIC_PREFIX}_stage_seconds histogram",
+    ]
+    for stage, (buckets, total, count, _) in stages.items():
+        cumulative = np.cumsum(buckets)
+        for bound, observed in zip(HISTOGRAM_BUCKETS + ('+Inf',), cumulative):
+            lines.append(metric_line('stage_seconds_bucket', {'stage': stage, 'le': bound}, int(observed)))
+        lines.append(metric_line('stage_seconds_sum', {'stage': stage}, total))
+        lines.append(metric_line('stage_seconds_count', {'stage': stage}, count))
+
+    lines += [
+        f"# HELP {METRIC_PREFIX}_stage_recent_seconds Quantiles of the recent durations of each stage.",
+        f"# TYPE {METRIC_PREFIX}_stage_recent_seconds gauge",
+    ]
+    for stage, (_, _, _, recent) in stages.items():
+        if recent:
+            for quantile, value in zip(QUANTILES, np.quantile(recent, QUANTILES)):
+                lines.append(metric_line('stage_recent_seconds', {'stage': stage, 'quantile': quantile}, float(value)))
+    return lines
@@ -2,6 +2,14 @@
 
 // Get the video element for the camera feed
 const cameraFeed = document.getElementById('camera-feed');
+const feedback = document.getElementById('feedback');
+
+// Frames sent to the server for scoring
+const SEND_FPS = 15;  // Frames offered per second
+const FRAME_WIDTH = 320;  // Frames are downscaled to this width before encoding
+const JPEG_QUALITY = 0.7;
+const MAX_IN_FLIGHT = 1;  // Frames sent without a reply yet, newer frames are dropped beyond this
+const HEADER_SIZE = 12;  // uint32 sequence + float64 capture time (ms), little-endian
 
 // Check if the browser supports accessing the camera
 if (navigator.mediaDevices && navigator.mediaDevices.getUserMedia) {
@@ -9,6 +17,7 @@ if (navigator.mediaDevices && navigator.mediaDevices.getUserMedia) {
         .then(function(stream) {
             // Set the source of the video element to the camera stream
             cameraFeed.srcObject = stream;
+            cameraFeed.onloadedmetadata = startStreaming;
         })
         .catch(function(error) {
             console.error("Error accessing the camera: ", error);
@@ -16,3 +25,86 @@ if (navigator.mediaDevices && navigator.mediaDevices.getUserMedia) {
 } else {
     alert("Your browser does not support accessing the camera.");
 }
+
+// Streams downscaled camera frames to /ingest and shows the score it sends back
+function startStreaming() {
+    const params = new URLSearchParams(window.location.search);
+    const m = params.get('m'), n = params.get('n'), x = params.get('x');
+    if (!(m && n && x)) {
+        console.log("No exercise given (m, n, x), frames are not sent to the server.");
+        return;
+    }
+
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/ingest?m=${encodeURIComponent(m)}&n=${encodeURIComponent(n)}&x=${encodeURIComponent(x)}`);
+    socket.binaryType = 'arraybuffer';
+
+    const canvas = document.createElement('canvas');
+    canvas.width = FRAME_WIDTH;
+    canvas.height = Math.round(FRAME_WIDTH * cameraFeed.videoHeight / cameraFeed.videoWidth);
+    const context = canvas.getContext('2d');
+
+    const stats = { sent: 0, dropped: 0, received: 0, roundTrips: [] };
+    let sequence = 0;
+    let inFlight = 0;
+    let encoding = false;
+
+    function sendFrame() {
+        // Backpressure: drop this frame while the server (or the socket buffer) is behind
+        if (socket.readyState !== WebSocket.OPEN || encoding || inFlight >= MAX_IN_FLIGHT || socket.bufferedAmount > 0) {
+            stats.dropped++;
+            return;
+        }
+
+        const captureTime = performance.now();
+        context.drawImage(cameraFeed, 0, 0, canvas.width, canvas.height);
+        encoding = true;
+        canvas.toBlob(function(blob) {
+            encoding = false;
+            if (!blob) return;
+            blob.arrayBuffer().then(function(jpeg) {
+                const message = new Uint8Array(HEADER_SIZE + jpeg.byteLength);
+                const header = new DataView(message.buffer);
+                header.setUint32(0, sequence++, true);
+                header.setFloat64(4, captureTime, true);
+                message.set(new Uint8Array(jpeg), HEADER_SIZE);
+                socket.send(message.buffer);
+                inFlight++;
+                stats.sent++;
+            });
+        }, 'image/jpeg', JPEG_QUALITY);
+    }
+
+    socket.onmessage = function(event) {
+        const reply = JSON.parse(event.data);
+        if ('sequence' in reply) {
+            // Every frame gets one reply, also the ones the server could not decode
+            inFlight = Math.max(0, inFlight - 1);
+            stats.received++;
+        }
+        if (reply.error) {
+            console.error("Frame stream error: ", reply.error);
+            return;
+        }
+        if (reply.session_id) {
+            console.log("Frame stream session: ", reply.session_id);
+            return;
+        }
+
+        // Round trip from capture in the browser to the reply arriving, over the last 100 frames
+        stats.roundTrips.push(performance.now() - reply.client_time);
+        if (stats.roundTrips.length > 100) stats.roundTrips.shift();
+        const meanRoundTrip = stats.roundTrips.reduce((a, b) => a + b, 0) / stats.roundTrips.length;
+
+        if (feedback) {
+            const score = reply.score === null ? '-' : `${Math.round(reply.score * 100)}%`;
+            feedback.innerText = `Score: ${score} | round trip ${meanRoundTrip.toFixed(0)} ms (server ${reply.server_ms} ms) | dropped ${stats.dropped}`;
+        }
+    };
+
+    const timer = setInterval(sendFrame, 1000 / SEND_FPS);
+    socket.onclose = function() {
+        clearInterval(timer);
+        console.log("Frame stream closed: ", stats);
+    };
+}
@@ -1,8 +1,15 @@
 import cv2
-import mediapipe as mp
 import csv
 import os
+import time
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from referenceStore import landmark_vector
+from landmarkWriter import BINARY_BACKEND, open_landmark_writer, write_rows, close_landmark_writer
+from landmarkExtractor import DEFAULT_MODE, create_landmark_extractor, extract_landmarks, close_landmark_extractor, landmarks_to_row, extractor_settings
+from stageMetrics import start_timer, record_stage
+from extractionCache import CACHE_DIR, open_extraction_cache, save_extraction_cache, cache_key, load_cached_landmarks, save_cached_landmarks
 
 # Constants
 DURATION = 10  # Duration of the video in seconds
@@ -39,12 +46,10 @@ def extract_mnx_from_video(video_name):
     intensity = video_name_values[2].split(".")[0]  # Remove file extension
     return recovery_timeline, body_part, intensity
 
-def process_video(video_path, output_csv, n, m, x, target_fps=TARGET_FPS):
-    # Initialize mediapipe solutions
-    mp_pose = mp.solutions.pose
-    mp_hands = mp.solutions.hands
-    pose = mp_pose.Pose()
-    hands = mp_hands.Hands()
+def extract_video_rows(video_path, n, m, x, target_fps=TARGET_FPS, extractor_mode=DEFAULT_MODE):
+    """Runs landmark extraction on one video and returns (rows, fps), one CSV row per frame. rows is None on error."""
+    # Initialize the landmark models (one pass for pose and hands)
+    extractor = create_landmark_extractor(extractor_mode)
 
     # Initialize video capture
     cap = cv2.VideoCapture(video_path)
@@ -55,7 +60,9 @@ def process_video(video_path, output_csv, n, m, x, target_fps=TARGET_FPS):
     # Check if fps is valid
     if fps == 0:
         print("Error: Unable to read video frame rate.")
-        return
+        cap.release()
+        close_landmark_extractor(extractor)
+        return None, fps
 
     # Ensure target_fps is not greater than fps
     if target_fps > fps:
@@ -72,16 +79,17 @@ def process_video(video_path, output_csv, n, m, x, target_fps=TARGET_FPS):
     # Total frames needed for 10 seconds
     total_frames_needed = target_fps * DURATION  # 150 frames for 10 seconds
 
-    # Write the header if the file doesn't exist
-    if not os.path.exists(output_csv):
-        with open(output_csv, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(generate_header())  # Write header to CSV
+    # Landmark columns after timestamp, fps, m, n, x (built once, not per padded row)
+    landmark_width = len(generate_header()) - 5
+
+    rows = []
 
     while cap.isOpened():
+        started = start_timer()
         ret, frame = cap.read()
         if not ret:
             break
+        record_stage('decode', started)
 
         # Process every frame at the interval that matches target FPS
         if frame_count % frame_interval == 0:
@@ -92,37 +100,12 @@ def process_video(video_path, output_csv, n, m, x, target_fps=TARGET_FPS):
             # Prepare row data with n, m, x, and timestamp/frame info
             row_data = [f"{int(time_seconds)}_{int(frame_position)}",fps, n, m, x]  # Include timestamp and n, m, x values
 
-            # Extract pose landmarks and append values
-            pose_results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            if pose_results.pose_landmarks:
-                pose_landmarks = pose_results.pose_landmarks.landmark
-
-                for i, landmark in enumerate(pose_landmarks):
-                    # Append corresponding values for pose landmarks
-                    row_data.append(landmark.x)
-                    row_data.append(landmark.y)
-                    row_data.append(landmark.z)
-            else:
-                # Append None values for pose landmarks if not detected
-                row_data.extend([None, None, None] * NUM_POSE_LANDMARKS)  # Assuming 33 pose landmarks
-
-            # Extract hand landmarks and append values
-            hand_results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            if hand_results.multi_hand_landmarks:
-                for hand_index, hand_landmarks in enumerate(hand_results.multi_hand_landmarks):
-                    for i, landmark in enumerate(hand_landmarks.landmark):
-                        # Append corresponding values for hand landmarks
-                        row_data.append(landmark.x)
-                        row_data.append(landmark.y)
-                        row_data.append(landmark.z)
-            else:
-                # Append None values for hand landmarks if not detected
-                row_data.extend([None, None, None] * (NUM_HANDS * NUM_HAND_LANDMARKS))  # Assuming 21 landmarks per hand, 2 hands
-
-            # Write the row data (timestamp, n, m, x + landmarks data) to the CSV
-            with open(output_csv, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(row_data)
+            # Extract pose and hand landmarks (NaN, written as empty cells, when not detected)
+            landmarks = extract_landmarks(extractor, frame)
+            started = start_timer()
+            row_data.extend(landmarks_to_row(landmarks))
+            rows.append(row_data)
+            record_stage('row_packing', started)
 
         # Increment frame count
         frame_count += 1
@@ -130,22 +113,148 @@ def process_video(video_path, output_csv, n, m, x, target_fps=TARGET_FPS):
     # Ensure at least 150 rows are created in the CSV
     while frame_count < total_frames_needed:
         # Write a row with empty landmark data or NaN values
-        empty_row = [f"{frame_count // target_fps}_{frame_count % target_fps}",fps,  n, m, x] + [None] * (len(generate_header()) - 4)  # Adjust for your total columns
-        with open(output_csv, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(empty_row)
+        empty_row = [f"{frame_count // target_fps}_{frame_count % target_fps}",fps,  n, m, x] + [None] * landmark_width
+        rows.append(empty_row)
         frame_count += 1
 
     # Release video capture
     cap.release()
+    close_landmark_extractor(extractor)
+
+    return rows, fps
+
+def open_output_writers(output_csv, binary_dir=None, append=False):
+    """Opens the buffered CSV writer, plus a binary reference writer (testCamera) when binary_dir is set."""
+    header = generate_header()
+    writers = [open_landmark_writer(output_csv, header, append=append)]
+    if binary_dir is not None:
+        writers.append(open_landmark_writer(binary_dir, header, BINARY_BACKEND))
+    return writers
+
+def write_video_rows(writers, rows):
+    """Buffers the rows of one video on every writer (the writers check them against the header)."""
+    for writer in writers:
+        write_rows(writer, rows)
+
+def close_output_writers(writers):
+    """Flushes and closes every writer."""
+    for writer in writers:
+        close_landmark_writer(writer)
+
+def process_video(video_path, output_csv, n, m, x, target_fps=TARGET_FPS, binary_dir=None, extractor_mode=DEFAULT_MODE):
+    rows, fps = extract_video_rows(video_path, n, m, x, target_fps, extractor_mode)
+    if rows is None:
+        return
+
+    # Append to the CSV, writing the header only if the file doesn't exist yet
+    writers = open_output_writers(output_csv, binary_dir, append=True)
+    write_video_rows(writers, rows)
+    close_output_writers(writers)
+
+def extract_video_job(job):
+    """Worker entry point: extracts one video with its own MediaPipe models and returns (rows, fps, seconds)."""
+    video_path, n, m, x, target_fps, extractor_mode = job
+    start_time = time.perf_counter()
+    rows, fps = extract_video_rows(video_path, n, m, x, target_fps, extractor_mode)
+    return rows, fps, time.perf_counter() - start_time
+
+def rows_to_cache(rows):
+    """Packs the rows of one video into what the extraction cache stores: (landmarks [rows, 225], meta)."""
+    landmarks = np.array([landmark_vector(row[5:]) for row in rows], dtype=np.float32)
+    meta = {'timestamps': [row[0] for row in rows], 'fps': rows[0][1] if rows else None}
+    return landmarks, meta
+
+def rows_from_cache(landmarks, meta, n, m, x):
+    """Rebuilds the CSV rows of one video from its cached landmarks."""
+    return [[timestamp, meta['fps'], n, m, x] + landmarks_to_row(values)
+            for timestamp, values in zip(meta['timestamps'], landmarks)]
+
+def read_kept_rows(output_csv, keys):
+    """The rows of an existing output CSV whose (m, n, x) is not in keys, in file order (none when it does not exist yet)."""
+    if not os.path.exists(output_csv):
+        return []
+    with open(output_csv, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Header
+        return [row for row in reader if tuple(row[2:5]) not in keys]
+
+def process_videos(folder_path, output_csv, workers=None, target_fps=TARGET_FPS, binary_dir=None, extractor_mode=DEFAULT_MODE, cache_dir=CACHE_DIR):
+    """
+    Extracts every video in the folder, using a pool of worker processes (one video per worker at a time).
+
+    The CSV is rewritten with the videos in file name order, so the output is the same on every run
+    regardless of which worker finishes first. Rows of exercises without a video in the folder, or whose
+    video fails, are kept (ahead of the extracted ones). workers=1 runs in this process.
+    Videos already extracted with the same content and parameters are read from the cache in cache_dir
+    (None disables the cache) instead of running MediaPipe again.
+    """
+    # Videos in a fixed order, with n, m, x taken from the file name
+    jobs = []
+    for file_name in sorted(os.listdir(folder_path)):
+        if file_name.endswith(('.mp4', '.avi', '.mov', '.mkv')):
+            video_path = os.path.join(folder_path, file_name)
+            m, n, x = extract_mnx_from_video(file_name)
+            jobs.append((file_name, (video_path, m, n, x, target_fps, extractor_mode)))
+
+    results = {}
+
+    def report_progress(file_name, result, cached=False):
+        rows, fps, seconds = result
+        results[file_name] = result
+        status = f"{len(rows)} rows" if rows is not None else "failed"
+        print(f"[{len(results)}/{len(jobs)}] {file_name}: {status} {'from cache' if cached else f'in {seconds:.1f}s'}")
+
+    # Reuse the landmarks of videos whose content and extraction parameters have not changed
+    cache = open_extraction_cache(cache_dir) if cache_dir is not None else None
+    params = {'target_fps': target_fps, 'duration': DURATION, 'extractor': extractor_settings(extractor_mode)}
+    keys = {}
+    pending = []
+    for file_name, job in jobs:
+        if cache is not None:
+            keys[file_name] = cache_key(cache, job[0], params)
+            cached = load_cached_landmarks(cache, keys[file_name])
+            if cached is not None:
+                landmarks, meta = cached
+                report_progress(file_name, (rows_from_cache(landmarks, meta, *job[1:4]), meta['fps'], 0.0), cached=True)
+                continue
+        pending.append((file_name, job))
+
+    workers = min(workers or os.cpu_count() or 1, max(1, len(pending)))
+
+    if workers == 1:
+        for file_name, job in pending:
+            report_progress(file_name, extract_video_job(job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(extract_video_job, job): file_name for file_name, job in pending}
+            for future in as_completed(futures):
+                report_progress(futures[future], future.result())
+
+    # Remember the newly extracted videos
+    if cache is not None:
+        for file_name, job in pending:
+            rows = results[file_name][0]
+            if rows is not None:
+                landmarks, meta = rows_to_cache(rows)
+                save_cached_landmarks(cache, keys[file_name], job[0], params, landmarks, meta)
+        save_extraction_cache(cache)
+
+    # Rewrite the CSV: the exercises not extracted here (or whose video failed) as they were, then the results in file name order
+    kept_rows = read_kept_rows(output_csv, {tuple(job[1:4]) for file_name, job in jobs if results[file_name][0] is not None})
+    writers = open_output_writers(output_csv, binary_dir)
+    write_video_rows(writers, kept_rows)
+    for file_name, _ in jobs:
+        rows, fps, _ = results[file_name]
+        if rows is not None:
+            write_video_rows(writers, rows)
+    close_output_writers(writers)
 
-# Example usage
-folder_path = 'videos\\'  # Replace with your folder path
-output_csv = 'output_landmarks_final.csv'
+if __name__ == '__main__':
+    # Example usage
+    folder_path = 'videos'  # Replace with your folder path
+    output_csv = 'output_landmarks_final.csv'
+    binary_dir = 'references'  # Binary references for testCamera
+    workers = os.cpu_count()  # Number of videos extracted in parallel
 
-# Process each video in the folder and generate CSV
-for file_name in os.listdir(folder_path):
-    if file_name.endswith(('.mp4', '.avi', '.mov', '.mkv')):
-        video_path = os.path.join(folder_path, file_name)
-        m, n, x = extract_mnx_from_video(file_name)
-        process_video(video_path, output_csv, m, n, x)
+    # Process each video in the folder and generate CSV
+    process_videos(folder_path, output_csv, workers, binary_dir=binary_dir)
@@ -1,8 +1,17 @@
 import cv2
-import mediapipe as mp
 import numpy as np
-import pandas as pd
-import requests
+
+from referenceStore import NUM_POSE_LANDMARKS, NUM_HAND_LANDMARKS, NUM_HANDS, open_exercise, reference_frame_at, frame_index_from_timestamp, get_reference_frame
+from landmarkLoader import load_exercise
+from sequenceAlignment import create_online_alignment, update_online_alignment
+from poseIndex import MAX_DETECTION_DISTANCE, load_pose_index, detect_exercise
+from landmarkScoring import DEFAULT_TOLERANCE, score_frame, empty_landmarks
+from landmarkFilter import create_landmark_filter, filter_landmarks, create_motor_gate, update_motor_gate
+from landmarkExtractor import LIVE_MODE, create_landmark_extractor, close_landmark_extractor
+from cameraPipeline import start_pipeline, next_result, record_rendered, stop_pipeline, pipeline_report
+from stageMetrics import start_timer, record_stage
+from frameSource import open_frame_source, release_source, open_window_sink, open_headless_sink, show_frame, close_sink
+from hapticDispatcher import create_session, send_vibration_request, start_haptic_dispatcher, send_vibration, stop_haptic_dispatcher
 
 # Replace this with the actual IP address of your ESP32
 ESP32_IP = 'http://192.168.137.223'  # Example: 'http://192.168.1.100'
@@ -14,115 +23,81 @@ POSE_COLOR = (0, 255, 0)  # Green for pose
 HAND_COLOR = (255, 0, 0)  # Blue for hands
 COUNTDOWN_START = 0  # Countdown starting value
 TARGET_FPS = 28  # Frame rate
-B_VALUE = 2.5
+B_VALUE = DEFAULT_TOLERANCE  # Allowed distance from the reference joint, in normalized image units
+DETECTION_FRAMES = 10  # Inferred frames the exercise is detected from when m, n, x are not given
+DETECTION_CONFIDENCE = 0.6  # Share of the pose votes the detected exercise needs
+
+
+# Pose joints that each glove motor reacts to, per exercise (n)
+# arm..: 13, 14
+# knee.: 25, 26
+# wrist: 15, 16
+MOTOR_JOINTS = {
+    "arm_stretch": {0: [11, 12, 13, 14]},
+    "knee": {1: [25, 26]},
+    "wrist": {0: [15, 16, 17, 19]}
+}
+
+# Exercises read by find_hand_landmark, parsed once per (csv_file, m, n, x) for the life of the process
+csv_exercises = {}
 
+# Shared keep-alive sessions for the one-off requests below, per glove address, opened on first use
+vibration_sessions = {}
+
+def get_vibration_session(esp32_ip=ESP32_IP):
+    """Returns the keep-alive session to the glove, opening it on the first request."""
+    if esp32_ip not in vibration_sessions:
+        vibration_sessions[esp32_ip] = create_session()
+    return vibration_sessions[esp32_ip]
 
 def turn_on_vibration(int_value):
     """Sends a GET request to turn the Vibration Motor on."""
-    url = f"{ESP32_IP}/vib/on?value={int_value}"
-    
-    try:
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            print(f"Vibration Motor ON: {response.text}")
-        else:
-            print(f"Failed to turn on Vibration Motor. Status code: {response.status_code}")
-    except Exception as e:
-        print(f"Error turning on Vibration Motor: {e}")
+    if send_vibration_request(get_vibration_session(), ESP32_IP, int_value, True):
+        print(f"Vibration Motor ON: {int_value}")
 
 def turn_off_vibration(int_value):
     """Sends a GET request to turn the Vibration Motor off."""
-    url = f"{ESP32_IP}/vib/off?value={int_value}"
-    
-    try:
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            print(f"Vibration Motor OFF: {response.text}")
-        else:
-            print(f"Failed to turn off Vibration Motor. Status code: {response.status_code}")
-    except Exception as e:
-        print(f"Error turning off Vibration Motor: {e}")
-
-def find_val(matching_row, column_name):
-    final_value = 0
-    try:
-        final_value = matching_row[column_name].values[0]
-    except:
-        print("")
-    return final_value
-
-def vibrate(part, boolean, bdy_type, request):
-    # type represents hand or pose
-    print(f"vibrating: {boolean} of {part} at {bdy_type}")
+    if send_vibration_request(get_vibration_session(), ESP32_IP, int_value, False):
+        print(f"Vibration Motor OFF: {int_value}")
 
-    """
-    arm..: 13, 14
-    knee.: 25, 26
-    wrist: 15, 16
+def vibrate(motor, boolean, dispatcher):
+    """Queues a motor on/off change on the haptic dispatcher and returns right away."""
+    if dispatcher is not None:
+        send_vibration(dispatcher, motor, boolean)
 
+def draw_landmarks(reference_frame, frame, live_landmarks, n, dispatcher=None, motor_gate=None, timestamp=None):
     """
+    Draws the live [75, 3] landmarks on the frame, comparing them against the [75, 3] reference frame.
 
-    my_dict = {
-        "arm_stretch": [11, 12, 13,14],
-        "knee": [25,26],
-        "wrist": [15,16, 17, 19]
-    }
-
-    # if(part in my_dict[request] and request == "knee"):
-
-    #     if(boolean):
-    #         turn_on_vibration(1)
-       
-    # if(part == my_dict[request][1] and request != "knee"):
-    
-    #     if(boolean):
-    #         turn_on_vibration(0)
-
-    # else:
-    #     turn_off_vibration(1)
-    #     turn_off_vibration(0)
-        
-
-def draw_landmarks(output_csv, frame, pose_landmarks, hand_landmarks, m,n, intensity, countdown_time,  frame_count):
-    """Draws pose and hand landmarks on the frame.""" # [column_name].values[0]
-    matching_row_data = find_hand_landmark( output_csv, m, n, intensity, countdown_time, frame_count)
-    # Draw pose landmarks
-    if pose_landmarks:
-        for i, landmark in enumerate(pose_landmarks):
-            x = int(landmark.x * frame.shape[1])
-            y = int(landmark.y * frame.shape[0])
-            
-            # Retrieve pose landmark values from CSV
-            pose_landmark_value_x = find_val( matching_row_data, f'pose_landmark_{i}_x')
-            pose_landmark_value_y = find_val( matching_row_data, f'pose_landmark_{i}_y' )
-            
-            if(pose_landmark_value_x and pose_landmark_value_y):
-                if(pose_landmark_value_x - x > B_VALUE or pose_landmark_value_y > B_VALUE or pose_landmark_value_x - x < -B_VALUE or pose_landmark_value_y < -B_VALUE):
-                    vibrate(i, True, "pose", n)
-                else:
-                    vibrate(i, False, "pose", n)
-
-            cv2.circle(frame, (x, y), LANDMARK_RADIUS, POSE_COLOR, -1)
+    With a motor_gate (landmarkFilter.create_motor_gate) the motors follow its hysteresis and minimum
+    dwell at timestamp (seconds), instead of switching on every frame a joint crosses the tolerance.
+    """
+    # Score every joint against the reference in one pass
+    started = start_timer()
+    distances, out_of_tolerance, score = score_frame(live_landmarks,
+                                                     reference_frame if reference_frame is not None else empty_landmarks(),
+                                                     B_VALUE)
+    started = record_stage('scoring', started)
+
+    # A motor vibrates while any of its joints is out of tolerance
+    if motor_gate is not None:
+        for motor, on in update_motor_gate(motor_gate, distances, timestamp).items():
+            vibrate(motor, on, dispatcher)
+    else:
+        for motor, joints in MOTOR_JOINTS.get(n, {}).items():
+            vibrate(motor, bool(out_of_tolerance[joints].any()), dispatcher)
+    started = record_stage('haptic_dispatch', started)
+
+    # Pixel positions of the detected landmarks
+    detected = ~np.isnan(live_landmarks[:, 0])
+    points = np.zeros((len(live_landmarks), 2), dtype=np.int32)
+    points[detected] = (live_landmarks[detected, :2] * (frame.shape[1], frame.shape[0])).astype(np.int32)
+
+    # Draw pose and hand landmarks
+    for i in np.flatnonzero(detected):
+        color = POSE_COLOR if i < NUM_POSE_LANDMARKS else HAND_COLOR
+        cv2.circle(frame, (int(points[i, 0]), int(points[i, 1])), LANDMARK_RADIUS, color, -1)
 
-    # Draw hand landmarks
-    if hand_landmarks:
-        for hand_index, hand in enumerate(hand_landmarks):
-            for j, landmark in enumerate(hand.landmark):
-                x = int(landmark.x * frame.shape[1])
-                y = int(landmark.y * frame.shape[0])
-                 
-                # Retrieve hand landmark values from CSV
-                hand_landmark_value_x = find_val( matching_row_data, f'hand_{hand_index}_landmark_{j}_x')
-                hand_landmark_value_y = find_val( matching_row_data, f'hand_{hand_index}_landmark_{j}_y')
-                if(hand_landmark_value_x and hand_landmark_value_y):
-                    if(hand_landmark_value_x - x > B_VALUE or hand_landmark_value_y > B_VALUE or hand_landmark_value_x - x < -B_VALUE or hand_landmark_value_y < -B_VALUE):
-                        vibrate(j, True, "hand", n)
-                    else:
-                        vibrate(j, False, "hand", n)
-
-                cv2.circle(frame, (x, y), LANDMARK_RADIUS, HAND_COLOR, -1)
     # Define connections between pose landmarks (you can customize this)
     connections = [
         (11, 12), (12, 14), (14, 16),  # Left Arm
@@ -135,29 +110,28 @@ def draw_landmarks(output_csv, frame, pose_landmarks, hand_landmarks, m,n, inten
     
     # Draw connections between landmarks
     for start_idx, end_idx in connections:
-        if start_idx < len(pose_landmarks) and end_idx < len(pose_landmarks):
-            if pose_landmarks[start_idx] and pose_landmarks[end_idx]:
-                start_x = int(pose_landmarks[start_idx].x * frame.shape[1])
-                start_y = int(pose_landmarks[start_idx].y * frame.shape[0])
-                end_x = int(pose_landmarks[end_idx].x * frame.shape[1])
-                end_y = int(pose_landmarks[end_idx].y * frame.shape[0])
+        if detected[start_idx] and detected[end_idx]:
+            # Draw a line between the two landmarks
+            cv2.line(frame, (int(points[start_idx, 0]), int(points[start_idx, 1])), (int(points[end_idx, 0]), int(points[end_idx, 1])), POSE_COLOR, 2)
+    record_stage('drawing', started)
 
-                # Draw a line between the two landmarks
-                cv2.line(frame, (start_x, start_y), (end_x, end_y), POSE_COLOR, 2)
-        else:
-            print(f"Invalid indices: {start_idx}, {end_idx} for pose_landmarks with length {len(pose_landmarks)}")
+    return distances, out_of_tolerance, score
 
 # Constants
 EXPECTED_POSE_COLOR = (255, 255, 0)  # Color for pose landmarks (Green)
 EXPECTED_HAND_COLOR = (255, 255, 0)  # Color for hand landmarks (Red)
 
+def is_valid_point(landmark):
+    """Checks that the x and y coordinates of a landmark are numbers and not NaN (missing)."""
+    return all(isinstance(value, (int, float)) and value == value for value in landmark[:2])
+
 def draw_expected_landmarks(frame, pose_landmarks, hand_landmarks):
     """Draws pose and hand landmarks on the frame."""
     
     # Draw pose landmarks
     if pose_landmarks:
         for landmark in pose_landmarks:
-            if isinstance(landmark[0], (int, float)) and isinstance(landmark[1], (int, float)):  # Check if coordinates are numbers
+            if is_valid_point(landmark):  # Check if coordinates are numbers
                 x = int(landmark[0] * frame.shape[1])  # x coordinate
                 y = int(landmark[1] * frame.shape[0])  # y coordinate
                 cv2.circle(frame, (x, y), LANDMARK_RADIUS, EXPECTED_POSE_COLOR, -1)
@@ -166,7 +140,7 @@ def draw_expected_landmarks(frame, pose_landmarks, hand_landmarks):
     if hand_landmarks:
         for hand in hand_landmarks:
             for landmark in hand:
-                if isinstance(landmark[0], (int, float)) and isinstance(landmark[1], (int, float)):  # Check if coordinates are numbers
+                if is_valid_point(landmark):  # Check if coordinates are numbers
                     x = int(landmark[0] * frame.shape[1])  # x coordinate
                     y = int(landmark[1] * frame.shape[0])  # y coordinate
                     cv2.circle(frame, (x, y), LANDMARK_RADIUS, EXPECTED_HAND_COLOR, -1)
@@ -188,7 +162,7 @@ def draw_expected_landmarks(frame, pose_landmarks, hand_landmarks):
     # Draw connections between landmarks
     for start_idx, end_idx in connections:
         if start_idx < len(pose_landmarks) and end_idx < len(pose_landmarks):
-            if pose_landmarks[start_idx] and pose_landmarks[end_idx]:
+            if is_valid_point(pose_landmarks[start_idx]) and is_valid_point(pose_landmarks[end_idx]):
                 start_x = int(pose_landmarks[start_idx][0] * frame.shape[1])  # Adjust to access x
                 start_y = int(pose_landmarks[start_idx][1] * frame.shape[0])  # Adjust to access y
                 end_x = int(pose_landmarks[end_idx][0] * frame.shape[1])  # Adjust to access x
@@ -210,154 +184,204 @@ def generate_time_frame(number_1, number_2):
     result = f"{number_1}_{number_2}"
     return result
 
-def find_hand_landmark(csv_file, m, n, x, timestamp, frame_position):
-    """Returns the specified column from the CSV based on the given m, n, x, timestamp, and frame_position."""
-    # Read the CSV file
-    df = pd.read_csv(csv_file)
-
-    # Calculate the expected timestamp based on the given frame position
-    expected_timestamp = generate_time_frame(timestamp, frame_position)
-
-    # Find the row with matching m, n, x values and matching timestamp
-    matching_row = df[
-        (df['m'] == m) & 
-        (df['n'] == n) & 
-        (df['x'] == x) & 
-        (df['timestamp'] == expected_timestamp)
-    ]
+def get_csv_exercise(csv_file, m, n, x):
+    """Loads an exercise from a reference CSV once and reuses it (None when it is not in the CSV, also kept)."""
+    key = (csv_file, m, n, x)
+    if key not in csv_exercises:
+        csv_exercises[key] = load_exercise(csv_file, m, n, x)
+    return csv_exercises[key]
 
-    # Check if a matching row is found
-    if matching_row.empty:
-        print("No matching landmarks found.")
+
+def find_hand_landmark(csv_file, m, n, x, timestamp, frame_position):
+    """Returns the [75, 3] landmarks of the frame at the given timestamp and frame_position of the m, n, x exercise in the CSV."""
+    exercise = get_csv_exercise(csv_file, m, n, x)
+    if exercise is None:
         return None
 
-    # Return the value from the specified column
-    return matching_row
+    # Find the frame with the matching timestamp
+    reference_frame = get_reference_frame(exercise, frame_index_from_timestamp(exercise, timestamp, frame_position))
+
+    # Check if a matching frame is found
+    if reference_frame is None:
+        print("No matching landmarks found.")
+    return reference_frame
 
 
 def render_landmarks_from_csv(csv_file, frame, m, n, x, timestamp, frame_position):
     """Renders landmarks from CSV based on the given m, n, x, timestamp, and frame_position."""
-    # Read the CSV file
-    df = pd.read_csv(csv_file)
-
-    # Calculate the frame based on timestamp and TARGET_FPS
-    # expected_frame = timestamp * TARGET_FPS + frame_position
-
-    # Find rows with any matching m, n, x values and matching frame position
-    matching_rows = df[
-        (df['m'] == m) & 
-        (df['n'] == n) & 
-        (df['x'] == x) & 
-        (df['timestamp'] == generate_time_frame(timestamp, frame_position))  # Match frame based on calculated index
-    ]
-
-    if matching_rows.empty:
+    reference_frame = find_hand_landmark(csv_file, m, n, x, timestamp, frame_position)
+    if reference_frame is None:
         print(f"No landmarks found for m={m}, n={n}, x={x}, timestamp={timestamp}, and frame {frame_position}.")
         return
 
-    # Extract pose landmarks
-    pose_landmarks = []
-    for _, row in matching_rows.iterrows():
-        for i in range(33):  # Assuming 33 pose landmarks
-            pose_landmarks.append(
-                [row[f'pose_landmark_{i}_x'], row[f'pose_landmark_{i}_y']]  # Only x and y coordinates for pose landmarks
-            )
-
-    # Extract hand landmarks
-    hand_landmarks = []
-    for _, row in matching_rows.iterrows():
-        hands = []
-        for hand_index in range(2):  # Assuming two hands
-            hand = []
-            for i in range(21):  # Assuming 21 landmarks per hand
-                try:
-                    hand.append(
-                        [float(row[f'hand_{hand_index}_landmark_{i}_x']), 
-                         float(row[f'hand_{hand_index}_landmark_{i}_y'])]  # Only x and y coordinates for hand landmarks
-                        # ]
-                    )
-                except ValueError:
-                    print(f"Error converting hand landmark values to float for hand index {hand_index}, landmark index {i}. Row data: {row}")
-            hands.append(hand)
-        hand_landmarks.append(hands)
-
     # Draw landmarks on the frame
-    draw_expected_landmarks(frame, pose_landmarks, hand_landmarks)
-
-
-
-def process_camera(m,n,x,target_fps=TARGET_FPS):
-    # Initialize mediapipe solutions
-    mp_pose = mp.solutions.pose
-    mp_hands = mp.solutions.hands
-    pose = mp_pose.Pose()
-    hands = mp_hands.Hands()
+    render_reference_landmarks(frame, reference_frame)
 
-    # Initialize video capture from the camera
-    cap = cv2.VideoCapture(0)  # Use 0 for the default camera
 
-    # Check if the camera opened successfully
-    if not cap.isOpened():
-        print("Error: Unable to access the camera.")
+def render_reference_landmarks(frame, reference_frame):
+    """Renders the expected landmarks of one [75, 3] reference frame from the in-memory reference store."""
+    if reference_frame is None:
         return
 
-    # Initialize frame count and countdown time
-    frame_count = 0
-    countdown_time = COUNTDOWN_START
-    # pre
+    # Only x and y coordinates are drawn
+    points = reference_frame[:, :2].tolist()
+    pose_landmarks = points[:NUM_POSE_LANDMARKS]
+    hand_landmarks = [[
+        points[NUM_POSE_LANDMARKS + hand_index * NUM_HAND_LANDMARKS:NUM_POSE_LANDMARKS + (hand_index + 1) * NUM_HAND_LANDMARKS]
+        for hand_index in range(NUM_HANDS)
+    ]]
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        # Extract pose landmarks
-        pose_results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        pose_landmarks = pose_results.pose_landmarks.landmark if pose_results.pose_landmarks else []
-
-        # Extract hand landmarks
-        hand_results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        hand_landmarks = hand_results.multi_hand_landmarks if hand_results.multi_hand_landmarks else []
-
-      
-
-        # Draw countdown timer and frame count on the frame
-        # cv2.putText(frame, f"Countdown: {countdown_time}", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
-        # cv2.putText(frame, f"Frame: {frame_count}", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+    # Draw landmarks on the frame
+    draw_expected_landmarks(frame, pose_landmarks, hand_landmarks)
 
 
 
-        # Decrement countdown every second
-        if frame_count % target_fps == 0:
-            countdown_time += 1
-            frame_count = 0
+def process_camera(m,n,x,target_fps=TARGET_FPS, reference_csv="output_landmarks_final.csv", reference_dir="references", extractor_mode=LIVE_MODE,
+                   stop_event=None, on_frame=None, show=True, follow_patient=True, pose_index=None, source=0, sink=None, haptics=True,
+                   smoothing=True, extractor=None):
+    """
+    Runs a live exercise session until 'q' is pressed, the source ends or stop_event is set.
 
-        # Reset countdown when it reaches 0
-        if countdown_time > 10:
-            countdown_time = COUNTDOWN_START
-            
+    source is anything frameSource.open_frame_source accepts: the camera index (default camera 0), a video
+    path replayed at its own fps, or a source dict, e.g. open_video_source(path, realtime=False) to process
+    every frame as fast as possible. A source that is not realtime plays the reference by video time.
+    sink receives the finished frames (frameSource.open_window_sink / open_headless_sink); by default the
+    OpenCV window, or nothing when show is False (e.g. from a server worker thread). Set haptics to False
+    to leave the glove alone, e.g. when replaying a video.
 
+    With follow_patient, each frame is compared with the reference pose the patient is estimated to be at
+    (online DTW, see sequenceAlignment.update_online_alignment), so moving slower or faster than the video
+    is not scored as wrong. Otherwise the reference plays by wall-clock time.
 
-        
-        # TODO check the landmark here
-        # Render the landmark here too 
-        render_landmarks_from_csv("output_landmarks_final.csv", frame, m,n,x,countdown_time,frame_count)
-          # Draw landmarks on the frame output_csv, frame, pose_landmarks, hand_landmarks, m,n, intensity, countdown_time,  frame_count
-        draw_landmarks("output_landmarks_final.csv", frame, pose_landmarks, hand_landmarks,  m,n,x,countdown_time,frame_count)
+    With smoothing, the landmarks go through a One-Euro filter before they are scored and the glove motors
+    switch with hysteresis and a minimum dwell (landmarkFilter), so landmark jitter does not toggle them.
 
-        # Display the frame with landmarks and countdown
-        cv2.imshow("Camera Feed with Landmarks and Countdown", frame)
+    When m, n and x are not given, the exercise and the phase the patient starts from are detected from
+    the first frames with the nearest-pose index (poseIndex; pose_index, or one built over the references).
 
-        # Break the loop if 'q' is pressed
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+    on_frame, when given, is called with (frame_id, distances, out_of_tolerance, score) for every scored frame.
+    extractor is a landmark extractor to use instead of creating one (e.g. a warm one from modelPool);
+    it is left open for its owner.
+    Returns the pipeline report, or None when the source could not be opened.
+    """
+    # Load the reference landmarks once for the whole session (memory-mapped when a binary reference exists)
+    exercise = None
+    detection_frames = []
+    if m and n and x:
+        exercise = open_exercise(m, n, x, reference_dir, reference_csv)
+    elif pose_index is None:
+        pose_index = load_pose_index(reference_dir, (reference_csv,))
+
+    # Open the camera, video or synthetic frames, and where the finished frames go
+    source = open_frame_source(source)
+    if source is None:
+        return
+    if sink is None:
+        sink = open_window_sink() if show else open_headless_sink()
+
+    # Initialize the landmark models (one pass for pose and hands), unless warm ones were handed over
+    owns_extractor = extractor is None
+    if owns_extractor:
+        extractor = create_landmark_extractor(extractor_mode)
+
+    # Send glove commands from a background thread so a slow Wi-Fi link never stalls the loop
+    dispatcher = start_haptic_dispatcher(ESP32_IP) if haptics else None
+
+    # Capture and inference run on their own threads, this loop renders the freshest result.
+    # Inference is skipped on some frames whenever it cannot keep up with target_fps.
+    pipeline = start_pipeline(source, extractor, target_fps=target_fps)
+
+    # The reference either follows the patient, updated once per inferred frame, or wall-clock time
+    # since the session started, so it plays at its recorded fps whatever rate the camera and inference run at.
+    # Frames replayed faster than realtime are timed by their position in the video instead.
+    session_start = pipeline['stats']['started_at'] if source['live'] else 0.0
+    alignment = create_online_alignment(exercise['landmarks']) if follow_patient and exercise is not None else None
+    aligned_landmarks = None
+
+    # Landmarks are smoothed once per inferred frame, motors are gated once the exercise is known
+    landmark_filter = create_landmark_filter() if smoothing else None
+    raw_landmarks = smoothed_landmarks = None
+    motor_gate = None
+
+    while stop_event is None or not stop_event.is_set():
+        result = next_result(pipeline)
+        if result is None:
+            break
+        if result is False:
+            continue
+
+        # Pose and hand landmarks of the frame as one [75, 3] array
+        frame_id, capture_time, frame, live_landmarks = result
+        frame_time = capture_time if source['live'] else frame_id / source['fps']
+        started = start_timer()
+
+        if landmark_filter is not None:
+            if live_landmarks is not raw_landmarks:
+                raw_landmarks = live_landmarks
+                smoothed_landmarks = filter_landmarks(landmark_filter, live_landmarks, frame_time)
+            live_landmarks = smoothed_landmarks
+            started = record_stage('smoothing', started)
+
+        if exercise is None and pose_index is not None and live_landmarks is not aligned_landmarks:
+            # Detect the exercise from the latest frames, then follow it from the detected phase
+            aligned_landmarks = live_landmarks
+            detection_frames = detection_frames[1 - DETECTION_FRAMES:] + [live_landmarks]
+            detection = detect_exercise(pose_index, np.stack(detection_frames)) if len(detection_frames) == DETECTION_FRAMES else None
+            if detection is not None and detection['confidence'] >= DETECTION_CONFIDENCE and detection['distance'] <= MAX_DETECTION_DISTANCE:
+                m, n, x = detection['key']
+                exercise = open_exercise(m, n, x, reference_dir, reference_csv)
+                session_start = frame_time - detection['frame'] / exercise['fps']
+                if follow_patient:
+                    alignment = create_online_alignment(exercise['landmarks'], start=detection['frame'])
+                print(f"Detected {n} {m} {x} at {detection['phase']:.0%} (confidence {detection['confidence']:.2f})")
+
+        if exercise is None:
+            reference_frame = None
+        elif alignment is not None:
+            # Frames the governor skipped reuse the last landmarks, which must not advance the alignment twice
+            if live_landmarks is not aligned_landmarks:
+                update_online_alignment(alignment, live_landmarks)
+                aligned_landmarks = live_landmarks
+            reference_frame = reference_frame_at(exercise, alignment['position'] / exercise['fps'])
+        else:
+            # Reference pose at the moment the frame was captured, interpolated between reference frames
+            reference_frame = reference_frame_at(exercise, frame_time - session_start)
+
+        started = record_stage('reference_lookup', started)
+
+        if smoothing and motor_gate is None and exercise is not None:
+            motor_gate = create_motor_gate(MOTOR_JOINTS.get(n), B_VALUE)
+
+        # Render the expected landmarks and compare them with the live ones
+        render_reference_landmarks(frame, reference_frame)
+        record_stage('reference_drawing', started)
+        distances, out_of_tolerance, score = draw_landmarks(reference_frame, frame, live_landmarks, n, dispatcher, motor_gate, frame_time)
+        if on_frame is not None:
+            on_frame(frame_id, distances, out_of_tolerance, score)
+
+        # Display the frame with landmarks, break the loop if 'q' is pressed
+        started = start_timer()
+        keep_running = show_frame(sink, frame)
+        record_rendered(pipeline, capture_time)
+        record_stage('display', started)
+        if not keep_running:
             break
 
-        # Increment frame count
-        frame_count += 1
-
-    # Release video capture and close windows
-    cap.release()
-    cv2.destroyAllWindows()
+    # Stop the pipeline, release the source and close the window
+    stop_pipeline(pipeline)
+    release_source(source)
+    close_sink(sink)
+    if dispatcher is not None:
+        stop_haptic_dispatcher(dispatcher)
+    if owns_extractor:
+        close_landmark_extractor(extractor)
+
+    # Report end-to-end latency and dropped frames for the session
+    report = pipeline_report(pipeline)
+    report['exercise'] = {'m': m, 'n': n, 'x': x} if exercise is not None else None
+    print(f"Rendered {report['rendered']} frames at {report['fps']:.1f} fps, dropped {report['dropped_frames']}, "
+          f"latency mean {report['latency_ms_mean']} ms, p95 {report['latency_ms_p95']} ms")
+    return report
 
 
 
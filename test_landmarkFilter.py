@@ -0,0 +1,82 @@
+import numpy as np
+
+from landmarkFilter import HYSTERESIS, MIN_DWELL, create_landmark_filter, filter_landmarks, create_motor_gate, update_motor_gate
+
+# Constants
+FPS = 30  # Frame rate of the synthetic streams
+TOLERANCE = 0.05  # Motor tolerance of the gate tests
+MOTOR_JOINTS = {0: [11, 12], 1: [25]}  # Motors and the joints they react to
+
+
+def run_filter(frames, landmark_filter=None):
+    """Filters a [F, 75, 3] stream taken at FPS and returns the filtered frames."""
+    landmark_filter = landmark_filter or create_landmark_filter()
+    return np.array([filter_landmarks(landmark_filter, frame, index / FPS) for index, frame in enumerate(frames)])
+
+
+def test_still_pose_jitter_is_smoothed():
+    rng = np.random.default_rng(0)
+    pose = rng.random((75, 3)).astype(np.float32)
+    frames = pose + rng.normal(0, 0.005, (120, 75, 3)).astype(np.float32)
+    filtered = run_filter(frames)
+
+    assert np.std(filtered[30:] - pose) < np.std(frames[30:] - pose) / 2
+
+
+def test_fast_move_is_followed_with_little_lag():
+    positions = np.linspace(0.0, 1.0, 31)  # One image width per second
+    frames = np.repeat(positions[:, None, None], 75, axis=1).repeat(3, axis=2).astype(np.float32)
+    filtered = run_filter(frames)
+
+    assert np.abs(filtered[-1] - frames[-1]).max() < 0.02
+
+
+def test_first_frame_is_returned_as_is():
+    frame = np.random.default_rng(1).random((75, 3)).astype(np.float32)
+
+    assert np.array_equal(filter_landmarks(create_landmark_filter(), frame, 0.0), frame)
+
+
+def test_missing_joint_stays_missing_and_reappears_at_its_new_position():
+    frames = np.full((3, 75, 3), 0.5, dtype=np.float32)
+    frames[1, 20] = np.nan
+    frames[2, 20] = 0.9
+    filtered = run_filter(frames)
+
+    assert np.isnan(filtered[1, 20]).all()
+    assert np.allclose(filtered[2, 20], 0.9)
+    assert np.allclose(filtered[:, 0], 0.5)
+
+
+def joint_distances(values):
+    """Per-joint distances with joints 11 and 25 set to values[0] and values[1], the rest within tolerance."""
+    distances = np.zeros(75, dtype=np.float32)
+    distances[11], distances[25] = values
+    return distances
+
+
+def test_gate_turns_on_above_tolerance_and_off_below_the_hysteresis():
+    gate = create_motor_gate(MOTOR_JOINTS, TOLERANCE)
+    between = TOLERANCE * (1 - HYSTERESIS / 2)
+
+    assert update_motor_gate(gate, joint_distances((between, 0)), 0.0) == {0: False, 1: False}
+    assert update_motor_gate(gate, joint_distances((TOLERANCE * 1.1, 0)), 1.0) == {0: True, 1: False}
+    assert update_motor_gate(gate, joint_distances((between, 0)), 2.0) == {0: True, 1: False}
+    assert update_motor_gate(gate, joint_distances((TOLERANCE * (1 - HYSTERESIS) * 0.9, 0)), 3.0) == {0: False, 1: False}
+    assert gate['changes'] == 2
+
+
+def test_gate_keeps_its_state_for_the_minimum_dwell():
+    gate = create_motor_gate(MOTOR_JOINTS, TOLERANCE)
+    update_motor_gate(gate, joint_distances((0, TOLERANCE * 2)), 0.0)
+
+    assert update_motor_gate(gate, joint_distances((0, 0)), MIN_DWELL / 2)[1]
+    assert not update_motor_gate(gate, joint_distances((0, 0)), MIN_DWELL * 1.5)[1]
+
+
+def test_gate_counts_missing_joints_as_within():
+    gate = create_motor_gate(MOTOR_JOINTS, TOLERANCE)
+    distances = joint_distances((np.nan, np.nan))
+    distances[12] = np.nan
+
+    assert update_motor_gate(gate, distances, 0.0) == {0: False, 1: False}
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+
+from benchmarkSuite import write_wide_csv
+from landmarkLoader import WIDE_SCHEMA, wide_row_indexes, detect_schema, load_landmarks, load_exercise
+
+
+def test_one_exercise_of_a_wide_csv_matches_the_full_load(tmp_path):
+    wide_csv = str(tmp_path / 'wide.csv')
+    keys = write_wide_csv(wide_csv, exercises=3, seconds=2, fps=5)
+    store = load_landmarks(wide_csv)
+
+    assert detect_schema(wide_csv) == WIDE_SCHEMA
+    assert sorted(store) == sorted((m, n, x) for n, m, x in keys)
+    for n, m, x in keys:
+        exercise = load_exercise(wide_csv, m, n, x)
+        assert exercise['landmarks'].shape == (10, 75, 3)
+        assert np.array_equal(exercise['landmarks'], store[(m, n, x)]['landmarks'], equal_nan=True)
+        assert exercise['timestamps'] == store[(m, n, x)]['timestamps']
+    assert load_exercise(wide_csv, 'no', 'such', 'exercise') is None
+
+
+def test_wide_index_is_rebuilt_when_the_file_changes(tmp_path):
+    wide_csv = str(tmp_path / 'wide.csv')
+    n, m, x = write_wide_csv(wide_csv, exercises=2, seconds=1, fps=5)[0]
+    first = load_exercise(wide_csv, m, n, x)['landmarks']
+    signature = wide_row_indexes[wide_csv]['signature']
+
+    write_wide_csv(wide_csv, exercises=1, seconds=2, fps=5)
+    os.utime(wide_csv, ns=(0, 1))
+
+    assert load_exercise(wide_csv, m, n, x)['landmarks'].shape == (10, 75, 3)
+    assert wide_row_indexes[wide_csv]['signature'] != signature
+    assert first.shape == (5, 75, 3)
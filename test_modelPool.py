@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+import landmarkExtractor
+from modelPool import create_model_pool, release_extractor, close_model_pool
+
+# Constants
+RESET_SECONDS = 0.05  # How long the fake extractors take to drop their tracking state
+
+
+@pytest.fixture
+def closed(monkeypatch):
+    """Swaps the MediaPipe calls of the pool for fakes: extractors are plain dicts, closing one adds it to the returned list."""
+    closed = []
+    monkeypatch.setattr(landmarkExtractor, 'extract_landmarks', lambda extractor, frame: time.sleep(RESET_SECONDS))
+    monkeypatch.setattr(landmarkExtractor, 'close_landmark_extractor', closed.append)
+    return closed
+
+
+def lent_pool(size, lent):
+    """A pool of the given size with `lent` extractors out to sessions."""
+    pool = create_model_pool(size)
+    pool['created'] = lent
+    return pool, [{'id': i} for i in range(lent)]
+
+
+def test_releases_at_the_same_time_do_not_overfill_the_pool(closed):
+    pool, extractors = lent_pool(2, 6)
+    threads = [threading.Thread(target=release_extractor, args=(pool, extractor)) for extractor in extractors]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pool['idle'].qsize() == 2
+    assert len(closed) == 4
+    assert pool['created'] == 2 and pool['returning'] == 0
+
+
+def test_release_during_close_closes_the_extractor(closed):
+    pool, (extractor,) = lent_pool(1, 1)
+    release = threading.Thread(target=release_extractor, args=(pool, extractor))
+    release.start()
+    time.sleep(RESET_SECONDS / 2)
+    close_model_pool(pool)
+    release.join()
+
+    assert pool['idle'].qsize() == 0
+    assert closed == [extractor]
@@ -0,0 +1,78 @@
+import numpy as np
+
+from poseIndex import MAX_DETECTION_DISTANCE, build_pose_index, nearest_poses, detect_exercise
+
+# Constants
+FRAMES = 60  # Frames of each synthetic exercise
+ARM_JOINTS = list(range(13, 23))  # Elbows, wrists and hand points of the pose
+LEG_JOINTS = list(range(25, 33))  # Knees, ankles and feet
+
+
+def standing_pose(rng):
+    """A [75, 3] pose standing upright: shoulders above the hips, the other joints around the body, no hands."""
+    landmarks = np.full((75, 3), np.nan, dtype=np.float32)
+    landmarks[:33, 0] = rng.uniform(0.4, 0.6, 33)
+    landmarks[:33, 1] = np.linspace(0.2, 0.9, 33)
+    landmarks[:33, 2] = 0.0
+    landmarks[[11, 12, 23, 24], :2] = [[0.43, 0.35], [0.57, 0.35], [0.45, 0.6], [0.55, 0.6]]
+    return landmarks
+
+
+def exercise_frames(pose, joints):
+    """A [FRAMES, 75, 3] exercise: the given joints swing around their rest position, the rest stays still."""
+    angles = np.linspace(0, 2 * np.pi, FRAMES, endpoint=False)
+    frames = np.repeat(pose[None], FRAMES, axis=0)
+    frames[:, joints, 0] += 0.15 * np.cos(angles)[:, None]
+    frames[:, joints, 1] += 0.15 * np.sin(angles)[:, None]
+    return frames
+
+
+def synthetic_store():
+    """Two exercises of the same body, one moving the arms and one the legs, keyed by (m, n, x)."""
+    pose = standing_pose(np.random.default_rng(0))
+    return {
+        ('8_12_weeks', 'arm_stretch', 'easy'): {'landmarks': exercise_frames(pose, ARM_JOINTS)},
+        ('3_6_weeks', 'knee', 'medium'): {'landmarks': exercise_frames(pose, LEG_JOINTS)},
+    }
+
+
+def test_nearest_pose_is_the_same_frame_wherever_the_patient_stands():
+    store = synthetic_store()
+    index = build_pose_index(store)
+    live = store[('3_6_weeks', 'knee', 'medium')]['landmarks'][[10, 40]].copy()
+    live[..., :2] = live[..., :2] * 0.5 + 0.2  # Farther from the camera and off to the side
+
+    exercise_ids, frames, distances = nearest_poses(index, live, k=1)
+
+    assert [index['exercises'][i] for i in exercise_ids[:, 0]] == [('3_6_weeks', 'knee', 'medium')] * 2
+    assert frames[:, 0].tolist() == [10, 40]
+    assert np.allclose(distances[:, 0], 0, atol=1e-4)
+
+
+def test_detects_exercise_and_phase():
+    store = synthetic_store()
+    live = store[('8_12_weeks', 'arm_stretch', 'easy')]['landmarks'][20:30]
+    detection = detect_exercise(build_pose_index(store), live)
+
+    assert detection['key'] == ('8_12_weeks', 'arm_stretch', 'easy')
+    assert detection['frame'] == 29
+    assert detection['phase'] == 29 / FRAMES
+    assert detection['confidence'] == 1.0
+    assert detection['distance'] <= MAX_DETECTION_DISTANCE
+
+
+def test_random_landmarks_are_not_detected():
+    index = build_pose_index(synthetic_store())
+    live = np.random.default_rng(1).random((10, 75, 3)).astype(np.float32)
+
+    assert detect_exercise(index, live) is None
+
+
+def test_frames_without_a_pose():
+    index = build_pose_index(synthetic_store())
+    live = np.full((3, 75, 3), np.nan, dtype=np.float32)
+    exercise_ids, frames, distances = nearest_poses(index, live)
+
+    assert (exercise_ids == -1).all() and (frames == -1).all() and np.isinf(distances).all()
+    assert detect_exercise(index, live) is None
+    assert build_pose_index({}) is None
@@ -0,0 +1,85 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from referenceStore import BINARY_ALIGNMENT, NUM_LANDMARKS, landmark_columns, exercise_file_name, write_reference_binary, \
+    read_binary_header, load_reference_binary, load_reference_binaries, convert_csv_to_binary, frame_index_from_timestamp
+
+# Constants
+FRAMES = 45  # Frames of the synthetic exercise
+FPS = 15  # Its frame rate
+
+
+def synthetic_landmarks(frames=FRAMES, seed=0):
+    """[frames, 75, 3] float32 landmarks with the second hand missing in every other frame."""
+    landmarks = np.random.default_rng(seed).random((frames, NUM_LANDMARKS, 3)).astype(np.float32)
+    landmarks[::2, 54:] = np.nan
+    return landmarks
+
+
+def timestamps(frames=FRAMES, fps=FPS):
+    """The "s_f" timestamps of the extraction scripts."""
+    return [f"{i // fps}_{i % fps}" for i in range(frames)]
+
+
+def test_round_trip(tmp_path):
+    binary_file = tmp_path / exercise_file_name('3_6_weeks', 'knee', 'medium')
+    landmarks = synthetic_landmarks()
+    write_reference_binary(binary_file, landmarks, FPS, '3_6_weeks', 'knee', 'medium', timestamps())
+    exercise = load_reference_binary(binary_file)
+
+    assert binary_file.name == 'knee-3_6_weeks-medium.lmk'
+    assert exercise['key'] == ('3_6_weeks', 'knee', 'medium')
+    assert exercise['fps'] == FPS
+    assert isinstance(exercise['landmarks'], np.memmap)
+    assert np.array_equal(exercise['landmarks'], landmarks, equal_nan=True)
+    assert exercise['timestamps'] == timestamps()
+    assert frame_index_from_timestamp(exercise, 2, 3) == 2 * FPS + 3
+
+
+def test_data_is_aligned_for_memory_mapping(tmp_path):
+    binary_file = tmp_path / 'wrist-8_12_weeks-easy.lmk'
+    write_reference_binary(binary_file, synthetic_landmarks(), FPS, '8_12_weeks', 'wrist', 'easy', timestamps())
+    header, data_offset = read_binary_header(binary_file)
+
+    assert data_offset % BINARY_ALIGNMENT == 0
+    assert os.path.getsize(binary_file) == data_offset + FRAMES * NUM_LANDMARKS * 3 * 4
+    assert header['frames'] == FRAMES and header['dtype'] == 'float32'
+
+
+def test_missing_timestamps_and_empty_exercise(tmp_path):
+    binary_file = tmp_path / 'wrist-8_12_weeks-easy.lmk'
+    write_reference_binary(binary_file, synthetic_landmarks(20), 10, '8_12_weeks', 'wrist', 'easy')
+    assert load_reference_binary(binary_file)['timestamps'][-1] == '1_9'
+
+    write_reference_binary(binary_file, np.zeros((0, NUM_LANDMARKS, 3)), 10, '8_12_weeks', 'wrist', 'easy')
+    assert load_reference_binary(binary_file)['landmarks'].shape == (0, NUM_LANDMARKS, 3)
+
+
+def test_rejects_other_files(tmp_path):
+    binary_file = tmp_path / 'not-a-reference.lmk'
+    binary_file.write_bytes(b'RIFF' + bytes(60))
+
+    with pytest.raises(ValueError):
+        load_reference_binary(binary_file)
+
+
+def test_converts_a_csv(tmp_path):
+    csv_file = tmp_path / 'references.csv'
+    exercises = {('3_6_weeks', 'knee', 'medium'): synthetic_landmarks(seed=1), ('8_12_weeks', 'wrist', 'easy'): synthetic_landmarks(30, seed=2)}
+    with open(csv_file, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['timestamp', 'fps', 'm', 'n', 'x'] + landmark_columns())
+        for (m, n, x), landmarks in exercises.items():
+            for timestamp, values in zip(timestamps(len(landmarks)), landmarks.reshape(len(landmarks), -1)):
+                writer.writerow([timestamp, FPS, m, n, x] + ['' if value != value else repr(value) for value in values.tolist()])
+
+    convert_csv_to_binary(str(csv_file), str(tmp_path / 'references'))
+    store = load_reference_binaries(tmp_path / 'references')
+
+    assert sorted(store) == sorted(exercises)
+    for key, landmarks in exercises.items():
+        assert np.array_equal(store[key]['landmarks'], landmarks, equal_nan=True)
+        assert store[key]['fps'] == FPS
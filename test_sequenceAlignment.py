@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from sequenceAlignment import MISSING_COST, band_limits, joint_distances, frame_costs, align_sequences, \
+    create_online_alignment, update_online_alignment
+
+# Constants
+SEED = 7  # Seed of the random landmark sequences
+
+
+def random_landmarks(frames, seed=SEED):
+    """A [frames, 75, 3] sequence of random landmarks, with a few joints missing."""
+    rng = np.random.default_rng(seed)
+    landmarks = rng.random((frames, 75, 3)).astype(np.float32)
+    landmarks[rng.random((frames, 75)) < 0.1] = np.nan
+    return landmarks
+
+
+def naive_dtw(live_landmarks, reference_landmarks, lows=None, highs=None):
+    """Textbook O(N M) DTW over the same frame costs, restricted to lows[i]:highs[i] when given."""
+    live_frames, reference_frames = len(live_landmarks), len(reference_landmarks)
+    accumulated = np.full((live_frames + 1, reference_frames + 1), np.inf)
+    accumulated[0, 0] = 0.0
+    for i in range(live_frames):
+        for j in range(reference_frames):
+            if lows is not None and not lows[i] <= j < highs[i]:
+                continue
+            cost = frame_costs(joint_distances(live_landmarks[i], reference_landmarks[j]))
+            accumulated[i + 1, j + 1] = cost + min(accumulated[i, j], accumulated[i, j + 1], accumulated[i + 1, j])
+    return accumulated[-1, -1]
+
+
+def check_path(path, live_frames, reference_frames):
+    """The warping path runs from the first to the last frame of both sequences in unit steps."""
+    assert path[0].tolist() == [0, 0]
+    assert path[-1].tolist() == [live_frames - 1, reference_frames - 1]
+    steps = np.diff(path, axis=0)
+    assert ((steps >= 0) & (steps <= 1)).all() and (steps.sum(axis=1) > 0).all()
+
+
+@pytest.mark.parametrize('live_frames, reference_frames, window', [(30, 30, 3), (25, 40, 4), (40, 25, None), (12, 60, 2)])
+def test_matches_naive_banded_dtw(live_frames, reference_frames, window):
+    live, reference = random_landmarks(live_frames, 1), random_landmarks(reference_frames, 2)
+    alignment = align_sequences(live, reference, window)
+    lows, highs = band_limits(live_frames, reference_frames, window or max(1, int(0.1 * max(live_frames, reference_frames))))
+
+    assert alignment['distance'] == pytest.approx(naive_dtw(live, reference, lows, highs))
+    check_path(alignment['path'], live_frames, reference_frames)
+
+
+def test_wide_window_matches_full_dtw():
+    live, reference = random_landmarks(20, 3), random_landmarks(26, 4)
+    alignment = align_sequences(live, reference, window=26)
+
+    assert alignment['distance'] == pytest.approx(naive_dtw(live, reference))
+
+
+def test_time_stretched_copy_aligns_at_no_cost():
+    reference = random_landmarks(40)
+    live = np.repeat(reference, 2, axis=0)
+    alignment = align_sequences(live, reference)
+
+    assert alignment['distance'] == pytest.approx(0.0)
+    assert (alignment['path'][:, 1] == alignment['path'][:, 0] // 2).all()
+
+
+@pytest.mark.parametrize('live_frames, reference_frames, window', [(1, 10, 3), (1, 3, None), (5, 100, None), (100, 5, None), (1, 1, None)])
+def test_short_sequences_still_align(live_frames, reference_frames, window):
+    live, reference = random_landmarks(live_frames, 5), random_landmarks(reference_frames, 6)
+    alignment = align_sequences(live, reference, window)
+
+    assert alignment is not None
+    check_path(alignment['path'], live_frames, reference_frames)
+    assert alignment['distance'] >= naive_dtw(live, reference) - 1e-6
+
+
+def test_all_missing_frames_cost_missing_cost():
+    live = np.full((8, 75, 3), np.nan, dtype=np.float32)
+    alignment = align_sequences(live, random_landmarks(12))
+
+    assert alignment['distance'] == pytest.approx(MISSING_COST * 12)
+    assert alignment['normalized_distance'] == pytest.approx(MISSING_COST)
+
+
+def test_empty_sequence_returns_none():
+    empty = np.zeros((0, 75, 3), dtype=np.float32)
+
+    assert align_sequences(empty, random_landmarks(10)) is None
+    assert align_sequences(random_landmarks(10), empty) is None
+
+
+def test_abandons_above_threshold():
+    live, reference = random_landmarks(30, 1), random_landmarks(30, 2)
+    distance = align_sequences(live, reference)['distance']
+
+    assert align_sequences(live, reference, abandon_above=distance / 2) is None
+    assert align_sequences(live, reference, abandon_above=distance * 2)['distance'] == pytest.approx(distance)
+
+
+def follow(alignment, live):
+    """Positions the online alignment reports for each live frame."""
+    return np.array([update_online_alignment(alignment, frame) for frame in live])
+
+
+@pytest.mark.parametrize('live_indices', [np.arange(120) // 2, np.arange(20) * 3, np.arange(60)])
+def test_online_alignment_follows_the_patient_pace(live_indices):
+    reference = random_landmarks(60)
+    positions = follow(create_online_alignment(reference), reference[live_indices])
+
+    assert (positions == live_indices).all()
+
+
+def test_online_alignment_loops_over_the_reference():
+    reference = random_landmarks(60)
+    live_indices = np.arange(90) % 60
+    positions = follow(create_online_alignment(reference), reference[live_indices])
+
+    assert (positions == live_indices).all()
+
+
+def test_online_alignment_stops_at_the_end_without_loop():
+    reference = random_landmarks(60)
+    live = np.concatenate([reference, np.repeat(reference[-1:], 10, axis=0)])
+    positions = follow(create_online_alignment(reference, loop=False), live)
+
+    assert (positions[60:] == 59).all()
+
+
+def test_online_alignment_starts_at_start_and_skips_empty_frames():
+    reference = random_landmarks(60)
+    alignment = create_online_alignment(reference, start=25)
+
+    assert update_online_alignment(alignment, reference[25]) == 25
+    assert update_online_alignment(alignment, np.full((75, 3), np.nan, dtype=np.float32)) == 25
+    assert alignment['frames'] == 1
+    assert update_online_alignment(alignment, reference[27]) == 27